@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CUE 解析吞吐量测试
+
+生成一批合成 CUE 文件，对比旧的正则解析方式（整文件 re.search + DOTALL
+re.findall）与 cue_parser 的逐行解析器，统计每秒可解析的 CUE 文件数。
+
+使用方法:
+    python benchmarks/bench_cue_parse.py [--sheets 数量] [--tracks 每张轨道数] [--with-detection]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import cue_parser  # noqa: E402
+
+def build_sheet(index, track_count):
+    """生成一张合成 CUE 文件的文本"""
+    lines = [
+        'REM GENRE "J-Pop"',
+        f'REM DATE {1990 + index % 30}',
+        f'REM DISCID {index:08X}',
+        'REM COMMENT "ExactAudioCopy v1.6"',
+        f'PERFORMER "演唱者 {index}"',
+        f'TITLE "专辑 {index}"',
+        f'FILE "专辑 {index}.flac" WAVE',
+    ]
+    position = 0
+    for number in range(1, track_count + 1):
+        minutes, rest = divmod(position, 60 * 75)
+        seconds, frames = divmod(rest, 75)
+        lines.extend([
+            f'  TRACK {number:02d} AUDIO',
+            f'    TITLE "歌曲 {number} - 第{index}张"',
+            f'    PERFORMER "演唱者 {index}"',
+            '    REM REPLAYGAIN_TRACK_GAIN -6.50 dB',
+        ])
+        if number > 1:
+            pre_minutes, pre_rest = divmod(position - 150, 60 * 75)
+            pre_seconds, pre_frames = divmod(pre_rest, 75)
+            lines.append(f'    INDEX 00 {pre_minutes:02d}:{pre_seconds:02d}:{pre_frames:02d}')
+        lines.append(f'    INDEX 01 {minutes:02d}:{seconds:02d}:{frames:02d}')
+        position += 75 * (180 + number * 7)
+    return '\n'.join(lines) + '\n'
+
+def legacy_parse(content):
+    """旧版 parse_cue_file 的解析逻辑（不含编码检测和打印），作为对照"""
+    album_title = ""
+    album_performer = ""
+    audio_file = ""
+    
+    title_match = re.search(r'TITLE\s+"([^"]+)"', content)
+    if title_match:
+        album_title = title_match.group(1)
+    performer_match = re.search(r'PERFORMER\s+"([^"]+)"', content)
+    if performer_match:
+        album_performer = performer_match.group(1)
+    file_match = re.search(r'FILE\s+"([^"]+)"', content)
+    if file_match:
+        audio_file = file_match.group(1)
+    
+    tracks = []
+    track_blocks = re.findall(r'TRACK\s+(\d+)\s+AUDIO(.*?)(?=TRACK\s+\d+\s+AUDIO|$)', content, re.DOTALL)
+    for track_num, track_content in track_blocks:
+        track_num_int = int(track_num)
+        track_info = {'number': track_num_int, 'title': f'Track_{track_num_int:02d}', 'performer': album_performer}
+        title_match = re.search(r'TITLE\s+"([^"]+)"', track_content)
+        if title_match:
+            track_info['title'] = title_match.group(1)
+        performer_match = re.search(r'PERFORMER\s+"([^"]+)"', track_content)
+        if performer_match:
+            track_info['performer'] = performer_match.group(1)
+        index_match = re.search(r'INDEX\s+01\s+(\d+):(\d+):(\d+)', track_content)
+        if index_match:
+            minutes, seconds, frames = map(int, index_match.groups())
+            track_info['start_time'] = minutes * 60 + seconds + frames / 75
+        else:
+            track_info['start_time'] = 0
+        tracks.append(track_info)
+    
+    for i in range(len(tracks)):
+        if i < len(tracks) - 1:
+            tracks[i]['duration'] = tracks[i + 1]['start_time'] - tracks[i]['start_time']
+        else:
+            tracks[i]['duration'] = None
+    return tracks, album_title, album_performer, audio_file
+
+def legacy_parse_bytes(data):
+    """旧版流程：chardet 检测整个文件的编码 + 正则解析"""
+    import chardet
+    encoding = chardet.detect(data)['encoding'] or 'utf-8'
+    return legacy_parse(data.decode(encoding))
+
+def native_parse(data):
+    """新解析器：解码 + 逐行解析 + 生成轨道字典"""
+    sheet, _ = cue_parser.parse_cue_bytes(data, 'utf-8')
+    return sheet.to_track_dicts()
+
+def native_parse_detect(data):
+    """新解析器：自动检测编码 + 逐行解析 + 生成轨道字典"""
+    sheet, _ = cue_parser.parse_cue_bytes(data)
+    return sheet.to_track_dicts()
+
+def measure(name, func, inputs, repeat):
+    """多次运行取最快的一次，返回每秒解析的 CUE 文件数"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in inputs:
+            func(item)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    rate = len(inputs) / best
+    print(f"{name:<12}{best:>10.3f} 秒{rate:>14,.0f} 个/秒")
+    return rate
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='CUE 解析吞吐量测试')
+    parser.add_argument('--sheets', type=int, default=10000, help='CUE 文件数量 (默认: 10000)')
+    parser.add_argument('--tracks', type=int, default=16, help='每张 CUE 的轨道数 (默认: 16)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数 (默认: 3)')
+    parser.add_argument('--with-detection', action='store_true',
+                        help='同时测量编码检测的开销（需要安装 chardet）')
+    args = parser.parse_args()
+    
+    texts = [build_sheet(i, args.tracks) for i in range(args.sheets)]
+    blobs = [text.encode('utf-8') for text in texts]
+    
+    # 结果一致性检查
+    legacy_tracks = legacy_parse(texts[0])[0]
+    native_tracks = native_parse(blobs[0])
+    assert [t['title'] for t in legacy_tracks] == [t['title'] for t in native_tracks]
+    assert [t['start_time'] for t in legacy_tracks] == [t['start_time'] for t in native_tracks]
+    
+    print(f"{args.sheets} 个 CUE 文件，每个 {args.tracks} 个轨道")
+    print("-" * 40)
+    if args.with_detection:
+        legacy_rate = measure('legacy', legacy_parse_bytes, blobs, args.repeat)
+        native_rate = measure('cue_parser', native_parse_detect, blobs, args.repeat)
+    else:
+        legacy_rate = measure('legacy', legacy_parse, texts, args.repeat)
+        native_rate = measure('cue_parser', native_parse, blobs, args.repeat)
+    print("-" * 40)
+    print(f"加速比: {native_rate / legacy_rate:.2f}x")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件列表性能测试 (每次 rglob vs 文件索引)
+
+在临时目录中生成 专辑数 × 每张专辑轨道数 个文件，分别测量:
+
+- 旧方式: rglob("*") 遍历并对每个文件 stat 两次
+- 文件索引: 首次建立索引、目录无变化时的检查（只 stat 目录）、缓存命中的翻页查询
+
+使用方法:
+    python benchmarks/bench_file_index.py [--albums 专辑数] [--tracks 每张专辑的轨道数]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_index import FileIndex  # noqa: E402
+
+def create_tree(root, albums, tracks):
+    """生成测试目录树"""
+    for album in range(albums):
+        album_dir = root / f'album_{album:05d}'
+        album_dir.mkdir()
+        for track in range(tracks):
+            (album_dir / f'{track + 1:02d} - track.flac').write_bytes(b'\0' * (track + 1))
+
+def legacy_list(target_dir):
+    """旧版 /api/files 的实现"""
+    files = []
+    for file_path in target_dir.rglob("*"):
+        if file_path.is_file():
+            files.append({
+                'name': file_path.name,
+                'path': str(file_path.relative_to(target_dir)),
+                'size': file_path.stat().st_size,
+                'type': file_path.suffix.lower(),
+                'modified': datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
+            })
+    return files
+
+def timed(func):
+    """运行函数并返回 (耗时, 结果)"""
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='文件列表性能测试')
+    parser.add_argument('--albums', type=int, default=2000, help='专辑目录数 (默认: 2000)')
+    parser.add_argument('--tracks', type=int, default=12, help='每张专辑的轨道数 (默认: 12)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix='musictool_bench_') as work_dir:
+        root = Path(work_dir)
+        create_tree(root, args.albums, args.tracks)
+        
+        legacy_elapsed, files = timed(lambda: legacy_list(root))
+        index = FileIndex(root, refresh_interval=0)
+        build_elapsed, (_, total) = timed(lambda: index.list(limit=200))
+        check_elapsed, _ = timed(lambda: index.list(offset=200, limit=200))
+        index.refresh_interval = 60
+        cached_elapsed, _ = timed(lambda: index.list(offset=400, limit=200, sort='size', reverse=True))
+        cached_again, _ = timed(lambda: index.list(offset=600, limit=200, sort='size', reverse=True))
+        assert total == len(files) == args.albums * args.tracks
+    
+    print(f"{args.albums} 个目录 × {args.tracks} 个文件（共 {total} 个文件）")
+    print("-" * 48)
+    print(f"旧方式 rglob + stat:     {legacy_elapsed * 1e3:8.1f} 毫秒（每次请求）")
+    print(f"首次建立索引:            {build_elapsed * 1e3:8.1f} 毫秒")
+    print(f"检查目录变化（无变化）:  {check_elapsed * 1e3:8.1f} 毫秒")
+    print(f"按大小排序（首次）:      {cached_elapsed * 1e3:8.1f} 毫秒")
+    print(f"按大小排序（缓存）:      {cached_again * 1e3:8.1f} 毫秒")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
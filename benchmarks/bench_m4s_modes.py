@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+M4S 输出方式性能对比 (转码为 MP3 vs 直接复制 AAC 音频流)
+
+用 ffmpeg 生成一批合成的 AAC 音频 m4s（分片 MP4，与 B 站缓存的音频流结构相同），
+分别以各输出格式/编码方式转换全部文件并统计耗时和吞吐量。
+
+使用方法:
+    python benchmarks/bench_m4s_modes.py [--files 数量] [--duration 秒] [--workers 线程数]
+
+示例:
+    python benchmarks/bench_m4s_modes.py --files 24 --duration 240 --workers 8
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from m4s_to_mp3_ffmpeg import M4SToMP3ConverterFFmpeg  # noqa: E402
+
+# (输出格式, 编码方式)
+CASES = [
+    ('mp3', 'auto'),
+    ('m4a', 'transcode'),
+    ('m4a', 'auto'),
+    ('aac', 'auto'),
+    ('mka', 'auto'),
+]
+
+def write_synthetic_m4s(path, duration):
+    """生成一个 AAC 编码的分片 MP4 音频文件"""
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}:sample_rate=44100',
+                    '-ac', '2', '-c:a', 'aac', '-b:a', '192k',
+                    '-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4', str(path)],
+                   check=True)
+
+def run_case(m4s_files, output_dir, output_format, codec_mode, workers):
+    """运行一种输出方式，返回耗时（秒）"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    converter = M4SToMP3ConverterFFmpeg(output_dir=output_dir, workers=workers, force=True,
+                                        output_format=output_format, codec_mode=codec_mode)
+    started = time.perf_counter()
+    summary = converter.convert(m4s_files)
+    elapsed = time.perf_counter() - started
+    if summary['failed']:
+        raise RuntimeError(f"转换失败: {output_format}/{codec_mode}")
+    return elapsed
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='M4S 输出方式性能对比')
+    parser.add_argument('--files', type=int, default=24, help='合成的 m4s 文件数 (默认: 24)')
+    parser.add_argument('--duration', type=int, default=240, help='每个文件的时长，秒 (默认: 240)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行转换的工作线程数 (默认: CPU 核心数)')
+    parser.add_argument('--repeat', type=int, default=1, help='每种方式重复次数 (默认: 1)')
+    args = parser.parse_args()
+    
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("❌ 未找到 ffmpeg / ffprobe，无法运行基准测试")
+        return 1
+    logging.basicConfig(level=logging.WARNING)
+    
+    with tempfile.TemporaryDirectory(prefix='musictool_bench_') as work_dir:
+        work_dir = Path(work_dir)
+        source_dir = work_dir / 'm4s'
+        source_dir.mkdir()
+        print(f"生成合成 m4s: {args.files} 个文件, 每个 {args.duration} 秒")
+        m4s_files = [source_dir / f'{i:03d}.m4s' for i in range(args.files)]
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(lambda path: write_synthetic_m4s(path, args.duration), m4s_files))
+        total_mb = sum(path.stat().st_size for path in m4s_files) / 1024 / 1024
+        print(f"输入总大小: {total_mb:.1f} MB, {args.workers} 个并行任务")
+        
+        results = {}
+        for output_format, codec_mode in CASES:
+            output_dir = work_dir / f'{output_format}_{codec_mode}'
+            timings = [run_case(m4s_files, output_dir, output_format, codec_mode, args.workers)
+                       for _ in range(args.repeat)]
+            results[(output_format, codec_mode)] = min(timings)
+    
+    print("\n" + "=" * 56)
+    print(f"{'方式':<18}{'耗时(秒)':>10}{'MB/秒':>12}{'文件/秒':>10}{'相对':>8}")
+    baseline = results[CASES[0]]
+    for (output_format, codec_mode), elapsed in results.items():
+        print(f"{output_format + '/' + codec_mode:<18}{elapsed:>10.2f}{total_mb / elapsed:>12.1f}"
+              f"{args.files / elapsed:>10.1f}{baseline / elapsed:>7.1f}x")
+    print("=" * 56)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
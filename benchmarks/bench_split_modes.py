@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+切割模式性能对比 (native vs single_pass vs per_track)
+
+生成一个合成的长音频镜像（WAV，可选再编码为 FLAC），按固定间隔划分轨道，
+分别用各切割模式处理并统计耗时（native: WAV 直接复制 PCM，FLAC 复制帧、只重新编码边界帧）。
+
+使用方法:
+    python benchmarks/bench_split_modes.py [--duration 秒] [--tracks 数量] [--format wav|flac]
+
+示例:
+    python benchmarks/bench_split_modes.py --duration 1200 --tracks 20 --format flac
+"""
+
+import argparse
+import array
+import math
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import audio_splitter  # noqa: E402
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+def write_synthetic_wav(path, duration):
+    """写入一个 16 位立体声的合成 WAV 文件（一秒钟的扫频信号循环）"""
+    block = array.array('h')
+    for i in range(SAMPLE_RATE):
+        t = i / SAMPLE_RATE
+        value = int(12000 * math.sin(2 * math.pi * (220 + 440 * t) * t))
+        block.extend((value, value))
+    block_bytes = block.tobytes()
+    
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for _ in range(int(duration)):
+            wav.writeframes(block_bytes)
+
+def build_tracks(duration, track_count):
+    """按等间隔生成与 parse_cue_file 返回结构一致的轨道列表"""
+    length = duration / track_count
+    tracks = []
+    for i in range(track_count):
+        tracks.append({
+            'number': i + 1,
+            'title': f'Track_{i + 1:02d}',
+            'performer': 'Benchmark',
+            'start_time': i * length,
+            'duration': length if i < track_count - 1 else None,
+        })
+    return tracks
+
+def run_mode(audio_file, tracks, output_dir, mode):
+    """运行一种切割模式，返回耗时（秒）"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    started = time.perf_counter()
+    ok = audio_splitter.split_audio(audio_file, tracks, output_dir, mode=mode)
+    elapsed = time.perf_counter() - started
+    if not ok:
+        raise RuntimeError(f"切割失败: {mode}")
+    return elapsed
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='切割模式性能对比')
+    parser.add_argument('--duration', type=int, default=1200, help='合成音频时长，秒 (默认: 1200)')
+    parser.add_argument('--tracks', type=int, default=20, help='轨道数量 (默认: 20)')
+    parser.add_argument('--format', choices=['wav', 'flac'], default='flac', help='镜像格式 (默认: flac)')
+    parser.add_argument('--repeat', type=int, default=1, help='每种模式重复次数 (默认: 1)')
+    args = parser.parse_args()
+    
+    if not shutil.which('ffmpeg'):
+        print("❌ 未找到 ffmpeg，无法运行基准测试")
+        return 1
+    
+    with tempfile.TemporaryDirectory(prefix='musictool_bench_') as work_dir:
+        work_dir = Path(work_dir)
+        wav_path = work_dir / 'image.wav'
+        print(f"生成合成音频: {args.duration} 秒, {args.tracks} 个轨道")
+        write_synthetic_wav(wav_path, args.duration)
+        
+        audio_file = wav_path
+        if args.format == 'flac':
+            audio_file = work_dir / 'image.flac'
+            subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', str(wav_path),
+                            '-c:a', 'flac', str(audio_file)], check=True)
+            wav_path.unlink()
+        print(f"镜像文件: {audio_file.name} ({audio_file.stat().st_size / 1024 / 1024:.1f} MB)")
+        
+        tracks = build_tracks(args.duration, args.tracks)
+        modes = [mode for mode in audio_splitter.SPLIT_MODES if mode != 'auto']
+        results = {}
+        for mode in modes:
+            timings = [run_mode(str(audio_file), tracks, str(work_dir / mode), mode)
+                       for _ in range(args.repeat)]
+            results[mode] = min(timings)
+    
+    print("\n" + "=" * 40)
+    print(f"{'模式':<14}{'耗时(秒)':>12}{'相对':>10}")
+    baseline = results['per_track']
+    for mode, elapsed in results.items():
+        print(f"{mode:<14}{elapsed:>12.2f}{baseline / elapsed:>9.2f}x")
+    print("=" * 40)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务状态持久化性能测试 (追加日志 vs 每次重写整个 JSON)
+
+创建一批任务并对每个任务做多次进度更新，统计追加日志方式的总耗时、
+单次更新耗时和重新启动时的加载耗时。旧方式（每次更新都用 indent=2
+重写整个 task_state.json）在同样的任务数下抽样测量单次写入耗时，
+再按总更新次数估算总耗时。
+
+使用方法:
+    python benchmarks/bench_task_journal.py [--tasks 数量] [--updates 每个任务的更新次数]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from task_manager import TaskManager  # noqa: E402
+
+def run_updates(manager, task_count, update_count):
+    """创建任务并逐个更新进度，返回任务 ID 列表"""
+    task_ids = []
+    for i in range(task_count):
+        task_id = manager.create_task('flac_split', {'input_files': [f'album_{i}.flac', f'album_{i}.cue'],
+                                                     'output_dir': '/app/output'})
+        task_ids.append(task_id)
+        for step in range(update_count):
+            progress = (step + 1) * 100 // update_count
+            manager.update_task(task_id, status='running', progress=progress, message=f'处理中 {progress}%')
+        manager.update_task(task_id, status='completed', message='音频分割完成')
+    return task_ids
+
+def measure_legacy_write(tasks, counter, path, samples):
+    """测量旧方式单次保存（indent=2 重写全部任务）的平均耗时"""
+    started = time.perf_counter()
+    for _ in range(samples):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'tasks': tasks, 'task_counter': counter}, f, ensure_ascii=False, indent=2)
+    return (time.perf_counter() - started) / samples
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='任务状态持久化性能测试')
+    parser.add_argument('--tasks', type=int, default=10000, help='任务数量 (默认: 10000)')
+    parser.add_argument('--updates', type=int, default=20, help='每个任务的进度更新次数 (默认: 20)')
+    parser.add_argument('--legacy-samples', type=int, default=20,
+                        help='旧方式抽样测量的保存次数 (默认: 20)')
+    args = parser.parse_args()
+    
+    total_writes = args.tasks * (args.updates + 2)
+    with tempfile.TemporaryDirectory(prefix='musictool_bench_') as work_dir:
+        state_file = Path(work_dir) / 'task_state.json'
+        
+        manager = TaskManager(state_file)
+        started = time.perf_counter()
+        run_updates(manager, args.tasks, args.updates)
+        journal_elapsed = time.perf_counter() - started
+        manager.journal.close()
+        
+        started = time.perf_counter()
+        reloaded = TaskManager(state_file)
+        reload_elapsed = time.perf_counter() - started
+        assert len(reloaded.tasks) == args.tasks
+        assert all(task['status'] == 'completed' and task['progress'] == 100 for task in reloaded.tasks.values())
+        reloaded.journal.close()
+        
+        legacy_write = measure_legacy_write(reloaded.tasks, reloaded.task_counter,
+                                            Path(work_dir) / 'legacy_state.json', args.legacy_samples)
+    
+    print(f"{args.tasks} 个任务 × {args.updates} 次更新（共 {total_writes} 次写入）")
+    print("-" * 48)
+    print(f"追加日志: 总耗时 {journal_elapsed:.2f} 秒, 单次 {journal_elapsed / total_writes * 1e6:.1f} 微秒")
+    print(f"重新加载: {reload_elapsed:.3f} 秒")
+    print(f"整体重写: 单次 {legacy_write * 1e3:.1f} 毫秒（{args.tasks} 个任务时）, "
+          f"估算总耗时 > {legacy_write * total_writes / 2:.0f} 秒")
+    print("-" * 48)
+    print("注: 旧方式的单次耗时随任务数线性增长，估算按平均一半任务数计算")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web 接口负载测试
+
+对运行中的 Web 服务并发请求任务状态和文件列表接口，统计每个接口的吞吐量和
+延迟分位数。每个客户端线程使用一个 keep-alive 连接，模拟多个打开的页面。
+
+先启动服务（开发服务器或生产模式），例如:
+    python main.py web --production --port 5000
+
+再运行:
+    python benchmarks/bench_web_load.py --url http://127.0.0.1:5000 [--clients 32] [--duration 20]
+"""
+
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+
+# 默认测试的接口（{task_id} 替换为已有的任务 ID）
+DEFAULT_PATHS = [
+    '/api/system-info',
+    '/api/tasks?limit=5&fields=type,status,created_at',
+    '/api/task/{task_id}',
+    '/api/files?dir=output&limit=200',
+]
+
+def percentile(values, fraction):
+    """取分位数（values 已排序）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+def client(host, port, paths, deadline, results, errors):
+    """单个客户端：在一个连接上轮流请求各个接口，直到测试结束"""
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - started
+            if response.status >= 400:
+                errors.append(f'{path}: HTTP {response.status}')
+            else:
+                results[path].append(elapsed)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f'{path}: {e!r}')
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+    connection.close()
+
+def find_task_id(host, port):
+    """取最新的一个任务 ID，没有任务时返回 None"""
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request('GET', '/api/tasks?limit=1&fields=id')
+    data = json.loads(connection.getresponse().read())
+    connection.close()
+    tasks = data.get('tasks') or []
+    return tasks[0]['id'] if tasks else None
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='Web 接口负载测试')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='服务地址 (默认: http://127.0.0.1:5000)')
+    parser.add_argument('--clients', type=int, default=32, help='并发客户端数 (默认: 32)')
+    parser.add_argument('--duration', type=float, default=20, help='测试时长秒数 (默认: 20)')
+    parser.add_argument('--path', action='append', help='要测试的接口路径，可重复指定 (默认: 状态和文件列表接口)')
+    args = parser.parse_args()
+    
+    url = urllib.parse.urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    
+    paths = args.path or DEFAULT_PATHS
+    if any('{task_id}' in path for path in paths):
+        task_id = find_task_id(host, port)
+        if task_id is None:
+            print("⚠️ 服务中还没有任务，跳过 /api/task/<id>")
+            paths = [path for path in paths if '{task_id}' not in path]
+        else:
+            paths = [path.replace('{task_id}', task_id) for path in paths]
+    
+    results = {path: [] for path in paths}
+    errors = []
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=client, args=(host, port, paths, deadline, results, errors))
+               for _ in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    total = sum(len(values) for values in results.values())
+    print(f"{args.clients} 个客户端, {elapsed:.1f} 秒, 共 {total} 个请求, {total / elapsed:,.0f} 请求/秒, "
+          f"错误 {len(errors)} 个")
+    print("-" * 96)
+    print(f"{'接口':<52} {'请求/秒':>9} {'平均':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for path, values in results.items():
+        values.sort()
+        mean = statistics.fmean(values) if values else 0.0
+        print(f"{path:<52} {len(values) / elapsed:>9,.0f} {mean * 1e3:>6.1f}ms "
+              f"{percentile(values, 0.5) * 1e3:>6.1f}ms {percentile(values, 0.95) * 1e3:>6.1f}ms "
+              f"{percentile(values, 0.99) * 1e3:>6.1f}ms")
+    for error in errors[:5]:
+        print(f"  ❌ {error}")
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TaskManager 并发压力测试
+
+启动数百个更新线程，每个线程创建若干任务并反复更新进度；同时运行读取
+线程不断获取任务列表并序列化为 JSON（模拟 /api/tasks）。合并阈值调得
+很低，运行期间会频繁写出快照。结束后检查:
+
+- 任务 ID 不重复，计数器等于创建的任务总数
+- 每个任务的最终状态正确，增量维护的状态计数与任务一致
+- 读取线程没有遇到异常（例如遍历时字典被修改）
+- 重新加载后的状态与内存中的状态一致
+
+使用方法:
+    python benchmarks/stress_task_manager.py [--threads 线程数] [--tasks 每个线程的任务数] [--updates 更新次数]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import task_manager  # noqa: E402
+from task_manager import TaskManager  # noqa: E402
+
+def updater(manager, worker, task_count, update_count, created):
+    """创建任务并逐步更新进度"""
+    for i in range(task_count):
+        task_id = manager.create_task('m4s_convert', {'worker': worker, 'index': i})
+        created.append(task_id)
+        for step in range(update_count):
+            manager.update_task(task_id, status='running', progress=step * 100 // update_count,
+                                message=f'线程 {worker} 第 {step} 步')
+        manager.update_task(task_id, status='completed', progress=100, message='完成',
+                            result={'worker': worker, 'index': i})
+
+def reader(manager, stop, errors, reads):
+    """不断读取并序列化全部任务"""
+    while not stop.is_set():
+        try:
+            json.dumps({'tasks': manager.get_all_tasks()}, ensure_ascii=False)
+            manager.count_by_status()
+            reads[0] += 1
+        except Exception as e:  # noqa: BLE001 - 任何异常都说明读写不安全
+            errors.append(repr(e))
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='TaskManager 并发压力测试')
+    parser.add_argument('--threads', type=int, default=300, help='更新线程数 (默认: 300)')
+    parser.add_argument('--tasks', type=int, default=5, help='每个线程创建的任务数 (默认: 5)')
+    parser.add_argument('--updates', type=int, default=20, help='每个任务的更新次数 (默认: 20)')
+    parser.add_argument('--readers', type=int, default=8, help='读取线程数 (默认: 8)')
+    args = parser.parse_args()
+    
+    # 降低合并阈值，让压力测试期间频繁写出快照
+    task_manager.COMPACT_MIN_RECORDS = 500
+    task_manager.COMPACT_RATIO = 1
+    
+    with tempfile.TemporaryDirectory(prefix='musictool_stress_') as work_dir:
+        state_file = Path(work_dir) / 'task_state.json'
+        manager = TaskManager(state_file)
+        
+        created = []
+        errors = []
+        reads = [0]
+        stop = threading.Event()
+        readers = [threading.Thread(target=reader, args=(manager, stop, errors, reads))
+                   for _ in range(args.readers)]
+        updaters = [threading.Thread(target=updater, args=(manager, worker, args.tasks, args.updates, created))
+                    for worker in range(args.threads)]
+        
+        started = time.perf_counter()
+        for thread in readers + updaters:
+            thread.start()
+        for thread in updaters:
+            thread.join()
+        stop.set()
+        for thread in readers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        expected = args.threads * args.tasks
+        problems = list(errors[:5])
+        if len(set(created)) != expected:
+            problems.append(f"任务 ID 重复或丢失: {len(set(created))} != {expected}")
+        if manager.task_counter != expected:
+            problems.append(f"计数器错误: {manager.task_counter} != {expected}")
+        tasks = {task['id']: task for task in manager.get_all_tasks()}
+        bad = [t for t in tasks.values() if t['status'] != 'completed' or t['progress'] != 100]
+        if bad:
+            problems.append(f"{len(bad)} 个任务最终状态错误，例如: {bad[0]}")
+        if manager.count_by_status() != {'completed': expected}:
+            problems.append(f"状态计数与任务不一致: {manager.count_by_status()}")
+        
+        manager.journal.close()
+        reloaded = TaskManager(state_file)
+        if {t['id']: t for t in reloaded.get_all_tasks()} != tasks or reloaded.task_counter != expected:
+            problems.append("重新加载后的状态与内存中的状态不一致")
+        reloaded.journal.close()
+    
+    total_updates = expected * (args.updates + 2)
+    print(f"{args.threads} 个更新线程 × {args.tasks} 个任务 × {args.updates} 次更新, {args.readers} 个读取线程")
+    print(f"耗时 {elapsed:.2f} 秒, {total_updates / elapsed:,.0f} 次写入/秒, 读取 {reads[0]} 次")
+    if problems:
+        print("❌ 发现问题:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+    print("✅ 状态一致")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件索引
+为 /api/files 维护目录树的内存索引，避免每次请求都遍历整个目录并逐个 stat:
+
+- 首次查询时用 os.scandir 扫描整个目录树，记录每个目录的 mtime 和其中的文件
+- 之后的查询最多每 refresh_interval 秒检查一次: 只 stat 目录本身，
+  mtime 变化（有文件新增、删除或改名）的目录才重新扫描
+- 文件内容变化不会改变目录 mtime，因此每 full_rescan_interval 秒完整重扫一次；
+  已知有写入的目录（例如任务输出目录）可以调用 invalidate 立即标记重扫
+- 排序结果按索引版本缓存，翻页时不重复排序
+
+不使用 inotify: 输出目录通常挂载在 NAS (NFS/SMB) 上，inotify 收不到其他主机的修改。
+多个进程各自维护索引时（多工作进程部署），写入输出的进程把 invalidate 过的目录记录在
+InvalidationLog 中，其他进程查询前据此同步。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 两次检查目录 mtime 的最小间隔（秒）
+DEFAULT_REFRESH_INTERVAL = 5
+# 完整重扫的间隔（秒），用于发现原地写入导致的文件大小变化
+DEFAULT_FULL_RESCAN_INTERVAL = 300
+
+SORT_KEYS = ('path', 'name', 'size', 'modified')
+
+# 失效记录保留的条数，落后更多的进程直接完整重扫
+INVALIDATION_LOG_SIZE = 1000
+
+class _Directory:
+    """索引中的一个目录"""
+    
+    __slots__ = ('mtime_ns', 'files', 'subdirs')
+    
+    def __init__(self, mtime_ns, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files = files              # [(相对路径, 文件名, 大小, mtime)]
+        self.subdirs = subdirs          # [子目录绝对路径]
+
+class InvalidationLog:
+    """按序号记录需要重扫的目录（线程安全）"""
+    
+    def __init__(self, capacity=INVALIDATION_LOG_SIZE):
+        self._paths = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+    
+    def add(self, path):
+        """记录一个需要重扫的目录"""
+        with self._lock:
+            self._seq += 1
+            self._paths.append(os.path.abspath(path))
+    
+    def since(self, seq):
+        """
+        获取序号 seq 之后记录的目录
+        
+        Returns:
+            tuple: (最新序号, 目录列表)；seq 之后的记录已被挤出或序号无效时目录列表为 None，
+                   调用方应完整重扫
+        """
+        with self._lock:
+            missing = self._seq - seq
+            if not 0 <= missing <= len(self._paths):
+                return self._seq, None
+            size = len(self._paths)
+            return self._seq, [self._paths[index] for index in range(size - missing, size)]
+
+class FileIndex:
+    """单个根目录的文件索引（线程安全）"""
+    
+    def __init__(self, root, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 full_rescan_interval=DEFAULT_FULL_RESCAN_INTERVAL):
+        self.root = Path(os.path.abspath(root))
+        self.refresh_interval = refresh_interval
+        self.full_rescan_interval = full_rescan_interval
+        self.version = 0
+        self._dirs = {}                 # 目录绝对路径 -> _Directory
+        self._dirty = set()             # 需要强制重扫的目录（包括其子目录）
+        self._files = []                # 全部文件，版本变化时重建
+        self._sorted = {}               # (排序字段, 是否倒序) -> 排好序的文件列表
+        self._checked_at = None
+        self._full_scan_at = None
+        self._lock = threading.Lock()
+    
+    def invalidate(self, path=None):
+        """标记目录及其子目录需要重扫（path 为空时下次查询完整重扫）"""
+        with self._lock:
+            if path is None:
+                self._full_scan_at = None
+            else:
+                self._dirty.add(os.path.abspath(path))
+            self._checked_at = None
+    
+    def _scan_directory(self, path, mtime_ns):
+        """扫描单个目录（不递归），每个文件只 stat 一次"""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            info = entry.stat()
+                            rel_path = os.path.relpath(entry.path, self.root)
+                            files.append((rel_path, entry.name, info.st_size, info.st_mtime))
+                    except OSError:
+                        # 扫描期间被删除的文件
+                        continue
+        except OSError as e:
+            logger.warning(f"扫描目录失败: {path}: {e}")
+        return _Directory(mtime_ns, files, subdirs)
+    
+    def _is_dirty(self, path):
+        """目录是否被 invalidate 标记过（包括标记了上级目录）"""
+        return any(path == dirty or path.startswith(dirty + os.sep) for dirty in self._dirty)
+    
+    def _refresh(self, full):
+        """检查目录树，重扫有变化的目录（调用方持有 _lock），返回是否有变化"""
+        changed = False
+        seen = set()
+        pending = [str(self.root)]
+        while pending:
+            path = pending.pop()
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(path)
+            directory = self._dirs.get(path)
+            if full or directory is None or directory.mtime_ns != mtime_ns or self._is_dirty(path):
+                directory = self._scan_directory(path, mtime_ns)
+                self._dirs[path] = directory
+                changed = True
+            pending.extend(directory.subdirs)
+        
+        removed = self._dirs.keys() - seen
+        for path in removed:
+            del self._dirs[path]
+        self._dirty.clear()
+        return changed or bool(removed)
+    
+    def _ensure_fresh(self):
+        """按间隔检查索引是否过期（调用方持有 _lock）"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return
+        full = self._full_scan_at is None or now - self._full_scan_at >= self.full_rescan_interval
+        started = time.perf_counter()
+        if self._refresh(full):
+            self.version += 1
+            self._files = [item for directory in self._dirs.values() for item in directory.files]
+            self._sorted = {}
+            logger.info(f"📇 文件索引已更新: {self.root}, {len(self._files)} 个文件, "
+                        f"{len(self._dirs)} 个目录, 耗时 {time.perf_counter() - started:.3f} 秒")
+        self._checked_at = now
+        if full:
+            self._full_scan_at = now
+    
+    def _sorted_files(self, sort, reverse):
+        """按字段排序的全部文件（调用方持有 _lock），结果按索引版本缓存"""
+        key = (sort, reverse)
+        files = self._sorted.get(key)
+        if files is None:
+            index = {'path': 0, 'name': 1, 'size': 2, 'modified': 3}[sort]
+            files = sorted(self._files, key=lambda item: item[index], reverse=reverse)
+            self._sorted[key] = files
+        return files
+    
+    def list(self, offset=0, limit=100, sort='path', reverse=False, extensions=None):
+        """
+        分页列出文件
+        
+        Args:
+            offset (int): 跳过的文件数
+            limit (int): 最多返回的文件数
+            sort (str): 排序字段，见 SORT_KEYS
+            reverse (bool): 是否倒序
+            extensions (set): 只返回这些扩展名的文件（小写，带点，例如 {'.flac'}）
+        
+        Returns:
+            tuple: (文件列表, 符合条件的文件总数)
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        with self._lock:
+            self._ensure_fresh()
+            files = self._sorted_files(sort, reverse)
+        
+        if extensions:
+            files = [item for item in files if os.path.splitext(item[1])[1].lower() in extensions]
+        page = files[offset:offset + limit]
+        return [{
+            'name': name,
+            'path': rel_path,
+            'size': size,
+            'type': os.path.splitext(name)[1].lower(),
+            'modified': datetime.fromtimestamp(mtime).isoformat()
+        } for rel_path, name, size, mtime in page], len(files)
@@ -24,11 +24,17 @@ def main():
   # 启动Web界面
   python main.py web
   
+  # 生产环境（gunicorn）
+  python main.py web --production --host 0.0.0.0 --threads 32
+  
   # 音频分割
-  python main.py split audio.flac audio.cue [输出目录]
+  python main.py split audio.flac audio.cue [输出目录] [--jobs N]
+  
+  # 批量分割目录中的所有 CUE/音频镜像
+  python main.py batch 输入目录 -o 输出目录 [--jobs N] [--albums N]
   
   # M4S转换
-  python main.py m4s 输入目录 输出目录
+  python main.py m4s 输入目录 输出目录 [--workers N]
   
   # 显示帮助
   python main.py --help
@@ -41,17 +47,72 @@ def main():
     web_parser = subparsers.add_parser('web', help='启动Web界面')
     web_parser.add_argument('--port', '-p', type=int, default=5000, help='Web服务端口 (默认: 5000)')
     web_parser.add_argument('--host', type=str, default='127.0.0.1', help='Web服务主机 (默认: 127.0.0.1)')
+    web_parser.add_argument('--production', action='store_true',
+                            help='使用 gunicorn 运行（需要安装 gunicorn），而不是 Flask 开发服务器')
+    web_parser.add_argument('--workers', type=int, default=int(os.environ.get('MUSICTOOL_WEB_WORKERS', 0)) or 1,
+                            help='生产模式 gunicorn 工作进程数，大于 1 时任务在单独的任务服务进程中运行 (默认: 1)')
+    web_parser.add_argument('--threads', type=int, default=int(os.environ.get('MUSICTOOL_WEB_THREADS', 0)) or 32,
+                            help='生产模式每个工作进程处理请求的线程数，每个打开的页面的事件流一直占用一个 (默认: 32)')
+    web_parser.add_argument('--keep-alive', type=int, default=5,
+                            help='生产模式 HTTP keep-alive 空闲超时秒数 (默认: 5)')
+    web_parser.add_argument('--drain-timeout', type=float,
+                            default=float(os.environ.get('MUSICTOOL_DRAIN_TIMEOUT', 300)),
+                            help='停止服务时等待运行中任务的最长秒数，超时后取消 (默认: 300)')
     
     # 音频分割命令
     split_parser = subparsers.add_parser('split', help='音频分割功能')
     split_parser.add_argument('audio_file', help='音频文件路径 (FLAC/WAV)')
     split_parser.add_argument('cue_file', help='CUE文件路径')
     split_parser.add_argument('output_dir', nargs='?', default='切割后的歌曲', help='输出目录 (默认: 切割后的歌曲)')
+    split_parser.add_argument('--mode', choices=['auto', 'native', 'single_pass', 'per_track'], default='auto',
+                              help='切割模式: auto 自动选择, native 直接复制WAV采样数据/FLAC帧, '
+                                   'single_pass 单次解码写出全部轨道, per_track 逐轨调用ffmpeg (默认: auto)')
+    split_parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                              help='同时运行的切割任务数 (默认: CPU 核心数)')
+    split_parser.add_argument('--force', action='store_true', help='忽略转换缓存，重新切割所有轨道')
+    split_parser.add_argument('--prune-cache', action='store_true', help='清理转换缓存中失效的记录')
+    split_parser.add_argument('--manifest', default=None, help='把每个轨道的输出信息写入清单文件 (JSON Lines)')
+    
+    # 批量分割命令
+    batch_parser = subparsers.add_parser('batch', help='批量分割目录中的所有 CUE/音频镜像')
+    batch_parser.add_argument('paths', nargs='+', help='输入目录（递归查找）或文件')
+    batch_parser.add_argument('--output', '-o', required=True, help='输出目录')
+    batch_parser.add_argument('--mode', choices=['auto', 'native', 'single_pass', 'per_track'], default='auto',
+                              help='切割模式 (默认: auto)')
+    batch_parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                              help='同时运行的切割任务总数 (默认: CPU 核心数)')
+    batch_parser.add_argument('--albums', type=int, default=None,
+                              help='同时处理的专辑数 (默认: 切割任务数的一半)')
+    batch_parser.add_argument('--force', action='store_true', help='忽略转换缓存，重新切割所有轨道')
+    batch_parser.add_argument('--manifest', default=None, help='把每个轨道的输出信息写入清单文件 (JSON Lines)')
+    
+    # B站缓存合并命令
+    bili_parser = subparsers.add_parser('bili', help='合并 B 站客户端缓存中的视频流和音频流')
+    bili_parser.add_argument('paths', nargs='+', help='缓存目录（递归查找）')
+    bili_parser.add_argument('--output', '-o', required=True, help='输出目录')
+    bili_parser.add_argument('--format', choices=['mp4', 'mkv', 'm4a'], default='mp4',
+                             help='输出格式，m4a 只输出音频 (默认: mp4)')
+    bili_parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                             help='同时运行的合并任务数 (默认: CPU 核心数)')
+    bili_parser.add_argument('--force', action='store_true', help='忽略转换缓存，重新合并所有视频')
+    bili_parser.add_argument('--manifest', default=None, help='把每个视频的输出信息写入清单文件 (JSON Lines)')
+    bili_parser.add_argument('--list', action='store_true', help='只列出找到的视频，不合并')
     
     # M4S转换命令
     m4s_parser = subparsers.add_parser('m4s', help='M4S转MP3功能')
     m4s_parser.add_argument('input_dir', help='M4S文件输入目录')
     m4s_parser.add_argument('output_dir', help='MP3文件输出目录')
+    m4s_parser.add_argument('--workers', '-w', type=int, default=os.cpu_count() or 1,
+                            help='并行转换的工作线程数 (默认: CPU 核心数)')
+    m4s_parser.add_argument('--cpu-budget', type=int, default=None,
+                            help='同时运行的 ffmpeg 进程总数上限 (默认: 不限制)')
+    m4s_parser.add_argument('--force', action='store_true', help='忽略转换缓存，重新转换所有文件')
+    m4s_parser.add_argument('--prune-cache', action='store_true', help='清理转换缓存中失效的记录')
+    m4s_parser.add_argument('--manifest', default=None, help='把每个文件的输出信息写入清单文件 (JSON Lines)')
+    m4s_parser.add_argument('--format', choices=['aac', 'm4a', 'mka', 'mp3'], default='mp3',
+                            help='输出格式；m4a/aac/mka 直接复制 AAC 音频流，不重新编码 (默认: mp3)')
+    m4s_parser.add_argument('--codec-mode', choices=['auto', 'copy', 'transcode'], default='auto',
+                            help='auto 探测源编码后决定直接复制还是转码, copy 总是复制, transcode 总是转码 (默认: auto)')
     
     args = parser.parse_args()
     
@@ -66,33 +127,103 @@ def main():
             print(f"   地址: http://{args.host}:{args.port}")
             print(f"   按 Ctrl+C 停止服务")
             
-            # 导入并启动Flask应用
-            from web_app import app
-            app.run(host=args.host, port=args.port, debug=False)
-            
+            if args.production:
+                # 在 gunicorn 工作进程中导入 web_app
+                import wsgi_server
+                print(f"   模式: gunicorn, {args.workers} 个工作进程 × {args.threads} 个线程, "
+                      f"keep-alive {args.keep_alive} 秒")
+                wsgi_server.run(args.host, args.port, workers=args.workers, threads=args.threads,
+                                keep_alive=args.keep_alive, drain_timeout=args.drain_timeout)
+            else:
+                # 导入并启动Flask应用
+                from web_app import app, shutdown
+                try:
+                    app.run(host=args.host, port=args.port, debug=False, threaded=True)
+                finally:
+                    shutdown(args.drain_timeout)
+        
         elif args.command == 'split':
             # 音频分割
             print(f"🎵 开始音频分割...")
             print(f"   音频文件: {args.audio_file}")
             print(f"   CUE文件: {args.cue_file}")
             print(f"   输出目录: {args.output_dir}")
+            print(f"   切割模式: {args.mode}")
+            print(f"   并发任务数: {args.jobs}")
             
             # 导入并运行分割脚本
             import audio_splitter
-            sys.argv = ['audio_splitter.py', args.audio_file, args.cue_file, args.output_dir]
-            audio_splitter.main()
+            split_args = [args.audio_file, args.cue_file, args.output_dir,
+                          '--mode', args.mode, '--jobs', str(args.jobs)]
+            if args.force:
+                split_args.append('--force')
+            if args.prune_cache:
+                split_args.append('--prune-cache')
+            if args.manifest:
+                split_args.extend(['--manifest', args.manifest])
+            audio_splitter.main(split_args)
+        
+        elif args.command == 'batch':
+            # 批量分割
+            print(f"🎵 开始批量分割...")
+            print(f"   输入: {', '.join(args.paths)}")
+            print(f"   输出目录: {args.output}")
+            
+            import batch_splitter
+            batch_args = list(args.paths) + ['--output', args.output, '--mode', args.mode, '--jobs', str(args.jobs)]
+            if args.albums:
+                batch_args.extend(['--albums', str(args.albums)])
+            if args.force:
+                batch_args.append('--force')
+            if args.manifest:
+                batch_args.extend(['--manifest', args.manifest])
+            sys.exit(batch_splitter.main(batch_args))
+        
+        elif args.command == 'bili':
+            # B站缓存合并
+            print(f"🎬 开始合并 B 站缓存...")
+            print(f"   缓存目录: {', '.join(args.paths)}")
+            print(f"   输出目录: {args.output}")
             
+            import bilibili_cache
+            bili_args = list(args.paths) + ['--output', args.output, '--format', args.format,
+                                            '--jobs', str(args.jobs)]
+            if args.force:
+                bili_args.append('--force')
+            if args.manifest:
+                bili_args.extend(['--manifest', args.manifest])
+            if args.list:
+                bili_args.append('--list')
+            sys.exit(bilibili_cache.main(bili_args))
+        
         elif args.command == 'm4s':
             # M4S转换
             print(f"🔄 开始M4S转换...")
             print(f"   输入目录: {args.input_dir}")
             print(f"   输出目录: {args.output_dir}")
+            print(f"   并行任务数: {args.workers}")
+            print(f"   输出格式: {args.format} ({args.codec_mode})")
             
             # 导入并运行M4S转换脚本
             import m4s_to_mp3_ffmpeg
-            converter = m4s_to_mp3_ffmpeg.M4SToMP3Converter(args.input_dir, args.output_dir)
-            converter.convert_all_files()
-            
+            from output_manifest import ManifestWriter
+            m4s_to_mp3_ffmpeg.configure_logging()
+            if args.cpu_budget:
+                m4s_to_mp3_ffmpeg.set_global_cpu_budget(args.cpu_budget)
+            manifest = ManifestWriter(args.manifest) if args.manifest else None
+            try:
+                converter = m4s_to_mp3_ffmpeg.M4SToMP3ConverterFFmpeg(args.input_dir, args.output_dir,
+                                                                      workers=args.workers, force=args.force,
+                                                                      prune_cache=args.prune_cache,
+                                                                      manifest=manifest,
+                                                                      output_format=args.format,
+                                                                      codec_mode=args.codec_mode)
+                converter.convert_all_files()
+            finally:
+                if manifest:
+                    manifest.close()
+                    print(f"📝 输出清单: {args.manifest} ({manifest.count} 条)")
+    
     except KeyboardInterrupt:
         print("\n\n👋 用户取消操作")
     except ImportError as e:
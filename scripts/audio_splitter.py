@@ -16,186 +16,669 @@
 
 使用方法:
     python audio_splitter.py [目录路径]
-    
+    python audio_splitter.py <音频文件> <CUE文件> [输出目录] [--mode auto|native|single_pass|per_track] [--jobs N]
+
 示例:
     python audio_splitter.py                    # 在当前目录查找文件
     python audio_splitter.py /path/to/music     # 在指定目录查找文件
+    python audio_splitter.py a.flac a.cue out --mode per_track   # 逐轨调用 ffmpeg
+    python audio_splitter.py a.flac a.cue out --manifest out.jsonl  # 写出每个轨道的输出清单
+
+作为库使用（Web 界面在进程内直接调用，返回每个轨道的结果）:
+    from audio_splitter import split_cue_image
+    result = split_cue_image('a.flac', 'a.cue', 'out', progress_callback=on_progress)
 """
 
 import os
 import re
-import sys
+import time
 from pathlib import Path
 
+from conversion_cache import ConversionCache
+from cue_parser import detect_file_encoding, parse_cue_sheet
+from flac_splitter import FlacFormatError, FlacSource, read_flac_header
+from ffmpeg_progress import ProgressTracker, print_progress, run_ffmpeg
+from media_probe import probe_media
+from output_manifest import ManifestWriter, manifest_entry
+from wav_splitter import WavFormatError, read_wav_info, track_sample_range, write_track
+
 def detect_encoding(file_path):
-    """检测文件编码"""
-    import chardet
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-        result = chardet.detect(raw_data)
-        return result['encoding'] or 'utf-8'
+    """检测文件编码（结果按路径、修改时间、大小缓存）"""
+    return detect_file_encoding(file_path)
 
 def parse_cue_file(cue_file_path):
     """解析CUE文件，提取歌曲信息"""
     print(f"正在解析CUE文件: {cue_file_path}")
     
-    # 检测编码
-    encoding = detect_encoding(cue_file_path)
+    # 文件只读取一次：检测编码后直接解码并逐行解析
+    sheet, encoding = parse_cue_sheet(cue_file_path)
     print(f"检测到编码: {encoding}")
     
-    with open(cue_file_path, 'r', encoding=encoding) as f:
-        content = f.read()
-    
-    # 提取专辑信息
-    album_title = ""
-    album_performer = ""
-    audio_file = ""
-    
-    title_match = re.search(r'TITLE\s+"([^"]+)"', content)
-    if title_match:
-        album_title = title_match.group(1)
-    
-    performer_match = re.search(r'PERFORMER\s+"([^"]+)"', content)
-    if performer_match:
-        album_performer = performer_match.group(1)
-    
-    file_match = re.search(r'FILE\s+"([^"]+)"', content)
-    if file_match:
-        audio_file = file_match.group(1)
-    
-    print(f"专辑: {album_title}")
-    print(f"艺术家: {album_performer}")
-    print(f"音频文件: {audio_file}")
-    
-    # 提取轨道信息
-    tracks = []
-    track_blocks = re.findall(r'TRACK\s+(\d+)\s+AUDIO(.*?)(?=TRACK\s+\d+\s+AUDIO|$)', content, re.DOTALL)
-    
-    for track_num, track_content in track_blocks:
-        track_num_int = int(track_num)
-        track_info = {
-            'number': track_num_int,
-            'title': f'Track_{track_num_int:02d}',
-            'performer': album_performer
-        }
-        
-        # 提取歌曲标题
-        title_match = re.search(r'TITLE\s+"([^"]+)"', track_content)
-        if title_match:
-            track_info['title'] = title_match.group(1)
-        
-        # 提取演唱者
-        performer_match = re.search(r'PERFORMER\s+"([^"]+)"', track_content)
-        if performer_match:
-            track_info['performer'] = performer_match.group(1)
-        
-        # 提取开始时间
-        index_match = re.search(r'INDEX\s+01\s+(\d+):(\d+):(\d+)', track_content)
-        if index_match:
-            minutes, seconds, frames = map(int, index_match.groups())
-            # 75帧 = 1秒
-            total_seconds = minutes * 60 + seconds + frames / 75
-            track_info['start_time'] = total_seconds
-        else:
-            track_info['start_time'] = 0
-        
-        tracks.append(track_info)
-    
-    # 计算每首歌的结束时间
-    for i in range(len(tracks)):
-        if i < len(tracks) - 1:
-            tracks[i]['duration'] = tracks[i + 1]['start_time'] - tracks[i]['start_time']
-        else:
-            tracks[i]['duration'] = None  # 最后一首歌到文件结束
+    print(f"专辑: {sheet.title}")
+    print(f"艺术家: {sheet.performer}")
+    print(f"音频文件: {sheet.audio_file}")
+    if len(sheet.files) > 1:
+        print(f"⚠️ CUE文件包含 {len(sheet.files)} 个FILE条目")
     
+    tracks = sheet.to_track_dicts()
     print(f"找到 {len(tracks)} 首歌曲")
-    return tracks, album_title, album_performer, audio_file
+    return tracks, sheet.title, sheet.performer, sheet.audio_file
+
+def select_tracks_for_audio(tracks, audio_file):
+    """
+    多 FILE 的 CUE 中只保留属于指定音频文件的轨道
+    
+    先按文件名匹配，再按不含扩展名的文件名匹配（CUE 中常写成 .wav 而实际是 .flac）；
+    都匹配不上时返回全部轨道。
+    """
+    files = {track.get('file') for track in tracks}
+    if len(files) <= 1:
+        return tracks
+    
+    name = Path(audio_file).name.lower()
+    stem = Path(audio_file).stem.lower()
+    for matches in (lambda f: Path(f).name.lower() == name, lambda f: Path(f).stem.lower() == stem):
+        selected = [track for track in tracks if track.get('file') and matches(track['file'])]
+        if selected:
+            return selected
+    return tracks
 
 def clean_filename(name):
     """清理文件名中的非法字符"""
     illegal_chars = r'[<>:"/\\|?*]'
     return re.sub(illegal_chars, '_', name).strip()
 
-def split_audio_with_ffmpeg(audio_file, tracks, output_dir="output"):
-    """使用ffmpeg切割音频文件（支持FLAC和WAV）"""
+# 切割模式
+#   auto:        WAV / FLAC 使用 native，其他格式使用 single_pass
+#   native:      不经过 ffmpeg: WAV 直接按采样位置复制 PCM 数据；FLAC 原样复制完整的帧，
+#                只重新编码轨道边界所在的帧
+#   single_pass: 一次 ffmpeg 调用，源文件只解码一次，同时写出所有轨道
+#   per_track:   每个轨道单独调用一次 ffmpeg（使用输入端快速定位）
+SPLIT_MODES = ('auto', 'native', 'single_pass', 'per_track')
+DEFAULT_SPLIT_MODE = 'auto'
+NATIVE_FORMATS = ('.wav', '.flac')
+
+def get_output_format(audio_file):
+    """根据输入文件扩展名确定输出格式，返回 (扩展名, 编码器, 编码参数)，不支持时返回 None"""
+    input_ext = Path(audio_file).suffix.lower()
+    if input_ext == '.flac':
+        return '.flac', 'flac', ['-compression_level', '5']
+    if input_ext == '.wav':
+        return '.wav', 'pcm_s16le', []  # 16位PCM编码
+    return None
+
+def build_output_filename(track, output_ext):
+    """根据轨道信息生成输出文件名"""
+    track_num = track['number']
+    title = clean_filename(track['title'])
+    performer = clean_filename(track['performer'])
+    
+    if performer:
+        return f"{track_num:02d}. {performer} - {title}{output_ext}"
+    return f"{track_num:02d}. {title}{output_ext}"
+
+def _format_seconds(value):
+    """格式化秒数，供 ffmpeg 参数和滤镜使用"""
+    return f"{value:.6f}"
+
+def _known_length(track):
+    """轨道时长：CUE 中的时长，最后一首歌为 with_source_length 补上的时长，都没有时为 None"""
+    return track['duration'] or track.get('length')
+
+def _estimated_length(track, tracks):
+    """轨道时长；最后一首歌时长未知时按其他轨道的平均时长估算"""
+    if _known_length(track):
+        return _known_length(track)
+    known = [t['duration'] for t in tracks if t['duration']]
+    return sum(known) / len(known) if known else 180.0
+
+def with_source_length(tracks, source_duration):
+    """
+    返回轨道列表，CUE 中没有时长的轨道（最后一首歌）补上 length: 源文件时长减去轨道起点
+    
+    length 只用于进度估算和分组，duration 保持不变，切割命令和转换缓存不受影响。
+    """
+    return [track if track['duration'] else dict(track, length=max(0.0, source_duration - track['start_time']))
+            for track in tracks]
+
+def validate_tracks(tracks, source_duration):
+    """
+    检查轨道位置是否都在源文件时长之内
+    
+    Returns:
+        str: 问题描述，没有问题时返回 None
+    """
+    for track in tracks:
+        if track['start_time'] >= source_duration:
+            return (f"轨道 {track['number']} 的起点 {track['start_time']:.2f} 秒超出了音频时长 "
+                    f"{source_duration:.2f} 秒")
+    return None
+
+def _ffmpeg_progress_hooks(tracker, key, length, start):
+    """
+    生成 run_ffmpeg 的进度回调
+    
+    Args:
+        tracker (ProgressTracker): 整体进度，为 None 时不跟踪
+        key: 工作单元标识
+        length (float): 这次 ffmpeg 调用要输出的时长，未知时为 None
+        start (float): 输出起点在源文件中的位置（用于根据源文件时长推算未知的 length）
+    """
+    if tracker is None:
+        return None, None
+    state = {'length': length}
+    
+    def on_duration(duration):
+        if state['length'] is None and duration > start:
+            state['length'] = duration - start
+            tracker.set_weight(key, state['length'])
+    
+    def on_time(seconds):
+        if state['length']:
+            tracker.update(key, seconds / state['length'])
+    
+    return on_time, on_duration
+
+def resolve_jobs(jobs=None):
+    """确定并发任务数，未指定时使用 CPU 核心数"""
+    if not jobs or jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+def _build_track_command(audio_file, track, output_path, codec, codec_params):
+    """构建单个轨道的 ffmpeg 命令（-ss 放在 -i 之前：输入端定位，无需从头解码）"""
+    cmd = [
+        'ffmpeg', '-y',  # 覆盖已存在的文件
+        '-ss', _format_seconds(track['start_time']),
+        '-i', audio_file
+    ]
+    
+    # 添加时长参数（如果有明确的结束时间）
+    if track['duration']:
+        cmd.extend(['-t', _format_seconds(track['duration'])])
+    
+    # 添加编码参数
+    cmd.extend(['-c:a', codec])
+    cmd.extend(codec_params)
+    
+    # 添加输出文件
+    cmd.append(output_path)
+    return cmd
+
+def _split_per_track(audio_file, tracks, output_dir, output_ext, codec, codec_params, jobs, on_success,
+                     tracker=None, on_failure=None, job=None):
+    """逐轨切割：每个轨道启动一次 ffmpeg，最多 jobs 个轨道同时编码，返回是否所有轨道都成功"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    if tracker:
+        for track in tracks:
+            tracker.add(track['number'], _estimated_length(track, tracks))
+    
+    def process(track):
+        output_filename = build_output_filename(track, output_ext)
+        output_path = os.path.join(output_dir, output_filename)
+        cmd = _build_track_command(audio_file, track, output_path, codec, codec_params)
+        on_time, on_duration = _ffmpeg_progress_hooks(tracker, track['number'], _known_length(track),
+                                                      track['start_time'])
+        started = time.monotonic()
+        try:
+            ok, stderr = run_ffmpeg(cmd, on_time=on_time, on_duration=on_duration, job=job)
+        finally:
+            if tracker:
+                tracker.finish(track['number'])
+        return track, output_filename, ok, stderr, time.monotonic() - started
+    
+    for track in tracks:
+        print(f"正在处理: {build_output_filename(track, output_ext)}")
+        print(f"开始时间: {track['start_time']:.2f}秒")
+    
+    all_ok = True
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process, track) for track in tracks]
+        for future in as_completed(futures):
+            track, output_filename, ok, stderr, elapsed = future.result()
+            if ok:
+                print(f"✅ 完成: {output_filename}")
+                on_success(track, elapsed)
+            else:
+                all_ok = False
+                print(f"❌ 失败: {output_filename}")
+                print(f"错误信息: {stderr}")
+                if on_failure:
+                    on_failure(track, stderr, elapsed)
+    
+    return all_ok
+
+def group_tracks(tracks, groups):
+    """
+    将轨道按顺序划分为最多 groups 个连续分组，使各组总时长尽量接近
+    
+    最后一首歌时长未知（源文件也没有探测到时长）时按已知轨道的平均时长估算。
+    """
+    groups = max(1, min(groups, len(tracks)))
+    if groups == 1:
+        return [list(tracks)]
+    
+    known = [_known_length(t) for t in tracks if _known_length(t)]
+    average = sum(known) / len(known) if known else 1.0
+    lengths = [_known_length(t) or average for t in tracks]
+    target = sum(lengths) / groups
+    
+    # 按每首歌中点所在的区间分组，保证分组连续且不会出现空组
+    result = [[] for _ in range(groups)]
+    elapsed = 0.0
+    for track, length in zip(tracks, lengths):
+        index = min(groups - 1, int((elapsed + length / 2) / target))
+        result[index].append(track)
+        elapsed += length
+    return [group for group in result if group]
+
+def build_single_pass_command(audio_file, tracks, output_dir, output_ext, codec, codec_params):
+    """
+    构建单次解码的多输出 ffmpeg 命令
+    
+    源音频从第一首的开始位置定位读取，通过 asplit 分成 N 路，每一路用 atrim
+    截取对应轨道的时间段，再分别编码到各自的输出文件。整个过程只打开和解码
+    这一段源音频一次。
+    
+    Returns:
+        tuple: (ffmpeg 命令列表, 输出文件名列表)
+    """
+    count = len(tracks)
+    offset = tracks[0]['start_time']
+    last = tracks[-1]
+    
+    cmd = ['ffmpeg', '-y']
+    if offset:
+        cmd.extend(['-ss', _format_seconds(offset)])
+    if last['duration']:
+        cmd.extend(['-t', _format_seconds(last['start_time'] + last['duration'] - offset)])
+    cmd.extend(['-i', audio_file])
+    
+    filters = []
+    if count == 1:
+        sources = ['[0:a]']
+    else:
+        sources = [f'[s{i}]' for i in range(count)]
+        filters.append(f"[0:a]asplit={count}{''.join(sources)}")
+    
+    for i, track in enumerate(tracks):
+        trim = f"atrim=start={_format_seconds(track['start_time'] - offset)}"
+        if track['duration']:
+            trim += f":duration={_format_seconds(track['duration'])}"
+        filters.append(f"{sources[i]}{trim},asetpts=PTS-STARTPTS[t{i}]")
+    
+    cmd.extend(['-filter_complex', ';'.join(filters)])
+    output_filenames = []
+    for i, track in enumerate(tracks):
+        output_filename = build_output_filename(track, output_ext)
+        output_filenames.append(output_filename)
+        cmd.extend(['-map', f'[t{i}]', '-c:a', codec])
+        cmd.extend(codec_params)
+        cmd.append(os.path.join(output_dir, output_filename))
+    
+    return cmd, output_filenames
+
+def _split_single_pass(audio_file, tracks, output_dir, output_ext, codec, codec_params, jobs, on_success,
+                       tracker=None, on_failure=None, job=None):
+    """
+    单次解码切割：轨道划分为最多 jobs 个连续分组，每组由一个 ffmpeg 进程
+    一次写出，各组并行执行，整张镜像总共只解码一遍
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    groups = group_tracks(tracks, jobs)
+    print(f"单次解码模式: {len(tracks)} 个轨道分为 {len(groups)} 组并行处理")
+    
+    if tracker:
+        for index, group in enumerate(groups):
+            tracker.add(index, sum(_estimated_length(track, tracks) for track in group))
+    
+    def process(index, group):
+        cmd, output_filenames = build_single_pass_command(
+            audio_file, group, output_dir, output_ext, codec, codec_params
+        )
+        # 每组从第一首的开始位置定位，out_time 即这一组已处理的时长
+        start = group[0]['start_time']
+        last = group[-1]
+        length = last['start_time'] + _known_length(last) - start if _known_length(last) else None
+        on_time, on_duration = _ffmpeg_progress_hooks(tracker, index, length, start)
+        started = time.monotonic()
+        try:
+            ok, stderr = run_ffmpeg(cmd, on_time=on_time, on_duration=on_duration, job=job)
+        finally:
+            if tracker:
+                tracker.finish(index)
+        return group, output_filenames, ok, stderr, time.monotonic() - started
+    
+    for track in tracks:
+        print(f"正在处理: {build_output_filename(track, output_ext)}")
+    
+    all_ok = True
+    with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        futures = [executor.submit(process, index, group) for index, group in enumerate(groups)]
+        for future in as_completed(futures):
+            # 一组轨道由同一个 ffmpeg 进程写出，每个轨道记录整组的耗时
+            group, output_filenames, ok, stderr, elapsed = future.result()
+            if not ok:
+                all_ok = False
+                for track, output_filename in zip(group, output_filenames):
+                    print(f"❌ 失败: {output_filename}")
+                    if on_failure:
+                        on_failure(track, stderr, elapsed)
+                print(f"错误信息: {stderr}")
+                continue
+            for track, output_filename in zip(group, output_filenames):
+                if os.path.exists(os.path.join(output_dir, output_filename)):
+                    print(f"✅ 完成: {output_filename}")
+                    on_success(track, elapsed)
+                else:
+                    all_ok = False
+                    print(f"❌ 失败: {output_filename} (未生成输出文件)")
+                    if on_failure:
+                        on_failure(track, '未生成输出文件', elapsed)
+    
+    return all_ok
+
+def resolve_split_mode(audio_file, mode):
+    """
+    确定实际使用的切割模式
+    
+    auto 模式下 WAV / FLAC 文件头可以识别时使用 native，否则使用 single_pass；
+    显式指定 native 但文件不支持时返回 None。
+    """
+    if mode not in ('auto', 'native'):
+        return mode
+    suffix = Path(audio_file).suffix.lower()
+    if suffix in NATIVE_FORMATS:
+        try:
+            if suffix == '.flac':
+                # 按采样号定位轨道需要 STREAMINFO 中的总采样数
+                if not read_flac_header(audio_file).total_samples:
+                    raise FlacFormatError("STREAMINFO 中没有总采样数")
+            else:
+                read_wav_info(audio_file)
+            return 'native'
+        except (OSError, WavFormatError, FlacFormatError) as e:
+            if mode == 'native':
+                print(f"❌ 无法原生切割: {e}")
+                return None
+            print(f"⚠️ 无法原生切割，改用 ffmpeg: {e}")
+            return 'single_pass'
+    if mode == 'native':
+        print(f"❌ 原生切割只支持: {', '.join(NATIVE_FORMATS)}")
+        return None
+    return 'single_pass'
+
+def _split_native(audio_file, tracks, output_dir, output_ext, jobs, on_success, tracker=None, on_failure=None,
+                  job=None):
+    """
+    原生切割，不经过 ffmpeg:
+    
+    - WAV: 读取文件头后按采样位置直接复制 PCM 数据，不解码也不重新编码
+    - FLAC: 轨道内的完整帧原样复制，只有轨道边界所在的帧解码后重新编码（见 flac_splitter）
+    
+    轨道边界由 CUE 帧换算为采样数，精确到单个采样。
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    if Path(audio_file).suffix.lower() == '.flac':
+        source = FlacSource(audio_file)
+        info = source.info
+        write = source.write_track
+        print(f"原生切割 (FLAC 帧复制): {info.channels} 声道, {info.sample_rate} Hz, {info.bits_per_sample} 位, "
+              f"{info.total_samples} 个采样, {len(info.seek_points)} 个定位点")
+    else:
+        source = None
+        info = read_wav_info(audio_file)
+        
+        def write(start, count, output_path):
+            return write_track(audio_file, info, start, count, output_path)
+        
+        print(f"原生切割: {info.channels} 声道, {info.sample_rate} Hz, {info.bits_per_sample} 位, "
+              f"{info.total_samples} 个采样")
+    
+    ranges = {track['number']: track_sample_range(track, info) for track in tracks}
+    if tracker:
+        for track in tracks:
+            tracker.add(track['number'], ranges[track['number']][1])
+    
+    def process(track):
+        output_filename = build_output_filename(track, output_ext)
+        output_path = os.path.join(output_dir, output_filename)
+        start, count = ranges[track['number']]
+        started = time.monotonic()
+        try:
+            if job is not None:
+                job.check_cancelled()
+            write(start, count, output_path)
+            return track, output_filename, None, time.monotonic() - started
+        except (OSError, WavFormatError, FlacFormatError) as e:
+            return track, output_filename, e, time.monotonic() - started
+        finally:
+            if tracker:
+                tracker.finish(track['number'])
+    
+    for track in tracks:
+        print(f"正在处理: {build_output_filename(track, output_ext)}")
+    
+    all_ok = True
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(process, track) for track in tracks]
+            for future in as_completed(futures):
+                track, output_filename, error, elapsed = future.result()
+                if error is None:
+                    print(f"✅ 完成: {output_filename}")
+                    on_success(track, elapsed)
+                else:
+                    all_ok = False
+                    print(f"❌ 失败: {output_filename}")
+                    print(f"错误信息: {error}")
+                    if on_failure:
+                        on_failure(track, str(error), elapsed)
+    finally:
+        if source is not None:
+            source.close()
+    
+    return all_ok
+
+def _track_cache_settings(track, output_ext, codec, codec_params):
+    """影响单个轨道输出内容的参数，作为转换缓存的比对依据"""
+    return {
+        'codec': codec,
+        'codec_params': list(codec_params),
+        'format': output_ext,
+        'start_time': track['start_time'],
+        'duration': track['duration'],
+    }
+
+def split_audio(audio_file, tracks, output_dir="output", mode=DEFAULT_SPLIT_MODE, jobs=None,
+                force=False, prune_cache=False, progress_callback=None, track_callback=None, job=None):
+    """
+    切割音频文件（支持FLAC和WAV）
+    
+    Args:
+        audio_file (str): 音频文件路径
+        tracks (list): parse_cue_file 返回的轨道列表
+        output_dir (str): 输出目录
+        mode (str): 切割模式，auto（默认）、native（WAV 直接复制 / FLAC 帧复制）、
+            single_pass（单次解码）或 per_track（逐轨调用）
+        jobs (int): 同时运行的切割任务数，默认为 CPU 核心数
+        force (bool): 忽略转换缓存，重新切割所有轨道
+        prune_cache (bool): 切割前清理转换缓存中失效的记录
+        progress_callback (callable): 整体进度回调 callback(完成比例, 预计剩余秒数, 已用秒数)，
+            按 ffmpeg 实时输出的时长计算，最多每 0.5 秒触发一次
+        track_callback (callable): 每个轨道处理完时回调 callback(轨道结果字典)，见 track_result
+        job: 调度器中的任务，ffmpeg 进程登记到任务上，任务取消时被终止
+    
+    Returns:
+        bool: 是否所有轨道都切割成功（跳过的轨道算作成功）；失败的轨道会打印出来并通过 track_callback 报告
+    """
+    if mode not in SPLIT_MODES:
+        print(f"❌ 不支持的切割模式: {mode}")
+        return False
     
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
     
     # 检测输入文件格式
     input_ext = Path(audio_file).suffix.lower()
-    if input_ext == '.flac':
-        output_ext = '.flac'
-        codec = 'flac'
-        codec_params = ['-compression_level', '5']
-    elif input_ext == '.wav':
-        output_ext = '.wav'
-        codec = 'pcm_s16le'  # 16位PCM编码
-        codec_params = []
-    else:
+    output_format = get_output_format(audio_file)
+    if output_format is None:
         print(f"❌ 不支持的音频格式: {input_ext}")
         return False
+    output_ext, codec, codec_params = output_format
+    mode = resolve_split_mode(audio_file, mode)
+    if mode is None:
+        return False
+    
+    # 探测源文件（WAV/FLAC 只读文件头，结果有缓存）：校验轨道位置，并补上最后一首歌的准确时长
+    media_info = probe_media(audio_file)
+    if media_info is not None and media_info.duration:
+        problem = validate_tracks(tracks, media_info.duration)
+        if problem:
+            print(f"❌ CUE 与音频文件不匹配: {problem}")
+            return False
+        tracks = with_source_length(tracks, media_info.duration)
+    if mode == 'native':
+        # 原样复制采样数据（FLAC 为复制帧），输出保持源文件的采样格式
+        codec, codec_params = 'copy', []
+    jobs = resolve_jobs(jobs)
     
     print(f"\n开始切割音乐...")
     print(f"输入格式: {input_ext.upper()}")
     print(f"输出格式: {output_ext.upper()}")
     print(f"输出目录: {output_dir}")
+    print(f"切割模式: {mode}")
+    print(f"并发任务数: {jobs}")
+    
+    # 转换缓存：源文件和参数都未变化、输出仍然存在的轨道直接跳过
+    cache = ConversionCache(output_dir)
+    if prune_cache:
+        print(f"🧹 已清理 {cache.prune()} 条失效的缓存记录")
+    
+    def cache_key(track):
+        return f"{os.path.abspath(audio_file)}#{track['number']:02d}"
+    
+    def cache_args(track):
+        output_path = os.path.join(output_dir, build_output_filename(track, output_ext))
+        settings = _track_cache_settings(track, output_ext, codec, codec_params)
+        return cache_key(track), os.path.abspath(audio_file), settings, os.path.abspath(output_path)
     
+    def report(track, status, error=None, seconds=0.0):
+        if track_callback:
+            output_path = os.path.join(output_dir, build_output_filename(track, output_ext))
+            track_callback(track_result(track, output_path, status, error, source=audio_file,
+                                        media_info=media_info, codec=codec, seconds=seconds))
+    
+    pending = []
     for track in tracks:
-        # 生成输出文件名
-        track_num = track['number']
-        title = clean_filename(track['title'])
-        performer = clean_filename(track['performer'])
-        
-        if performer:
-            output_filename = f"{track_num:02d}. {performer} - {title}{output_ext}"
+        if not force and cache.is_fresh(*cache_args(track)):
+            print(f"⏭️ 跳过(未变化): {build_output_filename(track, output_ext)}")
+            report(track, 'skipped')
         else:
-            output_filename = f"{track_num:02d}. {title}{output_ext}"
-        
-        output_path = os.path.join(output_dir, output_filename)
-        
-        # 构建ffmpeg命令
-        start_time = track['start_time']
-        
-        # 基础命令
-        cmd = [
-            'ffmpeg', '-y',  # 覆盖已存在的文件
-            '-i', audio_file,
-            '-ss', str(start_time)
-        ]
-        
-        # 添加时长参数（如果有明确的结束时间）
-        if track['duration']:
-            cmd.extend(['-t', str(track['duration'])])
-        
-        # 添加编码参数
-        cmd.extend(['-c:a', codec])
-        cmd.extend(codec_params)
-        
-        # 添加输出文件
-        cmd.append(output_path)
-        
-        print(f"正在处理: {output_filename}")
-        print(f"开始时间: {start_time:.2f}秒")
-        
-        # 执行ffmpeg命令
-        import subprocess
+            pending.append(track)
+    
+    def on_success(track, seconds):
+        cache.record(*cache_args(track))
+        report(track, 'done', seconds=seconds)
+    
+    def on_failure(track, error, seconds):
+        report(track, 'failed', error, seconds)
+    
+    tracker = ProgressTracker(progress_callback) if progress_callback else None
+    try:
+        if not pending:
+            print("所有轨道均已是最新，无需切割")
+            if progress_callback:
+                progress_callback(1.0, 0.0, 0.0)
+            return True
+        if mode == 'native':
+            return _split_native(audio_file, pending, output_dir, output_ext, jobs, on_success, tracker,
+                                 on_failure, job)
+        if mode == 'per_track':
+            return _split_per_track(audio_file, pending, output_dir, output_ext, codec, codec_params, jobs,
+                                    on_success, tracker, on_failure, job)
+        return _split_single_pass(audio_file, pending, output_dir, output_ext, codec, codec_params, jobs,
+                                  on_success, tracker, on_failure, job)
+    except FileNotFoundError:
+        print("❌ 错误: 未找到ffmpeg命令")
+        print("请确保已安装ffmpeg: brew install ffmpeg")
+        return False
+    except Exception as e:
+        print(f"❌ 处理失败: {e}")
+        return False
+    finally:
+        cache.save()
+
+# 兼容旧名称
+split_audio_with_ffmpeg = split_audio
+
+def track_result(track, output_path, status, error=None, source=None, media_info=None, codec=None,
+                 seconds=0.0):
+    """
+    单个轨道的处理结果（同时是输出清单中的一条记录，见 output_manifest）
+    
+    Args:
+        status (str): done（已切割）、skipped（未变化，沿用已有输出）或 failed
+        media_info (MediaInfo): 源文件的探测结果，提供时换算轨道的起始采样和采样数
+        seconds (float): 处理这个轨道的耗时（秒）
+    """
+    start_samples = duration_samples = None
+    if media_info is not None and media_info.sample_rate:
+        total = media_info.total_samples
+        start_samples, duration_samples = track_sample_range(
+            track, media_info._replace(total_samples=total if total is not None else float('inf')))
+        if duration_samples == float('inf'):
+            duration_samples = None
+    size = None
+    if status != 'failed':
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                print(f"✅ 完成: {output_filename}")
-            else:
-                print(f"❌ 失败: {output_filename}")
-                print(f"错误信息: {result.stderr}")
-        except FileNotFoundError:
-            print("❌ 错误: 未找到ffmpeg命令")
-            print("请确保已安装ffmpeg: brew install ffmpeg")
-            return False
-        except Exception as e:
-            print(f"❌ 处理失败: {e}")
-            return False
+            size = os.path.getsize(output_path)
+        except OSError:
+            pass
+    return manifest_entry(
+        output=os.path.abspath(output_path),
+        source=os.path.abspath(source) if source else None,
+        number=track['number'],
+        title=track['title'],
+        performer=track['performer'],
+        sample_rate=media_info.sample_rate if media_info else None,
+        start_samples=start_samples,
+        duration_samples=duration_samples,
+        size=size,
+        codec=codec,
+        seconds=round(seconds, 3),
+        status=status,
+        error=error,
+    )
+
+def split_cue_image(audio_file, cue_file, output_dir, mode=DEFAULT_SPLIT_MODE, jobs=None, force=False,
+                    prune_cache=False, progress_callback=None, job=None):
+    """
+    库接口：解析 CUE 文件并切割对应的音频文件，供 Web 界面在进程内直接调用
+    
+    参数含义同 split_audio；多 FILE 的 CUE 只切割属于 audio_file 的轨道。
+    
+    Returns:
+        dict: {'ok': 是否所有轨道都切割成功, 'album': 专辑名, 'performer': 艺术家, 'output_dir': 输出目录,
+               'tracks': [track_result 字典，按轨道号排序]}
+    
+    Raises:
+        ValueError: CUE 文件中没有对应的音频轨道
+    """
+    tracks, album_title, album_performer, _ = parse_cue_file(cue_file)
+    tracks = select_tracks_for_audio(tracks, audio_file)
+    if not tracks:
+        raise ValueError("CUE文件中未找到有效的轨道信息")
     
-    return True
+    results = []
+    ok = split_audio(audio_file, tracks, output_dir, mode=mode, jobs=jobs, force=force, prune_cache=prune_cache,
+                     progress_callback=progress_callback, track_callback=results.append, job=job)
+    results.sort(key=lambda result: result['number'])
+    return {'ok': ok, 'album': album_title, 'performer': album_performer,
+            'output_dir': os.path.abspath(output_dir), 'tracks': results}
 
 def find_files_in_directory(directory="."):
     """在目录中查找支持的音频文件和CUE文件"""
@@ -235,24 +718,47 @@ def find_files_in_directory(directory="."):
     
     return audio_files, cue_files
 
-def main():
+def parse_arguments(argv=None):
+    """解析命令行参数"""
+    import argparse
+    parser = argparse.ArgumentParser(description='音频分割工具 (支持FLAC/WAV)')
+    parser.add_argument('paths', nargs='*',
+                        help='[音频文件 CUE文件 [输出目录]] 或 [工作目录]，省略时在当前目录查找')
+    parser.add_argument('--mode', choices=SPLIT_MODES, default=DEFAULT_SPLIT_MODE,
+                        help=f'切割模式 (默认: {DEFAULT_SPLIT_MODE})')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='同时运行的切割任务数 (默认: CPU 核心数)')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略转换缓存，重新切割所有轨道')
+    parser.add_argument('--prune-cache', action='store_true',
+                        help='清理转换缓存中源文件或输出文件已不存在的记录')
+    parser.add_argument('--progress', action='store_true',
+                        help='向标准输出写入机器可读的整体进度行（@@progress，每行一个 JSON）')
+    parser.add_argument('--manifest', default=None,
+                        help='把每个轨道的输出记录写入这个 JSON Lines 清单文件')
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """主函数"""
+    args = parse_arguments(argv)
+    paths = args.paths
+    
     print("音频分割工具 (支持FLAC/WAV)")
     print("=" * 40)
     
     # 如果提供了命令行参数
-    if len(sys.argv) >= 3:
-        audio_file = sys.argv[1]
-        cue_file = sys.argv[2]
-        output_dir = sys.argv[3] if len(sys.argv) > 3 else "切割后的歌曲"
+    if len(paths) >= 2:
+        audio_file = paths[0]
+        cue_file = paths[1]
+        output_dir = paths[2] if len(paths) > 2 else "切割后的歌曲"
         
         print(f"使用命令行参数:")
         print(f"  音频文件: {audio_file}")
         print(f"  CUE文件: {cue_file}")
         print(f"  输出目录: {output_dir}")
-    elif len(sys.argv) == 2:
+    elif len(paths) == 1:
         # 如果只提供了一个参数，作为工作目录
-        work_directory = sys.argv[1]
+        work_directory = paths[0]
         print(f"正在目录 {work_directory} 中查找文件...")
         audio_files, cue_files = find_files_in_directory(work_directory)
         
@@ -309,6 +815,8 @@ def main():
         # 解析CUE文件
         tracks, album_title, album_performer, cue_audio_file = parse_cue_file(cue_file)
         
+        tracks = select_tracks_for_audio(tracks, audio_file)
+        
         if not tracks:
             print("❌ CUE文件中未找到有效的轨道信息")
             return
@@ -319,7 +827,16 @@ def main():
             print(f"  {track['number']:02d}. {track['title']} ({duration_str})")
         
         # 切割音乐
-        success = split_audio_with_ffmpeg(audio_file, tracks, output_dir)
+        manifest = ManifestWriter(args.manifest) if args.manifest else None
+        try:
+            success = split_audio(audio_file, tracks, output_dir, mode=args.mode, jobs=args.jobs,
+                                  force=args.force, prune_cache=args.prune_cache,
+                                  progress_callback=print_progress if args.progress else None,
+                                  track_callback=manifest.write if manifest else None)
+        finally:
+            if manifest:
+                manifest.close()
+                print(f"📝 输出清单: {args.manifest} ({manifest.count} 条)")
         
         if success:
             print(f"\n🎉 切割完成! 文件保存在: {output_dir}")
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量分割 (Batch Splitter)
+递归查找目录中的所有 CUE/音频镜像对，在一个任务中全部切割。
+
+配对规则（按顺序尝试）:
+1. CUE 中 FILE 条目指向的文件（相对于 CUE 所在目录，忽略大小写）
+2. 同一目录中与 FILE 条目同名、扩展名不同的音频文件
+   （CUE 中常写成 .wav 而实际已转换为 .flac）
+3. 与 CUE 文件同名的音频文件
+4. 目录中只有一个 CUE 和一个音频文件时直接配对
+多 FILE 的 CUE 中每个音频文件只切割属于它的轨道。
+
+多张专辑共用一个线程池：同时处理 albums 张专辑，每张专辑内部再并行
+jobs // albums 个切割任务，总并发不超过 jobs。每张专辑输出到与它在输入
+目录中的相对路径对应的目录；多张专辑会输出到同一目录时，按 CUE 文件名
+分别建立子目录。
+
+命令行以 --progress 运行时，除了整体进度行，每张专辑开始和结束时各向标准输出
+写一行机器可读的状态:
+    @@album {"index": 3, "total": 500, "name": "歌手/专辑", "status": "done", "tracks": 12}
+
+使用方法:
+    python batch_splitter.py <目录或文件>... -o <输出目录> [--mode auto] [--jobs N] [--albums N] [--force]
+                             [--manifest 清单.jsonl]
+
+示例:
+    python batch_splitter.py /music/archive -o /music/split --jobs 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from audio_splitter import (DEFAULT_SPLIT_MODE, SPLIT_MODES, clean_filename, get_output_format, resolve_jobs,
+                            split_audio)
+from cue_parser import parse_cue_sheet
+from ffmpeg_progress import ProgressTracker, print_progress
+from output_manifest import ManifestWriter
+
+ALBUM_PREFIX = '@@album '
+AUDIO_EXTENSIONS = ('.flac', '.wav')
+
+class Album:
+    """一张待切割的专辑（一个 CUE 文件及其对应的音频文件）"""
+    
+    __slots__ = ('cue_file', 'parts', 'title', 'performer', 'name', 'output_dir')
+    
+    def __init__(self, cue_file, parts, title, performer, name, output_dir):
+        self.cue_file = cue_file
+        self.parts = parts              # [(音频文件, 属于它的轨道列表)]
+        self.title = title
+        self.performer = performer
+        self.name = name                # 相对于输入目录的显示名称
+        self.output_dir = output_dir
+    
+    @property
+    def track_count(self):
+        return sum(len(tracks) for _, tracks in self.parts)
+    
+    @property
+    def weight(self):
+        """整体进度中的权重：音频文件的总大小（同一格式下与时长成正比）"""
+        total = 0
+        for audio_file, _ in self.parts:
+            try:
+                total += os.path.getsize(audio_file)
+            except OSError:
+                pass
+        return total or 1
+
+def _is_hidden(name):
+    return name.startswith('.')
+
+def collect_files(paths):
+    """
+    收集 CUE 文件和音频文件
+    
+    Args:
+        paths (list): 目录（递归查找，跳过隐藏文件和目录）或单个文件
+    
+    Returns:
+        tuple: ([(CUE 文件, 所属的输入根目录)], {目录: {小写文件名: 音频文件}})
+    """
+    cue_files = []
+    audio_index = defaultdict(dict)
+    
+    def add(file_path, root):
+        suffix = file_path.suffix.lower()
+        if suffix == '.cue':
+            cue_files.append((file_path, root))
+        elif suffix in AUDIO_EXTENSIONS:
+            audio_index[file_path.parent][file_path.name.lower()] = file_path
+    
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not _is_hidden(d))
+                for filename in sorted(filenames):
+                    if not _is_hidden(filename):
+                        add(Path(dirpath) / filename, path)
+        elif path.is_file():
+            add(path, path.parent)
+    return cue_files, audio_index
+
+def resolve_audio_file(cue_file, file_entry, audio_index, cue_count):
+    """
+    按配对规则为 CUE 中的一个 FILE 条目找到音频文件，找不到时返回 None
+    
+    Args:
+        file_entry (str): FILE 条目中的文件名（可能为空）
+        audio_index (dict): collect_files 返回的音频文件索引
+        cue_count (int): CUE 所在目录中的 CUE 文件数
+    """
+    if file_entry:
+        # CUE 可能来自 Windows，路径分隔符是反斜杠
+        entry = cue_file.parent / file_entry.replace('\\', '/')
+        candidates = audio_index.get(entry.parent, {})
+        if entry.name.lower() in candidates:
+            return candidates[entry.name.lower()]
+        if entry.suffix.lower() in AUDIO_EXTENSIONS and entry.is_file():
+            return entry
+        stem = entry.stem.lower()
+        for ext in AUDIO_EXTENSIONS:
+            if stem + ext in candidates:
+                return candidates[stem + ext]
+    
+    candidates = audio_index.get(cue_file.parent, {})
+    stem = cue_file.stem.lower()
+    for ext in AUDIO_EXTENSIONS:
+        if stem + ext in candidates:
+            return candidates[stem + ext]
+    if cue_count == 1 and len(candidates) == 1:
+        return next(iter(candidates.values()))
+    return None
+
+def find_albums(paths, output_root):
+    """
+    查找所有可以切割的专辑
+    
+    Returns:
+        tuple: ([Album], [无法配对的 CUE 文件及原因])
+    """
+    cue_files, audio_index = collect_files(paths)
+    cue_counts = Counter(cue_file.parent for cue_file, _ in cue_files)
+    albums = []
+    unmatched = []
+    
+    for cue_file, root in cue_files:
+        try:
+            sheet, _ = parse_cue_sheet(cue_file)
+        except (OSError, ValueError) as e:
+            unmatched.append((cue_file, f'无法解析: {e}'))
+            continue
+        tracks = sheet.to_track_dicts()
+        if not tracks:
+            unmatched.append((cue_file, '没有音频轨道'))
+            continue
+        
+        parts = []
+        missing = []
+        for file_entry in sheet.files or ['']:
+            audio_file = resolve_audio_file(cue_file, file_entry, audio_index, cue_counts[cue_file.parent])
+            if audio_file is None:
+                missing.append(file_entry or cue_file.stem)
+                continue
+            file_tracks = [t for t in tracks if len(sheet.files) <= 1 or t['file'] == file_entry]
+            if file_tracks:
+                parts.append((audio_file, file_tracks))
+        if missing:
+            unmatched.append((cue_file, f"找不到音频文件: {', '.join(missing)}"))
+            continue
+        
+        relative = cue_file.parent.relative_to(root)
+        name = str(relative / cue_file.stem) if str(relative) != '.' else cue_file.stem
+        albums.append(Album(cue_file, parts, sheet.title, sheet.performer, name, Path(output_root) / relative))
+    
+    # 多张专辑会写入同一目录时，按 CUE 文件名分别建立子目录
+    shared = Counter(album.output_dir for album in albums)
+    for album in albums:
+        if shared[album.output_dir] > 1:
+            album.output_dir = album.output_dir / clean_filename(album.cue_file.stem)
+    return albums, unmatched
+
+def format_album_line(event):
+    """生成一行机器可读的专辑状态输出"""
+    return ALBUM_PREFIX + json.dumps(event, ensure_ascii=False)
+
+def print_album_event(event):
+    """把专辑状态写到标准输出（供 --progress 使用）"""
+    print(format_album_line(event), flush=True)
+
+def split_albums(albums, mode=DEFAULT_SPLIT_MODE, jobs=None, album_jobs=None, force=False,
+                 progress_callback=None, album_callback=None, track_callback=None, job=None):
+    """
+    并行切割多张专辑
+    
+    Args:
+        jobs (int): 总并发数，默认为 CPU 核心数
+        album_jobs (int): 同时处理的专辑数，默认为 jobs 的一半
+        progress_callback (callable): 整体进度回调 callback(完成比例, 预计剩余秒数, 已用秒数)
+        album_callback (callable): 专辑状态回调 callback(事件字典)，每张专辑开始和结束时各触发一次，
+            status 为 running、done 或 failed
+        track_callback (callable): 每个轨道处理完时回调 callback(专辑, 轨道结果字典)
+        job: 调度器中的任务，任务取消后不再开始新的专辑，运行中的 ffmpeg 被终止
+    
+    Returns:
+        list: 与 albums 顺序一致的结果（bool）
+    """
+    jobs = resolve_jobs(jobs)
+    album_jobs = max(1, min(album_jobs or max(1, jobs // 2), len(albums) or 1))
+    per_album_jobs = max(1, jobs // album_jobs)
+    print(f"批量分割: {len(albums)} 张专辑, 同时处理 {album_jobs} 张, 每张 {per_album_jobs} 个切割任务")
+    
+    tracker = ProgressTracker(progress_callback) if progress_callback else None
+    if tracker:
+        for index, album in enumerate(albums):
+            tracker.add(index, album.weight)
+    callback_lock = threading.Lock()
+    
+    def notify(index, album, status):
+        if album_callback is None:
+            return
+        event = {'index': index + 1, 'total': len(albums), 'name': album.name, 'status': status,
+                 'tracks': album.track_count, 'output_dir': str(album.output_dir)}
+        with callback_lock:
+            album_callback(event)
+    
+    def on_track(album, result):
+        with callback_lock:
+            track_callback(album, result)
+    
+    def process(index, album):
+        if job is not None and job.cancelled:
+            return False
+        notify(index, album, 'running')
+        ok = True
+        done_weight = 0
+        try:
+            for audio_file, tracks in album.parts:
+                part_weight = os.path.getsize(audio_file) if os.path.exists(audio_file) else 0
+                
+                def on_part_progress(fraction, eta, elapsed, base=done_weight, size=part_weight):
+                    if tracker:
+                        tracker.update(index, (base + fraction * size) / album.weight)
+                
+                if get_output_format(str(audio_file)) is None:
+                    print(f"❌ 不支持的音频格式: {audio_file}")
+                    ok = False
+                    continue
+                ok = split_audio(str(audio_file), tracks, str(album.output_dir), mode=mode,
+                                 jobs=per_album_jobs, force=force,
+                                 progress_callback=on_part_progress if tracker else None,
+                                 track_callback=(lambda result: on_track(album, result)) if track_callback else None,
+                                 job=job) and ok
+                done_weight += part_weight
+        except Exception as e:
+            print(f"❌ 处理失败: {album.name}: {e}")
+            ok = False
+        finally:
+            if tracker:
+                tracker.finish(index)
+        notify(index, album, 'done' if ok else 'failed')
+        return ok
+    
+    results = [None] * len(albums)
+    with ThreadPoolExecutor(max_workers=album_jobs) as executor:
+        futures = {executor.submit(process, index, album): index for index, album in enumerate(albums)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+def parse_arguments(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='批量分割目录中的所有 CUE/音频镜像')
+    parser.add_argument('paths', nargs='+', help='输入目录（递归查找）或文件')
+    parser.add_argument('--output', '-o', required=True, help='输出目录')
+    parser.add_argument('--mode', choices=SPLIT_MODES, default=DEFAULT_SPLIT_MODE,
+                        help=f'切割模式 (默认: {DEFAULT_SPLIT_MODE})')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='同时运行的切割任务总数 (默认: CPU 核心数)')
+    parser.add_argument('--albums', type=int, default=None,
+                        help='同时处理的专辑数 (默认: 切割任务数的一半)')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略转换缓存，重新切割所有轨道')
+    parser.add_argument('--progress', action='store_true',
+                        help='向标准输出写入机器可读的整体进度和专辑状态行（@@progress / @@album，每行一个 JSON）')
+    parser.add_argument('--manifest', default=None,
+                        help='把每个轨道的输出记录写入这个 JSON Lines 清单文件')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数，返回退出码（没有找到专辑或全部失败时为 1）"""
+    args = parse_arguments(argv)
+    
+    print("批量音频分割")
+    print("=" * 40)
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"❌ 路径不存在: {path}")
+            return 1
+    
+    albums, unmatched = find_albums(args.paths, args.output)
+    print(f"找到 {len(albums)} 张专辑")
+    for cue_file, reason in unmatched:
+        print(f"⚠️ 跳过 {cue_file}: {reason}")
+    if not albums:
+        print("❌ 没有找到可以切割的 CUE/音频镜像对")
+        return 1
+    
+    manifest = ManifestWriter(args.manifest) if args.manifest else None
+    try:
+        results = split_albums(albums, mode=args.mode, jobs=args.jobs, album_jobs=args.albums, force=args.force,
+                               progress_callback=print_progress if args.progress else None,
+                               album_callback=print_album_event if args.progress else None,
+                               track_callback=(lambda album, entry: manifest.write(entry)) if manifest else None)
+    finally:
+        if manifest:
+            manifest.close()
+            print(f"📝 输出清单: {args.manifest} ({manifest.count} 条)")
+    
+    failed = [album for album, ok in zip(albums, results) if not ok]
+    print(f"\n批量分割完成: 成功 {len(albums) - len(failed)} 张, 失败 {len(failed)} 张, "
+          f"跳过 {len(unmatched)} 个 CUE")
+    for album in failed:
+        print(f"  ❌ {album.name}")
+    return 1 if len(failed) == len(albums) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
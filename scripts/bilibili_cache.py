@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+B 站缓存合并 (Bilibili Cache Merger)
+递归扫描 B 站客户端的缓存目录，找出每个视频（每一 P）的视频流和音频流 m4s，
+从缓存中的元数据读取标题，用 ffmpeg 直接复制音视频流（不重新编码）并行合并。
+
+支持的缓存结构:
+- 手机客户端: <av号>/<c_分P号>/entry.json，m4s 在下一层 <清晰度>/video.m4s、audio.m4s
+- 电脑客户端: <视频目录>/videoInfo.json（或 .videoInfo）和 <cid>-1-<清晰度代码>.m4s，
+  清晰度代码 302xx 为音频流，其余为视频流；新版本客户端在文件开头多写了 9 个 '0' 字节，
+  合并时让 ffmpeg 跳过
+
+扫描是惰性的：边遍历目录边提交合并任务，很大的缓存目录也能立即开始输出。
+没有视频流（只缓存了音频）或输出格式为 m4a 时只输出音频流。
+
+使用方法:
+    python bilibili_cache.py <缓存目录>... -o <输出目录> [--format mp4|mkv|m4a] [--jobs N] [--force]
+                             [--manifest 清单.jsonl] [--list]
+
+示例:
+    python bilibili_cache.py ~/Movies/bilibili -o ~/Movies/merged --format m4a
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from audio_splitter import clean_filename, resolve_jobs
+from conversion_cache import ConversionCache
+from ffmpeg_progress import run_ffmpeg
+from output_manifest import ManifestWriter, manifest_entry
+
+# 元数据文件（手机客户端 / 电脑客户端）
+METADATA_FILES = ('entry.json', 'videoInfo.json', '.videoInfo')
+# 从 m4s 所在目录向上查找元数据文件的最大层数（手机客户端的 m4s 在 entry.json 的下一层）
+METADATA_SEARCH_DEPTH = 2
+# 电脑客户端文件名: <cid>-<序号>-<清晰度代码>.m4s
+PC_STREAM_PATTERN = re.compile(r'^\d+-\d+-(\d+)\.m4s$')
+# 电脑客户端写在 m4s 开头的填充字节
+PC_CLIENT_PADDING = b'000000000'
+
+# 输出格式: mp4 / mkv 合并音视频，m4a 只输出音频
+MERGE_FORMATS = ('mp4', 'mkv', 'm4a')
+DEFAULT_MERGE_FORMAT = 'mp4'
+
+class CacheItem:
+    """缓存中的一个视频（一 P）"""
+    
+    __slots__ = ('directory', 'video', 'audio', 'title', 'part', 'page', 'owner', 'name', 'output_path')
+    
+    def __init__(self, directory, video, audio, metadata, name, output_path):
+        self.directory = directory
+        self.video = video              # 视频流 m4s，只缓存了音频时为 None
+        self.audio = audio
+        self.title = metadata.get('title')
+        self.part = metadata.get('part')
+        self.page = metadata.get('page')
+        self.owner = metadata.get('owner')
+        self.name = name                # 输出文件名（不含扩展名）
+        self.output_path = output_path
+
+def _is_audio_quality(code):
+    """电脑客户端的清晰度代码 302xx 表示音频流（30216/30232/30280 AAC，30250 杜比，30251 无损）"""
+    return 30200 <= code < 30300
+
+def find_streams(directory, filenames):
+    """
+    找出目录中的视频流和音频流
+    
+    电脑客户端同一目录中有多个清晰度时取代码最大的一个。
+    
+    Returns:
+        tuple: (视频流路径或 None, 音频流路径或 None)
+    """
+    names = set(filenames)
+    if 'audio.m4s' in names:
+        return (directory / 'video.m4s' if 'video.m4s' in names else None), directory / 'audio.m4s'
+    
+    video = audio = None
+    for filename in filenames:
+        match = PC_STREAM_PATTERN.match(filename)
+        if not match:
+            continue
+        code = int(match.group(1))
+        if _is_audio_quality(code):
+            if audio is None or code > audio[0]:
+                audio = (code, filename)
+        elif video is None or code > video[0]:
+            video = (code, filename)
+    return (directory / video[1] if video else None), (directory / audio[1] if audio else None)
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_metadata(data):
+    """
+    把两种客户端的元数据统一为 {'title', 'part', 'page', 'owner'}
+    
+    手机客户端 entry.json: title、owner_name、page_data.page / part（番剧为 ep.index / index_title）
+    电脑客户端 videoInfo.json: groupTitle（视频标题）、title（分 P 标题）、p、uname
+    """
+    if not isinstance(data, dict):
+        return {}
+    if 'groupTitle' in data or 'uname' in data:
+        title = data.get('groupTitle') or data.get('title')
+        part = data.get('title') if data.get('groupTitle') else None
+        page = data.get('p')
+        owner = data.get('uname')
+    else:
+        page_data = data.get('page_data') or {}
+        episode = data.get('ep') or {}
+        title = data.get('title')
+        part = page_data.get('part') or episode.get('index_title')
+        page = page_data.get('page') or episode.get('index')
+        owner = data.get('owner_name')
+    return {'title': title, 'part': part if part != title else None, 'page': _int_or_none(page), 'owner': owner}
+
+def read_metadata(directory, root):
+    """从 directory 及其上级目录（不超出 root）中读取第一个能解析的元数据文件，找不到时返回 {}"""
+    current = directory
+    for _ in range(METADATA_SEARCH_DEPTH + 1):
+        for filename in METADATA_FILES:
+            path = current / filename
+            if not path.is_file():
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return parse_metadata(json.load(f))
+            except (OSError, ValueError):
+                continue
+        if current == root or current.parent == current:
+            break
+        current = current.parent
+    return {}
+
+def item_name(metadata, directory):
+    """输出文件名: 视频标题，多 P 视频加上 " - P<序号> <分 P 标题>"；没有元数据时使用目录名"""
+    title = str(metadata.get('title') or '').strip()
+    if not title:
+        return directory.name
+    part = str(metadata.get('part') or '').strip()
+    if not part:
+        return title
+    page = metadata.get('page')
+    return f"{title} - P{page} {part}" if page else f"{title} - {part}"
+
+def scan_cache(paths, output_root, output_format=DEFAULT_MERGE_FORMAT):
+    """
+    惰性扫描缓存目录（生成器），每找到一个视频就立即产出，不等待整个目录树遍历完
+    
+    Args:
+        paths (list): 缓存目录（递归查找，跳过隐藏目录）
+        output_root (str): 输出目录，所有输出文件直接放在这个目录中，重名时加上序号
+        output_format (str): MERGE_FORMATS 中的一项
+    
+    Yields:
+        CacheItem
+    """
+    used_names = set()
+    for path in paths:
+        root = Path(path)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            directory = Path(dirpath)
+            video, audio = find_streams(directory, sorted(filenames))
+            if audio is None:
+                continue
+            
+            metadata = read_metadata(directory, root)
+            base_name = clean_filename(item_name(metadata, directory)) or directory.name
+            name = base_name
+            number = 2
+            while name.lower() in used_names:
+                name = f"{base_name} ({number})"
+                number += 1
+            used_names.add(name.lower())
+            yield CacheItem(directory, video, audio, metadata, name,
+                            Path(output_root) / f"{name}.{output_format}")
+
+def has_client_padding(path):
+    """m4s 开头是否有电脑客户端写入的填充字节"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(PC_CLIENT_PADDING)) == PC_CLIENT_PADDING
+    except OSError:
+        return False
+
+def build_merge_command(item, output_format, ffmpeg_path='ffmpeg'):
+    """构建合并命令：直接复制音视频流（-c copy），并写入标题和作者"""
+    streams = [item.audio] if output_format == 'm4a' or item.video is None else [item.video, item.audio]
+    cmd = [ffmpeg_path, '-y']
+    for stream in streams:
+        if has_client_padding(stream):
+            cmd.extend(['-skip_initial_bytes', str(len(PC_CLIENT_PADDING))])
+        cmd.extend(['-i', str(stream)])
+    if len(streams) == 2:
+        cmd.extend(['-map', '0:v:0', '-map', '1:a:0'])
+    else:
+        cmd.extend(['-map', '0:a:0'])
+    cmd.extend(['-c', 'copy', '-metadata', f'title={item.name}'])
+    if item.owner:
+        cmd.extend(['-metadata', f'artist={item.owner}'])
+    cmd.append(str(item.output_path))
+    return cmd
+
+def cache_settings(item, output_format):
+    """影响输出内容的参数；转换缓存以音频流为源文件，视频流用大小和修改时间比对"""
+    settings = {'format': output_format}
+    if output_format != 'm4a' and item.video is not None:
+        stat = os.stat(item.video)
+        settings['video'] = [stat.st_size, stat.st_mtime_ns]
+    return settings
+
+def merge_item(item, output_format, cache=None, force=False, ffmpeg_path='ffmpeg', job=None):
+    """
+    合并一个视频
+    
+    Returns:
+        dict: 输出清单记录（见 output_manifest），status 为 done、skipped 或 failed
+    """
+    started = time.monotonic()
+    status, error = 'done', None
+    try:
+        settings = cache_settings(item, output_format)
+        cache_args = (str(item.directory), str(item.audio), settings, str(item.output_path))
+        if cache and not force and cache.is_fresh(*cache_args):
+            status = 'skipped'
+        else:
+            ok, stderr = run_ffmpeg(build_merge_command(item, output_format, ffmpeg_path),
+                                    timeout=600, job=job)
+            if not ok:
+                status, error = 'failed', stderr.strip() or 'ffmpeg 执行失败'
+            elif not item.output_path.exists() or item.output_path.stat().st_size == 0:
+                status, error = 'failed', '输出文件为空或不存在'
+            elif cache:
+                cache.record(*cache_args)
+    except subprocess.TimeoutExpired:
+        status, error = 'failed', '合并超时'
+    except OSError as e:
+        status, error = 'failed', str(e)
+    
+    return manifest_entry(
+        output=str(item.output_path.absolute()),
+        source=str(item.audio.absolute()),
+        number=item.page,
+        title=item.name,
+        performer=item.owner,
+        size=item.output_path.stat().st_size if status != 'failed' else None,
+        codec='copy',
+        seconds=round(time.monotonic() - started, 3),
+        status=status,
+        error=error,
+    )
+
+def merge_items(items, output_root, output_format=DEFAULT_MERGE_FORMAT, jobs=None, force=False,
+                item_callback=None, job=None):
+    """
+    并行合并缓存中的视频
+    
+    items 可以是 scan_cache 返回的生成器：同时最多只有 jobs * 2 个视频已提交但未完成，
+    扫描和合并交替进行，第一个视频找到后立即开始合并。
+    
+    Args:
+        item_callback (callable): 每个视频完成时回调 callback(CacheItem, 输出清单记录)，调用是串行的
+        job: 调度器中的任务，任务取消后不再提交新的视频，运行中的 ffmpeg 被终止
+    
+    Returns:
+        dict: {'merged': 成功数, 'skipped': 跳过数, 'failed': 失败数, 'files': [输出清单记录]}
+    
+    Raises:
+        RuntimeError: 未找到 ffmpeg
+    """
+    ffmpeg_path = shutil.which('ffmpeg')
+    if not ffmpeg_path:
+        raise RuntimeError("未找到可用的 ffmpeg")
+    jobs = resolve_jobs(jobs)
+    Path(output_root).mkdir(parents=True, exist_ok=True)
+    cache = ConversionCache(output_root)
+    files = []
+    callback_lock = threading.Lock()
+    
+    def process(item):
+        if job is not None and job.cancelled:
+            return None
+        entry = merge_item(item, output_format, cache, force, ffmpeg_path, job)
+        with callback_lock:
+            files.append(entry)
+            if item_callback:
+                item_callback(item, entry)
+        return entry
+    
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = set()
+            for item in items:
+                if job is not None and job.cancelled:
+                    break
+                pending.add(executor.submit(process, item))
+                if len(pending) >= jobs * 2:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            wait(pending)
+    finally:
+        cache.save()
+    
+    counts = {status: sum(1 for entry in files if entry['status'] == status)
+              for status in ('done', 'skipped', 'failed')}
+    return {'merged': counts['done'], 'skipped': counts['skipped'], 'failed': counts['failed'], 'files': files}
+
+def print_item_result(item, entry):
+    """命令行输出一个视频的合并结果"""
+    if entry['status'] == 'done':
+        print(f"✅ {item.output_path.name} ({entry['seconds']:.1f} 秒)", flush=True)
+    elif entry['status'] == 'skipped':
+        print(f"⏭️ 跳过(未变化): {item.output_path.name}", flush=True)
+    else:
+        print(f"❌ {item.directory}: {entry['error']}", flush=True)
+
+def parse_arguments(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='合并 B 站客户端缓存中的视频流和音频流')
+    parser.add_argument('paths', nargs='+', help='缓存目录（递归查找）')
+    parser.add_argument('--output', '-o', required=True, help='输出目录')
+    parser.add_argument('--format', choices=MERGE_FORMATS, default=DEFAULT_MERGE_FORMAT,
+                        help=f'输出格式，m4a 只输出音频 (默认: {DEFAULT_MERGE_FORMAT})')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='同时运行的合并任务数 (默认: CPU 核心数)')
+    parser.add_argument('--force', action='store_true', help='忽略转换缓存，重新合并所有视频')
+    parser.add_argument('--manifest', default=None,
+                        help='把每个视频的输出记录写入这个 JSON Lines 清单文件')
+    parser.add_argument('--list', action='store_true', help='只列出找到的视频，不合并')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数，返回退出码（没有找到视频或全部失败时为 1）"""
+    args = parse_arguments(argv)
+    
+    print("B 站缓存合并")
+    print("=" * 40)
+    for path in args.paths:
+        if not os.path.isdir(path):
+            print(f"❌ 目录不存在: {path}")
+            return 1
+    
+    items = scan_cache(args.paths, args.output, args.format)
+    if args.list:
+        count = 0
+        for item in items:
+            count += 1
+            streams = '视频+音频' if item.video else '仅音频'
+            print(f"{item.name}  [{streams}]  {item.directory}")
+        print(f"\n共 {count} 个视频")
+        return 0 if count else 1
+    
+    manifest = ManifestWriter(args.manifest) if args.manifest else None
+    
+    def on_item(item, entry):
+        print_item_result(item, entry)
+        if manifest:
+            manifest.write(entry)
+    
+    try:
+        summary = merge_items(items, args.output, output_format=args.format, jobs=args.jobs, force=args.force,
+                              item_callback=on_item)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        if manifest:
+            manifest.close()
+            print(f"📝 输出清单: {args.manifest} ({manifest.count} 条)")
+    
+    total = summary['merged'] + summary['skipped'] + summary['failed']
+    print(f"\n合并完成: 成功 {summary['merged']} 个, 跳过(未变化) {summary['skipped']} 个, "
+          f"失败 {summary['failed']} 个")
+    if not total:
+        print("❌ 没有找到 B 站缓存的 m4s 文件")
+    return 1 if summary['failed'] == total else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换缓存 (Conversion Cache)
+在输出目录中保存一份转换清单，记录每个输出文件对应的源文件指纹
+（路径、大小、修改时间、内容哈希）和编码参数。重复运行时，源文件和
+编码参数都没有变化、且输出文件仍然存在的工作会被跳过。
+
+清单文件: <输出目录>/.musictool_cache.json
+
+多个任务可以同时写入同一个输出目录: 保存时在文件锁内重新读取磁盘上的清单，
+只合并本实例新增、更新和删除的记录，不会覆盖其他任务写入的记录。
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: 没有 flock，退化为不加锁
+    fcntl = None
+
+MANIFEST_FILENAME = '.musictool_cache.json'
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """进程间的排他文件锁（flock），进程内的并发由调用方的线程锁负责"""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def hash_file(file_path):
+    """计算文件内容哈希（BLAKE2b，分块读取）"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ConversionCache:
+    """转换清单：判断一项转换工作是否可以跳过，并记录完成的工作（线程安全）"""
+    
+    def __init__(self, output_dir, filename=MANIFEST_FILENAME):
+        """
+        初始化并加载转换清单
+        
+        Args:
+            output_dir (str): 输出目录，清单保存在该目录中
+            filename (str): 清单文件名
+        """
+        self.path = Path(output_dir) / filename
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self.entries = {}
+        self._known_hashes = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        # 本实例修改过 / 删除的记录，保存时只把这些合并到磁盘上的清单
+        self._changed = set()
+        self._removed = set()
+        self.load()
+    
+    def _read_entries(self):
+        """读取磁盘上的清单记录，文件不存在或损坏时返回空字典"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 转换清单无法读取，将重新生成: {e}")
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('entries', {})
+    
+    def _remember_hashes(self, entries):
+        # (源文件, 大小, 修改时间) -> 内容哈希，用于跳过重复的哈希计算
+        for entry in entries:
+            self._known_hashes[(entry['source'], entry['size'], entry['mtime'])] = entry['hash']
+    
+    def load(self):
+        """从文件加载清单，文件损坏时从空清单开始"""
+        self.entries = self._read_entries()
+        self._known_hashes = {}
+        self._remember_hashes(self.entries.values())
+    
+    def save(self):
+        """
+        保存清单
+        
+        在文件锁内重新读取磁盘上的清单，合并本实例的改动后写入唯一的临时文件再替换，
+        同时写入同一目录的其他任务的记录不会丢失。
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            changed = {key: dict(self.entries[key]) for key in self._changed if key in self.entries}
+            removed = set(self._removed)
+            self._changed.clear()
+            self._removed.clear()
+            self._dirty = False
+        
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.lock_path):
+                entries = self._read_entries()
+                for key in removed:
+                    entries.pop(key, None)
+                entries.update(changed)
+                fd, tmp_path = tempfile.mkstemp(prefix=self.path.name + '.', suffix='.tmp', dir=self.path.parent)
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump({'version': MANIFEST_VERSION, 'entries': entries}, f, ensure_ascii=False)
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    with contextlib.suppress(OSError):
+                        os.remove(tmp_path)
+                    raise
+        except BaseException:
+            # 没有写入成功，改动留到下次保存
+            with self._lock:
+                self._changed.update(key for key in changed if key not in self._removed)
+                self._removed.update(key for key in removed if key not in self._changed)
+                self._dirty = True
+            raise
+        
+        # 吸收其他任务写入的记录（本实例在此期间的新改动优先）
+        with self._lock:
+            for key, entry in entries.items():
+                if key not in self._changed and key not in self._removed:
+                    self.entries[key] = entry
+            self._remember_hashes(entries.values())
+    
+    def fingerprint(self, source_path):
+        """
+        获取源文件指纹 {'size', 'mtime', 'hash'}
+        
+        大小和修改时间与清单中记录的一致时直接沿用记录的哈希，
+        否则重新计算内容哈希。同一次运行中每个源文件只计算一次。
+        """
+        source = str(source_path)
+        stat = os.stat(source)
+        key = (source, stat.st_size, stat.st_mtime_ns)
+        
+        with self._lock:
+            fingerprint = self._fingerprints.get(key)
+            if fingerprint is None and key in self._known_hashes:
+                fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': self._known_hashes[key]}
+                self._fingerprints[key] = fingerprint
+        if fingerprint is not None:
+            return fingerprint
+        
+        # 在锁外计算哈希，避免阻塞其他工作线程
+        fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': hash_file(source)}
+        with self._lock:
+            self._fingerprints[key] = fingerprint
+        return fingerprint
+    
+    def is_fresh(self, key, source_path, settings, output_path):
+        """
+        判断一项工作是否已经完成且仍然有效
+        
+        Args:
+            key (str): 工作标识（例如源文件路径，或 "源文件#轨道号"）
+            source_path (str): 源文件路径
+            settings (dict): 影响输出内容的编码参数
+            output_path (str): 输出文件路径
+        
+        Returns:
+            bool: 源文件内容、编码参数、输出文件都没有变化时返回 True
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+        if not entry or entry['output'] != str(output_path) or entry['settings'] != settings:
+            return False
+        
+        try:
+            output_size = os.path.getsize(output_path)
+            fingerprint = self.fingerprint(source_path)
+        except OSError:
+            return False
+        if output_size != entry['output_size'] or fingerprint['hash'] != entry['hash']:
+            return False
+        
+        # 内容未变但修改时间变了（例如被 touch 或复制），更新记录以便下次走快速路径
+        if fingerprint['mtime'] != entry['mtime'] or fingerprint['size'] != entry['size']:
+            with self._lock:
+                entry.update(size=fingerprint['size'], mtime=fingerprint['mtime'])
+                self._known_hashes[(entry['source'], entry['size'], entry['mtime'])] = entry['hash']
+                self._changed.add(key)
+                self._removed.discard(key)
+                self._dirty = True
+        return True
+    
+    def record(self, key, source_path, settings, output_path):
+        """记录一项已完成的工作"""
+        fingerprint = self.fingerprint(source_path)
+        entry = {
+            'source': str(source_path),
+            'size': fingerprint['size'],
+            'mtime': fingerprint['mtime'],
+            'hash': fingerprint['hash'],
+            'settings': settings,
+            'output': str(output_path),
+            'output_size': os.path.getsize(output_path),
+        }
+        with self._lock:
+            self.entries[key] = entry
+            self._known_hashes[(entry['source'], entry['size'], entry['mtime'])] = entry['hash']
+            self._changed.add(key)
+            self._removed.discard(key)
+            self._dirty = True
+    
+    def prune(self):
+        """
+        清理失效的记录（源文件或输出文件已不存在）
+        
+        Returns:
+            int: 删除的记录数
+        """
+        with self._lock:
+            stale = [
+                key for key, entry in self.entries.items()
+                if not os.path.exists(entry['source']) or not os.path.exists(entry['output'])
+            ]
+            for key in stale:
+                del self.entries[key]
+                self._removed.add(key)
+                self._changed.discard(key)
+            if stale:
+                self._dirty = True
+        return len(stale)
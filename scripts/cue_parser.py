@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CUE 解析器 (CUE Sheet Parser)
+逐行扫描 CUE 文件：文件只读取一次，每行只切分一次，
+构建带类型的专辑 / 轨道对象（使用 __slots__）。
+
+支持的命令:
+- 专辑级: TITLE, PERFORMER, SONGWRITER, CATALOG, CDTEXTFILE, REM
+- 文件: FILE（一个 CUE 中可以有多个 FILE）
+- 轨道级: TRACK, TITLE, PERFORMER, SONGWRITER, ISRC, FLAGS, INDEX, PREGAP, POSTGAP, REM
+
+时间单位为 CUE 帧（1/75 秒）。
+
+编码检测依次尝试 BOM、严格 UTF-8、常见中日文编码，最后才对文件前缀运行 chardet；
+按文件读取时，检测结果按 (路径, 修改时间, 大小) 缓存。
+"""
+
+import codecs
+import os
+import threading
+from collections import OrderedDict
+
+FRAMES_PER_SECOND = 75
+
+# 编码检测
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),  # 必须在 UTF-16 LE 之前检查（前两个字节相同）
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+CJK_ENCODINGS = ('gbk', 'shift_jis', 'big5')
+CHARDET_PREFIX_BYTES = 16 * 1024
+ENCODING_CACHE_SIZE = 65536
+
+class CueParseError(ValueError):
+    """CUE 文件格式错误"""
+
+def parse_time(value):
+    """将 mm:ss:ff 转换为 CUE 帧数"""
+    try:
+        minutes, seconds, frames = value.split(':')
+        return (int(minutes) * 60 + int(seconds)) * FRAMES_PER_SECOND + int(frames)
+    except ValueError:
+        raise CueParseError(f"无效的时间格式: {value}") from None
+
+def _unquote(value):
+    """取出参数值：带引号时取引号内的内容，否则取整行剩余部分"""
+    if value.startswith('"'):
+        end = value.find('"', 1)
+        return value[1:end] if end != -1 else value[1:]
+    return value.rstrip()
+
+class CueTrack:
+    """CUE 中的一个轨道"""
+    
+    __slots__ = ('number', 'type', 'title', 'performer', 'songwriter', 'isrc',
+                 'flags', 'file', 'indexes', 'pregap', 'postgap', 'rem')
+    
+    def __init__(self, number, track_type='AUDIO', file=None):
+        self.number = number
+        self.type = track_type
+        self.title = None
+        self.performer = None
+        self.songwriter = None
+        self.isrc = None
+        self.flags = ()
+        self.file = file
+        self.indexes = {}
+        self.pregap = 0
+        self.postgap = 0
+        self.rem = {}
+    
+    @property
+    def start_frames(self):
+        """轨道开始位置（INDEX 01，缺失时退回 INDEX 00），单位为帧"""
+        if 1 in self.indexes:
+            return self.indexes[1]
+        return self.indexes.get(0, 0)
+    
+    @property
+    def pregap_frames(self):
+        """INDEX 00 与 INDEX 01 之间的间隔（帧），加上 PREGAP 声明的静音长度"""
+        gap = self.pregap
+        if 0 in self.indexes and 1 in self.indexes:
+            gap += self.indexes[1] - self.indexes[0]
+        return gap
+    
+    @property
+    def start_time(self):
+        """轨道开始时间（秒）"""
+        return self.start_frames / FRAMES_PER_SECOND
+    
+    def __repr__(self):
+        return f"CueTrack({self.number:02d}, {self.title!r}, start={self.start_frames})"
+
+class CueSheet:
+    """解析后的 CUE 文件"""
+    
+    __slots__ = ('title', 'performer', 'songwriter', 'catalog', 'cdtextfile', 'rem', 'files', 'tracks')
+    
+    def __init__(self):
+        self.title = ''
+        self.performer = ''
+        self.songwriter = ''
+        self.catalog = None
+        self.cdtextfile = None
+        self.rem = {}
+        self.files = []
+        self.tracks = []
+    
+    @property
+    def audio_file(self):
+        """第一个 FILE 条目（单文件镜像的音频文件名）"""
+        return self.files[0] if self.files else ''
+    
+    def to_track_dicts(self):
+        """
+        转换为 audio_splitter 使用的轨道字典列表
+        
+        时长按同一 FILE 内下一轨道的开始位置计算；每个 FILE 的最后一个轨道
+        时长为 None，表示一直到该文件结束。
+        """
+        audio_tracks = [t for t in self.tracks if t.type == 'AUDIO']
+        result = []
+        for i, track in enumerate(audio_tracks):
+            next_track = audio_tracks[i + 1] if i + 1 < len(audio_tracks) else None
+            if next_track is not None and next_track.file == track.file:
+                duration_frames = next_track.start_frames - track.start_frames
+            else:
+                duration_frames = None
+            result.append({
+                'number': track.number,
+                'title': track.title or f'Track_{track.number:02d}',
+                'performer': track.performer or self.performer,
+                'start_time': track.start_frames / FRAMES_PER_SECOND,
+                'duration': duration_frames / FRAMES_PER_SECOND if duration_frames is not None else None,
+                'start_frames': track.start_frames,
+                'duration_frames': duration_frames,
+                'pregap_frames': track.pregap_frames,
+                'file': track.file,
+            })
+        return result
+
+def parse_cue_text(text):
+    """
+    解析 CUE 文本
+    
+    单次扫描：每行只做一次切分（命令 + 参数），按命令出现频率分派。
+    TITLE / PERFORMER / SONGWRITER 在第一个 TRACK 之前属于专辑，之后属于当前轨道。
+    
+    Args:
+        text (str): CUE 文件内容
+    
+    Returns:
+        CueSheet: 解析结果
+    """
+    sheet = CueSheet()
+    tracks = sheet.tracks
+    track = None
+    current_file = None
+    
+    for line in text.splitlines():
+        parts = line.split(None, 1)
+        if len(parts) < 2:
+            continue
+        command, args = parts
+        command = command.upper()
+        
+        try:
+            if command == 'INDEX':
+                number, stamp = args.split()[:2]
+                number = int(number)
+                track.indexes[number] = parse_time(stamp)
+                if number == 1:
+                    # 文件切换可能出现在 INDEX 00 与 INDEX 01 之间
+                    track.file = current_file
+            elif command == 'TITLE':
+                if track is None:
+                    sheet.title = _unquote(args)
+                else:
+                    track.title = _unquote(args)
+            elif command == 'PERFORMER':
+                if track is None:
+                    sheet.performer = _unquote(args)
+                else:
+                    track.performer = _unquote(args)
+            elif command == 'TRACK':
+                # 参数之间可能是空格或制表符
+                number, *track_type = args.split()
+                track = CueTrack(int(number), track_type[0].upper() if track_type else 'AUDIO', current_file)
+                tracks.append(track)
+            elif command == 'REM':
+                key, *value = args.split(None, 1)
+                target = sheet.rem if track is None else track.rem
+                target[key.upper()] = _unquote(value[0].strip() if value else '')
+            elif command == 'FILE':
+                if args.startswith('"'):
+                    current_file = _unquote(args)
+                else:
+                    # 不带引号的文件名可能包含空格，最后一个单词是文件类型
+                    current_file = args.rsplit(None, 1)[0]
+                sheet.files.append(current_file)
+            elif command == 'SONGWRITER':
+                if track is None:
+                    sheet.songwriter = _unquote(args)
+                else:
+                    track.songwriter = _unquote(args)
+            elif command == 'ISRC':
+                track.isrc = args.strip()
+            elif command == 'FLAGS':
+                track.flags = tuple(args.split())
+            elif command == 'PREGAP':
+                track.pregap = parse_time(args)
+            elif command == 'POSTGAP':
+                track.postgap = parse_time(args)
+            elif command == 'CATALOG':
+                sheet.catalog = args.strip()
+            elif command == 'CDTEXTFILE':
+                sheet.cdtextfile = _unquote(args)
+        except (AttributeError, ValueError) as e:
+            # AttributeError: 轨道级命令出现在第一个 TRACK 之前
+            raise CueParseError(f"无效的 {command} 行: {line.strip()}") from e
+    
+    return sheet
+
+def _normalize_encoding(name):
+    """统一编码名称（chardet 返回 GB2312 / SHIFT_JIS / Big5 等不同写法）"""
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+def _chardet_guess(data, candidates=None):
+    """用 chardet 检测前 CHARDET_PREFIX_BYTES 字节；chardet 未安装或无结果时返回 None"""
+    try:
+        import chardet
+    except ImportError:
+        return None
+    guess = _normalize_encoding(chardet.detect(data[:CHARDET_PREFIX_BYTES])['encoding'])
+    if candidates is not None:
+        # chardet 可能返回同一编码家族中的其他成员
+        aliases = {'gb2312': 'gbk', 'gb18030': 'gbk', 'cp932': 'shift_jis', 'big5hkscs': 'big5'}
+        guess = aliases.get(guess, guess)
+        return guess if guess in candidates else None
+    return guess
+
+# 各编码中常用字所在的首字节范围（GB2312 一级汉字、Big5 常用字、Shift_JIS 假名和第一水准汉字）
+_COMMON_LEAD_BYTES = {
+    'gbk': (range(0xB0, 0xD8),),
+    'big5': (range(0xA4, 0xC7),),
+    'shift_jis': (range(0x82, 0x84), range(0x88, 0xA0)),
+}
+
+def _common_char_score(text, encoding):
+    """统计前缀中落在该编码常用字范围内的字符数（没有 chardet 时用来区分候选编码）"""
+    ranges = _COMMON_LEAD_BYTES[encoding]
+    score = 0
+    for char in text[:CHARDET_PREFIX_BYTES]:
+        if char < '\x80':
+            continue
+        lead = char.encode(encoding)[0]
+        if any(lead in r for r in ranges):
+            score += 1
+    return score
+
+def decode_cue_bytes(data):
+    """
+    检测编码并解码 CUE 内容
+    
+    检测顺序:
+    1. BOM
+    2. 严格 UTF-8 解码（纯 ASCII 也归为 UTF-8）
+    3. 常见中日文编码（GBK、Shift_JIS、Big5）严格解码；
+       有多个编码都能解码时，用 chardet 在前缀上判断选哪一个，
+       chardet 不可用时选常用字最多的编码
+    4. chardet 检测前缀，仍然失败时按 UTF-8 解码并替换非法字符
+    
+    Returns:
+        tuple: (文本, 编码)
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return data.decode(encoding), encoding
+    
+    try:
+        return data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    
+    decoded = {}
+    for encoding in CJK_ENCODINGS:
+        try:
+            decoded[encoding] = data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    if len(decoded) == 1:
+        encoding, text = decoded.popitem()
+        return text, encoding
+    if decoded:
+        encoding = (_chardet_guess(data, decoded)
+                    or max(decoded, key=lambda name: _common_char_score(decoded[name], name)))
+        return decoded[encoding], encoding
+    
+    encoding = _chardet_guess(data)
+    if encoding:
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            pass
+    return data.decode('utf-8', errors='replace'), 'utf-8'
+
+def detect_encoding_bytes(data):
+    """检测 CUE 内容的编码"""
+    return decode_cue_bytes(data)[1]
+
+class _EncodingCache:
+    """按 (路径, 修改时间, 大小) 缓存检测到的编码（线程安全，超过上限时淘汰最旧的记录）"""
+    
+    def __init__(self, max_entries=ENCODING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            encoding = self._entries.get(key)
+            if encoding is not None:
+                self._entries.move_to_end(key)
+            return encoding
+    
+    def put(self, key, encoding):
+        with self._lock:
+            self._entries[key] = encoding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_encoding_cache = _EncodingCache()
+
+def clear_encoding_cache():
+    """清空编码检测缓存"""
+    _encoding_cache.clear()
+
+def _file_key(file_path):
+    """编码缓存的键: (绝对路径, 修改时间, 大小)"""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+def _decode_file_bytes(key, data):
+    """解码文件内容，优先使用缓存的编码"""
+    encoding = _encoding_cache.get(key)
+    if encoding is not None:
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            pass
+    text, encoding = decode_cue_bytes(data)
+    _encoding_cache.put(key, encoding)
+    return text, encoding
+
+def detect_file_encoding(file_path):
+    """检测文件编码（结果按路径、修改时间、大小缓存）"""
+    key = _file_key(file_path)
+    encoding = _encoding_cache.get(key)
+    if encoding is None:
+        with open(file_path, 'rb') as f:
+            encoding = _decode_file_bytes(key, f.read())[1]
+    return encoding
+
+def _strip_bom(text):
+    return text[1:] if text.startswith('\ufeff') else text
+
+def parse_cue_bytes(data, encoding=None):
+    """
+    解析 CUE 文件的原始字节
+    
+    Args:
+        data (bytes): 文件内容
+        encoding (str): 编码，为 None 时自动检测
+    
+    Returns:
+        tuple: (CueSheet, 使用的编码)
+    """
+    if encoding is None:
+        text, encoding = decode_cue_bytes(data)
+    else:
+        text = data.decode(encoding)
+    return parse_cue_text(_strip_bom(text)), encoding
+
+def parse_cue_sheet(cue_file_path, encoding=None):
+    """
+    读取并解析 CUE 文件（文件只读取一次，编码检测结果会被缓存）
+    
+    Returns:
+        tuple: (CueSheet, 使用的编码)
+    """
+    key = _file_key(cue_file_path)
+    with open(cue_file_path, 'rb') as f:
+        data = f.read()
+    if encoding is None:
+        text, encoding = _decode_file_bytes(key, data)
+    else:
+        text = data.decode(encoding)
+    return parse_cue_text(_strip_bom(text)), encoding
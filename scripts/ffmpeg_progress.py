@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ffmpeg 实时进度 (FFmpeg Progress)
+通过 `ffmpeg -progress pipe:1` 逐行读取编码进度（out_time），结合输入时长
+计算完成比例；stderr 只保留最后若干行，不再把整个输出缓存在内存中。
+
+ProgressTracker 把多个并行 ffmpeg 进程（或多个文件）的进度按权重汇总为
+整体进度，按固定间隔回调，并根据已用时间估算剩余时间 (ETA)。
+
+命令行脚本以 --progress 运行时，整体进度以机器可读的行写到标准输出，
+便于其他程序（例如外部脚本或前端包装）解析:
+    @@progress {"progress": 0.42, "eta": 73.5, "elapsed": 53.2}
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+
+PROGRESS_PREFIX = '@@progress '
+DEFAULT_INTERVAL = 0.5
+STDERR_TAIL_LINES = 200
+
+_DURATION_PATTERN = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+def parse_ffmpeg_duration(line):
+    """从 ffmpeg stderr 的 "Duration: 00:03:25.12" 行中提取时长（秒），没有时返回 None"""
+    match = _DURATION_PATTERN.search(line)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def _parse_out_time(fields):
+    """从一组 -progress 字段中取出已输出的时长（秒）"""
+    # out_time_ms 虽然名字是毫秒，实际单位和 out_time_us 一样是微秒
+    for key in ('out_time_us', 'out_time_ms'):
+        value = fields.get(key)
+        if value and value.lstrip('-').isdigit():
+            return max(0, int(value)) / 1_000_000
+    value = fields.get('out_time')
+    if value and ':' in value:
+        hours, minutes, seconds = value.split(':')
+        try:
+            return max(0.0, int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+        except ValueError:
+            return None
+    return None
+
+def run_ffmpeg(cmd, on_time=None, on_duration=None, timeout=None, job=None):
+    """
+    运行 ffmpeg 并实时读取进度
+    
+    Args:
+        cmd (list): ffmpeg 命令（第一个元素是 ffmpeg 可执行文件）
+        on_time (callable): on_time(秒)，每收到一组进度时回调已输出的时长
+        on_duration (callable): on_duration(秒)，读到输入文件时长时回调一次
+        timeout (float): 超时秒数，超时后终止 ffmpeg 并抛出 subprocess.TimeoutExpired
+        job: 调度器中的任务（有 check_cancelled / attach_process / detach_process 方法），
+            ffmpeg 在独立的进程组中运行并登记到任务上，任务取消时被终止；
+            任务已被取消时不再启动 ffmpeg，直接抛出 check_cancelled 的异常
+    
+    Returns:
+        tuple: (是否成功, stderr 最后若干行)
+    """
+    if on_time is not None:
+        cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    if job is not None:
+        job.check_cancelled()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, encoding='utf-8', errors='replace',
+                               start_new_session=job is not None and os.name == 'posix')
+    if job is not None:
+        job.attach_process(process)
+    
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    
+    def read_stderr():
+        duration_seen = False
+        for line in process.stderr:
+            stderr_tail.append(line)
+            if not duration_seen and on_duration is not None:
+                duration = parse_ffmpeg_duration(line)
+                if duration is not None:
+                    duration_seen = True
+                    on_duration(duration)
+    
+    stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+    stderr_thread.start()
+    
+    timed_out = threading.Event()
+    timer = None
+    if timeout:
+        def kill():
+            timed_out.set()
+            process.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+    
+    try:
+        fields = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key != 'progress':
+                fields[key] = value
+                continue
+            seconds = _parse_out_time(fields)
+            if seconds is not None and on_time is not None:
+                on_time(seconds)
+            fields = {}
+        process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        stderr_thread.join()
+        if job is not None:
+            job.detach_process(process)
+    
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout, stderr=''.join(stderr_tail))
+    return process.returncode == 0, ''.join(stderr_tail)
+
+def format_progress_line(fraction, eta, elapsed):
+    """生成一行机器可读的进度输出"""
+    payload = {'progress': round(fraction, 4), 'eta': None if eta is None else round(eta, 1),
+               'elapsed': round(elapsed, 1)}
+    return PROGRESS_PREFIX + json.dumps(payload)
+
+def print_progress(fraction, eta, elapsed):
+    """把整体进度写到标准输出（供 --progress 使用）"""
+    print(format_progress_line(fraction, eta, elapsed), flush=True)
+
+def format_eta(seconds):
+    """把剩余秒数格式化为 "1分23秒" 这样的文本"""
+    if seconds is None:
+        return '计算中'
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds}秒'
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f'{minutes}分{seconds}秒'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}小时{minutes}分'
+
+class ProgressTracker:
+    """
+    汇总多个工作单元的进度（线程安全）
+    
+    每个单元有一个权重（例如轨道时长），整体进度为各单元完成比例的加权平均。
+    回调 callback(完成比例, 预计剩余秒数, 已用秒数) 最多每 interval 秒触发一次，
+    进度没有变化时不触发，全部完成时一定会触发（只触发一次）。
+    """
+    
+    def __init__(self, callback, interval=DEFAULT_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self._weights = {}
+        self._done = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_emit = None
+        self._last_fraction = None
+    
+    def add(self, key, weight):
+        """登记一个工作单元"""
+        with self._lock:
+            self._weights[key] = max(float(weight), 1e-6)
+            self._done.setdefault(key, 0.0)
+    
+    def set_weight(self, key, weight):
+        """修正工作单元的权重（例如读到了实际时长）"""
+        with self._lock:
+            if key in self._weights and weight > 0:
+                self._weights[key] = float(weight)
+    
+    def update(self, key, fraction):
+        """更新一个工作单元的完成比例（0~1）"""
+        with self._lock:
+            if key not in self._weights:
+                return
+            self._done[key] = min(1.0, max(self._done[key], fraction))
+        self._emit()
+    
+    def finish(self, key):
+        """标记一个工作单元已完成（包括失败，失败的单元不再计入剩余工作）"""
+        self.update(key, 1.0)
+    
+    def fraction(self):
+        """当前整体完成比例"""
+        with self._lock:
+            total = sum(self._weights.values())
+            if not total:
+                return 1.0
+            return sum(self._weights[key] * self._done[key] for key in self._weights) / total
+    
+    def _emit(self):
+        fraction = self.fraction()
+        now = time.monotonic()
+        with self._lock:
+            if fraction == self._last_fraction:
+                return
+            if (fraction < 1.0 and self._last_emit is not None
+                    and now - self._last_emit < self.interval):
+                return
+            self._last_emit = now
+            self._last_fraction = fraction
+        elapsed = now - self._started
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        self.callback(fraction, eta, elapsed)
@@ -0,0 +1,840 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FLAC 原生切割 (FLAC Splitter)
+FLAC 音频由一个个独立编码的帧组成。本模块解析 STREAMINFO 和 SEEKTABLE，
+借助 SEEKTABLE 直接定位到轨道起点附近的帧，然后逐帧复制:
+
+- 完全落在轨道内的帧原样复制压缩数据，只改写帧头中的采样编号
+  （帧头 CRC-8 重新计算，帧尾 CRC-16 利用 CRC 的线性按改动量修正，不需要重算整帧）
+- 轨道边界所在的帧解码后只保留属于本轨道的采样，重新编码为新的帧
+
+输出使用可变块大小的帧编号方式（帧头记录起始采样号），首尾帧的块大小可以与
+其余帧不同，切割精确到单个采样。每个轨道只有边界上的一两帧需要解码和编码，
+其余数据都是字节复制。
+
+STREAMINFO 中的 MD5 是整个音频流解码后的校验值: 轨道覆盖整个源文件时沿用源文件
+的 MD5，否则按规范写 0（表示未知，解码器跳过校验）。
+"""
+
+import bisect
+import functools
+import mmap
+import os
+import re
+import threading
+from itertools import repeat
+from operator import mul, rshift
+
+FLAC_MAGIC = b'fLaC'
+
+# 元数据块类型
+BLOCK_STREAMINFO = 0
+BLOCK_SEEKTABLE = 3
+BLOCK_VORBIS_COMMENT = 4
+BLOCK_CUESHEET = 5
+BLOCK_PICTURE = 6
+# 原样复制到每个轨道的元数据块（标签和封面；CUESHEET 描述的是整张镜像，不复制）
+COPIED_BLOCKS = (BLOCK_VORBIS_COMMENT, BLOCK_PICTURE)
+SEEKPOINT_PLACEHOLDER = 0xFFFFFFFFFFFFFFFF
+
+# 重新编码边界帧时的块大小；除最后一帧外每帧至少 MIN_BLOCKSIZE 个采样
+ENCODE_BLOCKSIZE = 4096
+MIN_BLOCKSIZE = 16
+# 输出文件 SEEKTABLE 的定位点间隔（秒）
+SEEKPOINT_INTERVAL = 10
+# 每个源文件缓存的已解码帧数（相邻两个轨道共用同一个边界帧）
+DECODE_CACHE_SIZE = 16
+
+# 帧头中的采样率 / 位深编码，0 表示沿用 STREAMINFO
+SAMPLE_RATE_CODES = {88200: 1, 176400: 2, 192000: 3, 8000: 4, 16000: 5, 22050: 6, 24000: 7,
+                     32000: 8, 44100: 9, 48000: 10, 96000: 11}
+SAMPLE_SIZES = {1: 8, 2: 12, 4: 16, 5: 20, 6: 24, 7: 32}
+SAMPLE_SIZE_CODES = {bits: code for code, bits in SAMPLE_SIZES.items()}
+# 声道编码 8~10 为立体声去相关: 左/差、右/差、中/差
+CHANNEL_LEFT_SIDE = 8
+CHANNEL_RIGHT_SIDE = 9
+CHANNEL_MID_SIDE = 10
+# 固定预测器（0~4 阶）的系数，与 LPC 相同的形式: 系数依次作用于前 1、2…个采样
+FIXED_COEFFICIENTS = ((), (1,), (2, -1), (3, -3, 1), (4, -6, 4, -1))
+
+_FRAME_SYNC = re.compile(rb'\xff[\xf8\xf9]')
+
+class FlacFormatError(ValueError):
+    """FLAC 文件无法按原生方式切割（文件头或帧损坏、格式不支持）"""
+
+def _build_crc_table(poly, width):
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & mask if crc & top else (crc << 1) & mask
+        table.append(crc)
+    return table
+
+CRC8_TABLE = _build_crc_table(0x07, 8)
+CRC16_TABLE = _build_crc_table(0x8005, 16)
+
+def crc8(data):
+    """帧头校验 CRC-8（多项式 x^8+x^2+x+1，初值 0）"""
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+def crc16(data, crc=0):
+    """帧校验 CRC-16（多项式 x^16+x^15+x^2+1，初值 0）"""
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+def _build_zero_tables(levels=25):
+    """
+    第 j 张表把 CRC-16 寄存器的值映射为再输入 2^j 个零字节后的值
+    
+    CRC 对寄存器是线性的，每张表拆成低字节和高字节两张 256 项的查找表。
+    """
+    def feed_zero_byte(crc):
+        return ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[crc >> 8]
+    
+    def byte_table(basis):
+        table = [0] * 256
+        for value in range(1, 256):
+            low = value & -value
+            table[value] = table[value ^ low] ^ basis[low.bit_length() - 1]
+        return table
+    
+    tables = []
+    basis = [feed_zero_byte(1 << bit) for bit in range(16)]
+    for _ in range(levels):
+        low_table, high_table = byte_table(basis[:8]), byte_table(basis[8:])
+        tables.append((low_table, high_table))
+        # basis 已经是经过 2^j 个零字节的结果，再经过一次即为 2^(j+1) 个零字节
+        basis = [low_table[v & 0xFF] ^ high_table[v >> 8] for v in basis]
+    return tables
+
+_CRC16_ZERO_TABLES = _build_zero_tables()
+
+def crc16_zero_extend(crc, count):
+    """CRC-16 寄存器再输入 count 个零字节后的值，O(log count)"""
+    level = 0
+    while count:
+        if count & 1:
+            low_table, high_table = _CRC16_ZERO_TABLES[level]
+            crc = low_table[crc & 0xFF] ^ high_table[crc >> 8]
+        count >>= 1
+        level += 1
+    return crc
+
+class FlacInfo:
+    """FLAC 文件的 STREAMINFO、定位点和元数据块位置"""
+    
+    __slots__ = ('min_blocksize', 'max_blocksize', 'min_framesize', 'max_framesize', 'sample_rate',
+                 'channels', 'bits_per_sample', 'total_samples', 'md5', 'audio_offset', 'seek_points',
+                 'copied_blocks')
+    
+    def __init__(self, min_blocksize, max_blocksize, min_framesize, max_framesize, sample_rate,
+                 channels, bits_per_sample, total_samples, md5, audio_offset, seek_points, copied_blocks):
+        self.min_blocksize = min_blocksize
+        self.max_blocksize = max_blocksize
+        self.min_framesize = min_framesize        # 0 表示未知
+        self.max_framesize = max_framesize
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bits_per_sample = bits_per_sample
+        self.total_samples = total_samples        # 每个声道的采样数，0 表示未知
+        self.md5 = md5
+        self.audio_offset = audio_offset          # 第一帧在文件中的位置
+        self.seek_points = seek_points            # SEEKTABLE: [(采样号, 相对第一帧的字节偏移)]
+        self.copied_blocks = copied_blocks        # 复制到输出的元数据块: [(类型, 文件位置, 长度)]
+    
+    @property
+    def duration(self):
+        """时长（秒）"""
+        return self.total_samples / self.sample_rate
+
+def _skip_id3v2(f):
+    """跳过文件开头的 ID3v2 标签（部分工具会写在 fLaC 之前），返回 fLaC 的位置"""
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b'ID3':
+        size = 0
+        for byte in header[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        return 10 + size + (10 if header[5] & 0x10 else 0)
+    return 0
+
+def read_flac_header(file_path):
+    """
+    读取 FLAC 元数据块
+    
+    Raises:
+        FlacFormatError: 不是 FLAC 文件或 STREAMINFO 无效
+    """
+    with open(file_path, 'rb') as f:
+        position = _skip_id3v2(f)
+        f.seek(position)
+        if f.read(4) != FLAC_MAGIC:
+            raise FlacFormatError(f"不是 FLAC 文件: {file_path}")
+        position += 4
+        
+        streaminfo = None
+        seek_points = []
+        copied_blocks = []
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                raise FlacFormatError(f"元数据块不完整: {file_path}")
+            block_type = header[0] & 0x7F
+            length = int.from_bytes(header[1:4], 'big')
+            position += 4
+            if block_type == BLOCK_STREAMINFO:
+                streaminfo = f.read(length)
+            elif block_type == BLOCK_SEEKTABLE:
+                table = f.read(length)
+                for offset in range(0, len(table) - 17, 18):
+                    sample = int.from_bytes(table[offset:offset + 8], 'big')
+                    if sample != SEEKPOINT_PLACEHOLDER:
+                        seek_points.append((sample, int.from_bytes(table[offset + 8:offset + 16], 'big')))
+            else:
+                if block_type in COPIED_BLOCKS:
+                    copied_blocks.append((block_type, position, length))
+                f.seek(length, os.SEEK_CUR)
+            position += length
+            if header[0] & 0x80:
+                break
+    
+    if streaminfo is None or len(streaminfo) < 34:
+        raise FlacFormatError(f"缺少有效的 STREAMINFO: {file_path}")
+    # 采样率 20 位、声道数-1 3 位、位深-1 5 位、总采样数 36 位
+    packed = int.from_bytes(streaminfo[10:18], 'big')
+    sample_rate = packed >> 44
+    if not sample_rate:
+        raise FlacFormatError(f"STREAMINFO 采样率无效: {file_path}")
+    return FlacInfo(
+        min_blocksize=int.from_bytes(streaminfo[0:2], 'big'),
+        max_blocksize=int.from_bytes(streaminfo[2:4], 'big'),
+        min_framesize=int.from_bytes(streaminfo[4:7], 'big'),
+        max_framesize=int.from_bytes(streaminfo[7:10], 'big'),
+        sample_rate=sample_rate,
+        channels=((packed >> 41) & 0x7) + 1,
+        bits_per_sample=((packed >> 36) & 0x1F) + 1,
+        total_samples=packed & ((1 << 36) - 1),
+        md5=streaminfo[18:34],
+        audio_offset=position,
+        seek_points=sorted(set(seek_points)),
+        copied_blocks=copied_blocks,
+    )
+
+def encode_utf8_number(value):
+    """帧头中的采样号 / 帧号编码（扩展 UTF-8，最多 36 位）"""
+    if value < 0x80:
+        return bytes((value,))
+    length = 2
+    while value >= 1 << (5 * length + 1):
+        length += 1
+    tail = [0x80 | ((value >> (6 * i)) & 0x3F) for i in range(length - 2, -1, -1)]
+    first = ((0xFF00 >> length) & 0xFF) | (value >> (6 * (length - 1)))
+    return bytes([first] + tail)
+
+class FrameHeader:
+    """一个音频帧的位置和帧头参数"""
+    
+    __slots__ = ('offset', 'header_size', 'number_size', 'blocksize', 'start', 'channel_code',
+                 'bits_per_sample', 'size')
+    
+    def __init__(self, offset, header_size, number_size, blocksize, start, channel_code, bits_per_sample):
+        self.offset = offset                  # 帧在文件中的位置
+        self.header_size = header_size        # 帧头字节数（含 CRC-8）
+        self.number_size = number_size        # 帧头中采样号 / 帧号占用的字节数
+        self.blocksize = blocksize
+        self.start = start                    # 第一个采样的采样号
+        self.channel_code = channel_code
+        self.bits_per_sample = bits_per_sample
+        self.size = None                      # 整帧字节数（含 CRC-16），找到下一帧后确定
+    
+    @property
+    def end(self):
+        """下一帧的第一个采样号"""
+        return self.start + self.blocksize
+
+class _BitReader:
+    """按位读取（大端，FLAC 帧内的编码方式）"""
+    
+    __slots__ = ('data', 'pos')
+    
+    def __init__(self, data, byte_offset=0):
+        self.data = data
+        self.pos = byte_offset << 3
+    
+    def read(self, bits):
+        if not bits:
+            return 0
+        pos = self.pos
+        start = pos >> 3
+        end = (pos + bits + 7) >> 3
+        value = int.from_bytes(self.data[start:end], 'big')
+        self.pos = pos + bits
+        return (value >> ((end << 3) - pos - bits)) & ((1 << bits) - 1)
+    
+    def read_signed(self, bits):
+        value = self.read(bits)
+        if bits and value >> (bits - 1):
+            value -= 1 << bits
+        return value
+    
+    def read_unary(self):
+        """读取连续的 0 直到遇到 1，返回 0 的个数"""
+        data = self.data
+        index = self.pos >> 3
+        bit = self.pos & 7
+        current = data[index] & (0xFF >> bit)
+        count = -bit
+        while not current:
+            count += 8
+            index += 1
+            current = data[index]
+        leading = 8 - current.bit_length()
+        self.pos = (index << 3) + leading + 1
+        return count + leading
+    
+    def align(self):
+        self.pos = (self.pos + 7) & ~7
+
+class _BitWriter:
+    """按位写入，满 8 字节时转存到 bytearray"""
+    
+    __slots__ = ('buffer', 'value', 'bits')
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.value = 0
+        self.bits = 0
+    
+    def write(self, value, bits):
+        self.value = (self.value << bits) | value
+        self.bits += bits
+        if self.bits >= 64:
+            extra = self.bits & 7
+            self.buffer += (self.value >> extra).to_bytes((self.bits - extra) >> 3, 'big')
+            self.value &= (1 << extra) - 1
+            self.bits = extra
+    
+    def getvalue(self):
+        """补 0 到整字节后返回全部内容"""
+        padding = -self.bits & 7
+        return bytes(self.buffer) + (self.value << padding).to_bytes((self.bits + padding) >> 3, 'big')
+
+def _read_residual(reader, blocksize, predictor_order):
+    """读取 Rice 编码的预测残差"""
+    method = reader.read(2)
+    if method > 1:
+        raise FlacFormatError(f"不支持的残差编码方式: {method}")
+    parameter_bits, escape = (4, 15) if method == 0 else (5, 31)
+    partition_order = reader.read(4)
+    partition_size = blocksize >> partition_order
+    if partition_size << partition_order != blocksize or partition_size < predictor_order:
+        raise FlacFormatError("残差分区无效")
+    
+    residual = []
+    append = residual.append
+    read = reader.read
+    read_unary = reader.read_unary
+    for partition in range(1 << partition_order):
+        count = partition_size - predictor_order if partition == 0 else partition_size
+        parameter = read(parameter_bits)
+        if parameter == escape:
+            bits = read(5)
+            residual.extend(reader.read_signed(bits) for _ in range(count))
+            continue
+        for _ in range(count):
+            value = (read_unary() << parameter) | read(parameter)
+            append((value >> 1) ^ -(value & 1))
+    return residual
+
+def _restore_prediction(warmup, coefficients, shift, residual):
+    """按预测系数从残差还原采样"""
+    samples = list(warmup)
+    order = len(coefficients)
+    if not order:
+        samples.extend(residual)
+        return samples
+    reversed_coefficients = coefficients[::-1]
+    append = samples.append
+    for index, value in enumerate(residual):
+        append(value + (sum(map(mul, reversed_coefficients, samples[index:index + order])) >> shift))
+    return samples
+
+def _decode_subframe(reader, blocksize, bits):
+    if reader.read(1):
+        raise FlacFormatError("子帧头无效")
+    kind = reader.read(6)
+    wasted = reader.read_unary() + 1 if reader.read(1) else 0
+    bits -= wasted
+    if kind == 0:
+        samples = [reader.read_signed(bits)] * blocksize
+    elif kind == 1:
+        samples = [reader.read_signed(bits) for _ in range(blocksize)]
+    elif 8 <= kind <= 12:
+        order = kind - 8
+        warmup = [reader.read_signed(bits) for _ in range(order)]
+        samples = _restore_prediction(warmup, FIXED_COEFFICIENTS[order], 0,
+                                      _read_residual(reader, blocksize, order))
+    elif kind >= 32:
+        order = kind - 31
+        warmup = [reader.read_signed(bits) for _ in range(order)]
+        precision = reader.read(4) + 1
+        shift = reader.read_signed(5)
+        if precision == 16 or shift < 0:
+            raise FlacFormatError("LPC 参数无效")
+        coefficients = [reader.read_signed(precision) for _ in range(order)]
+        samples = _restore_prediction(warmup, coefficients, shift, _read_residual(reader, blocksize, order))
+    else:
+        raise FlacFormatError(f"保留的子帧类型: {kind}")
+    if wasted:
+        samples = [sample << wasted for sample in samples]
+    return samples
+
+def decode_frame(data, header):
+    """
+    解码一个帧
+    
+    Args:
+        data: 文件内容（bytes 或 mmap）
+        header (FrameHeader): parse_frame_header 的结果
+    
+    Returns:
+        tuple: (各声道的采样列表, 帧的结束位置)
+    
+    Raises:
+        FlacFormatError: 帧数据无效或 CRC-16 校验失败
+    """
+    reader = _BitReader(data, header.offset + header.header_size)
+    code = header.channel_code
+    bits = header.bits_per_sample
+    try:
+        if code < CHANNEL_LEFT_SIDE:
+            channels = [_decode_subframe(reader, header.blocksize, bits) for _ in range(code + 1)]
+        else:
+            # 差声道多 1 位
+            first = _decode_subframe(reader, header.blocksize, bits + (code == CHANNEL_RIGHT_SIDE))
+            second = _decode_subframe(reader, header.blocksize, bits + (code != CHANNEL_RIGHT_SIDE))
+            if code == CHANNEL_LEFT_SIDE:
+                channels = [first, [left - side for left, side in zip(first, second)]]
+            elif code == CHANNEL_RIGHT_SIDE:
+                channels = [[side + right for side, right in zip(first, second)], second]
+            else:
+                mids = [(mid << 1) | (side & 1) for mid, side in zip(first, second)]
+                channels = [[(mid + side) >> 1 for mid, side in zip(mids, second)],
+                            [(mid - side) >> 1 for mid, side in zip(mids, second)]]
+        reader.align()
+        end = (reader.pos >> 3) + 2
+    except IndexError:
+        raise FlacFormatError("帧数据不完整") from None
+    if end > len(data) or crc16(data[header.offset:end - 2]) != int.from_bytes(data[end - 2:end], 'big'):
+        raise FlacFormatError(f"帧 CRC 校验失败 (位置 {header.offset})")
+    return channels, end
+
+def _rice_cost(values, parameter):
+    return len(values) * (parameter + 1) + sum(map(rshift, values, repeat(parameter, len(values))))
+
+def _encode_subframe(writer, samples, bits):
+    """编码一个子帧: 常数、0~4 阶固定预测或原样存储，取最小的一种"""
+    mask = (1 << bits) - 1
+    count = len(samples)
+    first = samples[0]
+    if samples.count(first) == count:
+        writer.write(0, 8)
+        writer.write(first & mask, bits)
+        return
+    
+    # 固定预测的残差就是逐阶差分，取绝对值之和最小的阶数
+    chosen = None
+    residual = samples
+    for order in range(min(4, count - 1) + 1):
+        if order:
+            residual = [residual[i] - residual[i - 1] for i in range(1, len(residual))]
+        if max(map(abs, residual)) >= 1 << 30:
+            continue
+        magnitude = sum(map(abs, residual))
+        if chosen is None or magnitude < chosen[0]:
+            chosen = (magnitude, order, residual)
+    
+    best = None
+    if chosen is not None:
+        _, order, residual = chosen
+        folded = [(value << 1) ^ (value >> 63) for value in residual]
+        guess = max(1, (sum(folded) // len(folded)).bit_length() - 1)
+        for parameter in range(guess - 1, min(guess + 1, 30) + 1):
+            cost = order * bits + (4 if parameter < 15 else 5) + _rice_cost(folded, parameter)
+            if best is None or cost < best[0]:
+                best = (cost, order, parameter, folded)
+    
+    if best is None or best[0] >= count * bits:
+        writer.write(1 << 1, 8)
+        for sample in samples:
+            writer.write(sample & mask, bits)
+        return
+    
+    _, order, parameter, folded = best
+    writer.write((8 + order) << 1, 8)
+    for sample in samples[:order]:
+        writer.write(sample & mask, bits)
+    # 残差编码方式 0（4 位 Rice 参数）或 1（5 位），分区阶数 0
+    escape_free = parameter < 15
+    writer.write(0 if escape_free else 1, 2)
+    writer.write(0, 4)
+    writer.write(parameter, 4 if escape_free else 5)
+    low_mask = (1 << parameter) - 1
+    write = writer.write
+    for value in folded:
+        write((1 << parameter) | (value & low_mask), (value >> parameter) + 1 + parameter)
+
+def encode_frame(channels, start, info):
+    """
+    把一段采样编码为一个帧（可变块大小的帧头，记录起始采样号）
+    
+    声道独立编码，采样率和位深沿用 STREAMINFO。
+    """
+    blocksize = len(channels[0])
+    size_code = SAMPLE_SIZE_CODES.get(info.bits_per_sample, 0)
+    header = bytearray((0xFF, 0xF9,
+                        (6 if blocksize <= 256 else 7) << 4 | SAMPLE_RATE_CODES.get(info.sample_rate, 0),
+                        (len(channels) - 1) << 4 | size_code << 1))
+    header += encode_utf8_number(start)
+    header += (blocksize - 1).to_bytes(1 if blocksize <= 256 else 2, 'big')
+    header.append(crc8(header))
+    
+    writer = _BitWriter()
+    for samples in channels:
+        _encode_subframe(writer, samples, info.bits_per_sample)
+    frame = bytes(header) + writer.getvalue()
+    return frame + crc16(frame).to_bytes(2, 'big')
+
+def _split_blocks(channels):
+    """把一段采样平均分成不超过 ENCODE_BLOCKSIZE 的若干块"""
+    count = len(channels[0])
+    blocks = -(-count // ENCODE_BLOCKSIZE)
+    step = -(-count // blocks) if blocks else 0
+    for start in range(0, count, step or 1):
+        yield [samples[start:start + step] for samples in channels]
+
+class FlacSource:
+    """
+    打开一个 FLAC 源文件用于切割（内存映射，可在多个线程中同时切割不同的轨道）
+    
+    用法:
+        with FlacSource('album.flac') as source:
+            source.write_track(start_sample, sample_count, 'out.flac')
+    """
+    
+    def __init__(self, file_path, info=None):
+        self.file_path = file_path
+        self.info = info or read_flac_header(file_path)
+        if not self.info.total_samples:
+            raise FlacFormatError("STREAMINFO 中没有总采样数，无法定位轨道")
+        self._file = open(file_path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+        # 帧编号方式（固定 / 可变块大小）整个流一致，以第一帧为准
+        self._variable = self._data[self.info.audio_offset + 1:self.info.audio_offset + 2] == b'\xf9'
+        self._points = [(0, self.info.audio_offset)] + [
+            (sample, self.info.audio_offset + offset) for sample, offset in self.info.seek_points if sample
+        ]
+        self._indexed = len(self._points) > 1
+        self._frames = None         # 没有 SEEKTABLE 时扫描得到的全部帧（已确定字节数）
+        self._index_lock = threading.Lock()
+        self._decode_cached = functools.lru_cache(maxsize=DECODE_CACHE_SIZE)(self._decode_at)
+    
+    def close(self):
+        self._decode_cached.cache_clear()
+        self._data.close()
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def parse_frame_header(self, offset):
+        """解析 offset 处的帧头，不是有效帧头（含 CRC-8 不符）时返回 None"""
+        data = self._data[offset:offset + 16]
+        if len(data) < 6 or data[0] != 0xFF or data[1] & 0xFE != 0xF8:
+            return None
+        variable = data[1] & 1
+        blocksize_code = data[2] >> 4
+        rate_code = data[2] & 0x0F
+        channel_code = data[3] >> 4
+        size_code = (data[3] >> 1) & 0x07
+        if not blocksize_code or rate_code == 15 or channel_code > CHANNEL_MID_SIDE or size_code == 3 or data[3] & 1:
+            return None
+        
+        first = data[4]
+        if first < 0x80:
+            number_size, number = 1, first
+        elif 0xC0 <= first < 0xFE:
+            number_size = 8 - (first ^ 0xFF).bit_length()
+            number = first & (0x7F >> number_size)
+            for byte in data[5:4 + number_size]:
+                if byte & 0xC0 != 0x80:
+                    return None
+                number = (number << 6) | (byte & 0x3F)
+        elif first == 0xFE:
+            number_size, number = 7, 0
+            for byte in data[5:11]:
+                if byte & 0xC0 != 0x80:
+                    return None
+                number = (number << 6) | (byte & 0x3F)
+        else:
+            return None
+        
+        position = 4 + number_size
+        if blocksize_code == 1:
+            blocksize = 192
+        elif blocksize_code <= 5:
+            blocksize = 576 << (blocksize_code - 2)
+        elif blocksize_code == 6:
+            blocksize = data[position] + 1 if len(data) > position else 0
+            position += 1
+        elif blocksize_code == 7:
+            blocksize = int.from_bytes(data[position:position + 2], 'big') + 1
+            position += 2
+        else:
+            blocksize = 256 << (blocksize_code - 8)
+        position += {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+        if len(data) <= position or crc8(data[:position]) != data[position]:
+            return None
+        
+        channels = channel_code + 1 if channel_code < CHANNEL_LEFT_SIDE else 2
+        bits = SAMPLE_SIZES.get(size_code, self.info.bits_per_sample)
+        if channels != self.info.channels or bits != self.info.bits_per_sample:
+            return None
+        if variable != self._variable:
+            return None
+        # 固定块大小的流帧头记录的是帧号
+        start = number if variable else number * self.info.max_blocksize
+        return FrameHeader(offset, position + 1, number_size, blocksize, start, channel_code, bits)
+    
+    def _decode_at(self, offset):
+        header = self.parse_frame_header(offset)
+        if header is None:
+            raise FlacFormatError(f"帧头无效 (位置 {offset})")
+        return decode_frame(self._data, header)
+    
+    def decode(self, frame):
+        """解码一个帧，返回各声道的采样列表（最近解码的帧有缓存）"""
+        channels, _ = self._decode_cached(frame.offset)
+        return channels
+    
+    def next_frame(self, frame):
+        """
+        查找 frame 之后的一帧，同时确定 frame 的字节数
+        
+        下一帧的帧头须通过 CRC-8 且起始采样号与 frame 衔接，避免把帧数据中的同步码误认为帧头。
+        最后一帧没有后继，解码它以确定结束位置（文件末尾可能还有 ID3v1 等标签）。
+        
+        Returns:
+            FrameHeader: 下一帧，frame 是最后一帧时返回 None
+        """
+        if frame.end >= self.info.total_samples:
+            frame.size = self._decode_cached(frame.offset)[1] - frame.offset
+            return None
+        position = frame.offset + max(frame.header_size, self.info.min_framesize - 2, 1)
+        while True:
+            match = _FRAME_SYNC.search(self._data, position)
+            if match is None:
+                raise FlacFormatError(f"找不到采样 {frame.end} 所在的帧")
+            candidate = self.parse_frame_header(match.start())
+            if candidate is not None and candidate.start == frame.end:
+                frame.size = candidate.offset - frame.offset
+                return candidate
+            position = match.start() + 1
+    
+    def _build_index(self):
+        """没有 SEEKTABLE 时顺序扫描一遍所有帧，之后直接按采样号查找，不再重复扫描"""
+        with self._index_lock:
+            if self._indexed:
+                return
+            frames = []
+            frame = self._first_frame()
+            while frame is not None:
+                frames.append(frame)
+                frame = self.next_frame(frame)
+            self._frames = frames
+            self._points = [(frame.start, frame.offset) for frame in frames]
+            self._indexed = True
+    
+    def _first_frame(self):
+        frame = self.parse_frame_header(self.info.audio_offset)
+        if frame is None or frame.start != 0:
+            raise FlacFormatError("第一帧的帧头无效")
+        return frame
+    
+    def find_frame(self, sample):
+        """找到包含 sample 的帧: 从不超过 sample 的最近一个定位点开始向后逐帧查找"""
+        if not self._indexed:
+            self._build_index()
+        index = bisect.bisect_right(self._points, (sample, float('inf'))) - 1
+        if self._frames is not None:
+            if sample >= self.info.total_samples:
+                raise FlacFormatError(f"采样 {sample} 超出了音频长度")
+            return self._frames[index]
+        frame = None
+        # 定位点指向的位置不是预期的帧时（SEEKTABLE 过期），改用更早的定位点
+        while index > 0:
+            point_sample, offset = self._points[index]
+            frame = self.parse_frame_header(offset)
+            if frame is not None and frame.start == point_sample:
+                break
+            frame = None
+            index -= 1
+        if frame is None:
+            frame = self._first_frame()
+        while frame.end <= sample:
+            frame = self.next_frame(frame)
+            if frame is None:
+                raise FlacFormatError(f"采样 {sample} 超出了音频长度")
+        return frame
+    
+    def frames(self, start, end):
+        """依次返回与采样范围 [start, end) 重叠的帧（已确定字节数）"""
+        frame = self.find_frame(start)
+        if self._frames is not None:
+            index = bisect.bisect_left(self._points, (frame.start, frame.offset))
+            for frame in self._frames[index:]:
+                if frame.start >= end:
+                    break
+                yield frame
+            return
+        while frame is not None and frame.start < end:
+            following = self.next_frame(frame)
+            yield frame
+            frame = following
+    
+    def _rewrite_frame_header(self, frame, start):
+        """
+        把帧头改为可变块大小的帧头，记录新的起始采样号
+        
+        Returns:
+            tuple: (新帧头, 新的 CRC-16)
+        """
+        data = self._data
+        old_header = data[frame.offset:frame.offset + frame.header_size]
+        header = bytearray((0xFF, 0xF9, old_header[2], old_header[3]))
+        header += encode_utf8_number(start)
+        header += old_header[4 + frame.number_size:-1]
+        header.append(crc8(header))
+        # CRC-16(帧头 + 其余部分) = 帧头的 CRC 再经过其余部分长度的零字节 ⊕ 其余部分的 CRC，
+        # 只需按两个帧头 CRC 的差值修正原来的校验值
+        frame_end = frame.offset + frame.size
+        body_size = frame.size - frame.header_size - 2
+        old_crc = int.from_bytes(data[frame_end - 2:frame_end], 'big')
+        new_crc = old_crc ^ crc16_zero_extend(crc16(old_header) ^ crc16(header), body_size)
+        return bytes(header), new_crc.to_bytes(2, 'big')
+    
+    def plan_track(self, start, count):
+        """
+        计算轨道 [start, start + count) 的输出帧
+        
+        Returns:
+            list: 每一帧为 (起始采样, 块大小, 字节数, 内容)，内容是重新编码的帧 (bytes)
+                或 (新帧头, 源文件中帧数据的起止位置, 新的 CRC-16)
+        """
+        end = start + count
+        segments = []
+        for frame in self.frames(start, end) if count else ():
+            low, high = max(start, frame.start), min(end, frame.end)
+            if low == frame.start and high == frame.end:
+                segments.append(frame)
+            else:
+                segments.append([samples[low - frame.start:high - frame.start] for samples in self.decode(frame)])
+        # 除最后一帧外块大小不能小于 MIN_BLOCKSIZE: 过短的开头与下一帧合并后一起编码
+        if len(segments) > 1 and isinstance(segments[0], list) and len(segments[0][0]) < MIN_BLOCKSIZE:
+            following = segments[1]
+            if isinstance(following, FrameHeader):
+                following = self.decode(following)
+            segments[0:2] = [[head + tail for head, tail in zip(segments[0], following)]]
+        
+        planned = []
+        position = 0
+        for segment in segments:
+            if isinstance(segment, FrameHeader):
+                header, crc = self._rewrite_frame_header(segment, position)
+                body = (segment.offset + segment.header_size, segment.offset + segment.size - 2)
+                planned.append((position, segment.blocksize, len(header) + body[1] - body[0] + 2,
+                                (header, body, crc)))
+                position += segment.blocksize
+                continue
+            for block in _split_blocks(segment):
+                frame = encode_frame(block, position, self.info)
+                planned.append((position, len(block[0]), len(frame), frame))
+                position += len(block[0])
+        return planned
+    
+    def _build_metadata(self, planned, count, full_range):
+        info = self.info
+        blocksizes = [blocksize for _, blocksize, _, _ in planned]
+        framesizes = [size for _, _, size, _ in planned]
+        # 最小块大小不计最后一帧
+        min_blocksize = max(MIN_BLOCKSIZE, min(blocksizes[:-1] or blocksizes or [MIN_BLOCKSIZE]))
+        max_blocksize = max(blocksizes + [min_blocksize])
+        packed = (info.sample_rate << 44 | (info.channels - 1) << 41 | (info.bits_per_sample - 1) << 36
+                  | count)
+        streaminfo = (min_blocksize.to_bytes(2, 'big') + max_blocksize.to_bytes(2, 'big')
+                      + min(framesizes or [0]).to_bytes(3, 'big') + max(framesizes or [0]).to_bytes(3, 'big')
+                      + packed.to_bytes(8, 'big') + (info.md5 if full_range else bytes(16)))
+        
+        seektable = bytearray()
+        offset = 0
+        next_point = 0
+        interval = SEEKPOINT_INTERVAL * info.sample_rate
+        for start, blocksize, size, _ in planned:
+            if start + blocksize > next_point:
+                seektable += start.to_bytes(8, 'big') + offset.to_bytes(8, 'big') + blocksize.to_bytes(2, 'big')
+                next_point = (start // interval + 1) * interval
+            offset += size
+        
+        blocks = [(BLOCK_STREAMINFO, streaminfo)]
+        if seektable:
+            blocks.append((BLOCK_SEEKTABLE, bytes(seektable)))
+        for block_type, position, length in info.copied_blocks:
+            blocks.append((block_type, self._data[position:position + length]))
+        metadata = bytearray(FLAC_MAGIC)
+        for index, (block_type, content) in enumerate(blocks):
+            last = 0x80 if index == len(blocks) - 1 else 0
+            metadata.append(last | block_type)
+            metadata += len(content).to_bytes(3, 'big') + content
+        return bytes(metadata)
+    
+    def write_track(self, start_sample, sample_count, output_path):
+        """把一段采样写成独立的 FLAC 文件，返回复制的帧数"""
+        planned = self.plan_track(start_sample, sample_count)
+        full_range = start_sample == 0 and sample_count == self.info.total_samples
+        metadata = self._build_metadata(planned, sample_count, full_range)
+        
+        copied = 0
+        data = self._data
+        tmp_path = output_path + '.part'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(metadata)
+                for _, _, _, content in planned:
+                    if isinstance(content, bytes):
+                        f.write(content)
+                        continue
+                    header, (body_start, body_end), crc = content
+                    f.write(header)
+                    f.write(data[body_start:body_end])
+                    f.write(crc)
+                    copied += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, output_path)
+        return copied
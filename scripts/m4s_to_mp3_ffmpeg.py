@@ -5,45 +5,158 @@ M4S to MP3 Converter (使用 FFmpeg)
 将 m4s 格式的音频文件批量转换为 mp3 格式
 使用 ffmpeg 命令行工具进行转换，避免 Python 3.13 兼容性问题
 
+也可以输出 m4a / aac / mka: B 站缓存的音频 m4s 本身就是 AAC，输出格式能直接容纳源编码时
+只重新封装（-c:a copy），不解码也不重新编码，音质无损，速度只受磁盘读写限制。
+
 作者: GitHub Copilot
 日期: 2025年9月9日
 """
 
 import os
-import sys
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 import logging
 import shutil
+from collections import namedtuple
+
+from conversion_cache import ConversionCache
+from ffmpeg_progress import ProgressTracker, print_progress, run_ffmpeg
+from media_probe import probe_media
+from output_manifest import ManifestWriter, manifest_entry
+
+def configure_logging(log_file='m4s_conversion.log'):
+    """
+    命令行运行时配置日志（写入日志文件并输出到控制台）
+    
+    作为库导入时不修改日志配置，日志沿用调用方（例如 Web 界面）的设置。
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+class CPUBudget:
+    """
+    CPU 预算：限制同一进程内所有转换任务同时运行的 ffmpeg 进程总数
+    
+    多个转换器（例如 Web 界面中并发的多个任务）共用同一个预算时，
+    各自的工作线程需要先领取一个名额才能启动 ffmpeg，避免相互抢占 CPU。
+    """
+    
+    def __init__(self, slots):
+        self.slots = max(1, int(slots))
+        self._semaphore = threading.BoundedSemaphore(self.slots)
+    
+    @contextmanager
+    def slot(self):
+        """占用一个名额，直到 with 块结束"""
+        self._semaphore.acquire()
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+# 进程级别的全局 CPU 预算，None 表示不限制
+_global_cpu_budget = None
+_global_cpu_budget_lock = threading.Lock()
+
+def set_global_cpu_budget(slots):
+    """设置全局 CPU 预算（同时运行的 ffmpeg 进程总数），传入 None 或 0 取消限制"""
+    global _global_cpu_budget
+    with _global_cpu_budget_lock:
+        _global_cpu_budget = CPUBudget(slots) if slots else None
+    return _global_cpu_budget
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('m4s_conversion.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+def get_global_cpu_budget():
+    """获取全局 CPU 预算，首次调用时读取环境变量 MUSICTOOL_CPU_BUDGET"""
+    global _global_cpu_budget
+    with _global_cpu_budget_lock:
+        if _global_cpu_budget is None:
+            slots = int(os.environ.get('MUSICTOOL_CPU_BUDGET', 0) or 0)
+            if slots > 0:
+                _global_cpu_budget = CPUBudget(slots)
+        return _global_cpu_budget
+
+# 输出格式: 扩展名、可以直接复制（不重新编码）的源编码（None 表示任何编码都可以）、需要转码时使用的编码器
+OutputFormat = namedtuple('OutputFormat', ('extension', 'copy_codecs', 'encoder'))
+
+OUTPUT_FORMATS = {
+    'mp3': OutputFormat('.mp3', ('mp3',), 'libmp3lame'),
+    'm4a': OutputFormat('.m4a', ('aac', 'alac'), 'aac'),
+    'aac': OutputFormat('.aac', ('aac',), 'aac'),
+    'mka': OutputFormat('.mka', None, 'aac'),
+}
+
+# 编码方式: auto 先探测源编码，输出格式能容纳时直接复制，否则转码；copy 总是复制；transcode 总是转码
+CODEC_MODES = ('auto', 'copy', 'transcode')
 
 class M4SToMP3ConverterFFmpeg:
-    """使用 FFmpeg 的 M4S 到 MP3 转换器"""
+    """使用 FFmpeg 的 M4S 到 MP3 转换器（也可以输出 OUTPUT_FORMATS 中的其他格式）"""
     
-    def __init__(self, source_dir="m4s", output_dir="mp3_output"):
+    # 转码时的比特率（同时作为转换缓存的比对依据）
+    bitrate = '192k'
+    
+    def __init__(self, source_dir="m4s", output_dir="mp3_output", workers=None,
+                 cpu_budget=None, progress_callback=None, force=False, prune_cache=False,
+                 overall_progress_callback=None, job=None, manifest=None,
+                 output_format='mp3', codec_mode='auto'):
         """
         初始化转换器
         
         Args:
             source_dir (str): 源文件目录（包含m4s文件）
             output_dir (str): 输出目录（保存mp3文件）
+            workers (int): 并行转换的工作线程数，默认为 CPU 核心数
+            cpu_budget (CPUBudget): 共享的 CPU 预算，默认使用全局预算（未设置时不限制）
+            progress_callback (callable): 进度回调，按文件顺序依次收到进度事件字典
+            force (bool): 忽略转换缓存，重新转换所有文件
+            prune_cache (bool): 转换前清理转换缓存中失效的记录
+            overall_progress_callback (callable): 整体进度回调 callback(完成比例, 预计剩余秒数, 已用秒数)，
+                按 ffmpeg 实时输出的时长计算，最多每 0.5 秒触发一次
+            job: 调度器中的任务，ffmpeg 进程登记到任务上，任务取消时被终止，剩余文件不再转换
+            manifest (ManifestWriter): 每个文件转换完成时写入一条输出清单记录
+            output_format (str): 输出格式，OUTPUT_FORMATS 中的一项
+            codec_mode (str): 编码方式，CODEC_MODES 中的一项
+        
+        Raises:
+            ValueError: 不支持的输出格式或编码方式
         """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+        if codec_mode not in CODEC_MODES:
+            raise ValueError(f"不支持的编码方式: {codec_mode}")
         self.source_dir = Path(source_dir)
         self.output_dir = Path(output_dir)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.cpu_budget = cpu_budget
+        self.progress_callback = progress_callback
+        self.overall_progress_callback = overall_progress_callback
+        self._tracker = None
+        self.force = force
+        self.prune_cache = prune_cache
+        self.cache = None
         self.converted_count = 0
+        self.skipped_count = 0
         self.failed_count = 0
         self.failed_files = []
+        self.file_results = {}          # 源文件路径 -> 转换结果（输出清单记录）
+        self._started = {}              # 源文件路径 -> 开始转换的时间（由 _lock 保护）
+        self.job = job
+        self.manifest = manifest
+        self.output_format = OUTPUT_FORMATS[output_format]
+        self.codec_mode = codec_mode
         self.ffmpeg_path = None
-        
+        self.ffprobe_path = None
+        self._lock = threading.Lock()
+    
     def check_ffmpeg(self):
         """检查 ffmpeg 是否可用"""
         try:
@@ -64,11 +177,15 @@ class M4SToMP3ConverterFFmpeg:
             if result.returncode == 0:
                 version_line = result.stdout.split('\n')[0]
                 logging.info(f"找到 FFmpeg: {version_line}")
+                # 自动选择编码方式时用 ffprobe 探测源编码；没有 ffprobe 时全部转码
+                self.ffprobe_path = shutil.which('ffprobe')
+                if self.codec_mode == 'auto' and self.output_format.copy_codecs and not self.ffprobe_path:
+                    logging.warning("未找到 ffprobe，无法判断能否直接复制音频流，将全部转码")
                 return True
             else:
                 logging.error("ffmpeg 执行失败")
                 return False
-                
+        
         except Exception as e:
             logging.error(f"检查 ffmpeg 时出错: {e}")
             return False
@@ -93,73 +210,267 @@ class M4SToMP3ConverterFFmpeg:
         logging.info(f"找到 {len(m4s_files)} 个 m4s 文件")
         return m4s_files
     
+    def _file_result(self, m4s_file, output_path, status, error=None, codec=None):
+        """保存单个文件的转换结果（调用方持有 _lock），同时写入输出清单"""
+        started = self._started.pop(str(m4s_file), None)
+        entry = manifest_entry(
+            output=str(output_path.absolute()) if output_path else None,
+            source=str(m4s_file.absolute()),
+            title=m4s_file.stem,
+            size=output_path.stat().st_size if output_path and output_path.exists() else None,
+            codec=codec,
+            seconds=round(time.monotonic() - started, 3) if started is not None else 0.0,
+            status=status,
+            error=error,
+        )
+        self.file_results[str(m4s_file)] = entry
+        if self.manifest is not None:
+            self.manifest.write(entry)
+    
+    def _record_success(self, m4s_file, output_path, codec):
+        """记录一个成功的文件（线程安全）"""
+        with self._lock:
+            self.converted_count += 1
+            self._file_result(m4s_file, output_path, 'done', codec=codec)
+    
+    def _record_skipped(self, m4s_file, output_path):
+        """记录一个因未变化而跳过的文件（线程安全）"""
+        with self._lock:
+            self.skipped_count += 1
+            self._file_result(m4s_file, output_path, 'skipped')
+    
+    def _record_failure(self, m4s_file, error=None):
+        """记录一个失败的文件（线程安全）"""
+        with self._lock:
+            self.failed_count += 1
+            self.failed_files.append(str(m4s_file.name))
+            self._file_result(m4s_file, None, 'failed', error)
+    
+    @contextmanager
+    def _cpu_slot(self):
+        """在 CPU 预算内占用一个名额（未设置预算时直接执行）"""
+        budget = self.cpu_budget or get_global_cpu_budget()
+        if budget is None:
+            yield
+            return
+        with budget.slot():
+            yield
+    
+    def cache_settings(self):
+        """
+        影响输出内容的编码参数
+        
+        auto 方式下是否复制由源文件的内容决定，源文件不变时结果也不变，
+        因此不写入编码方式，之前的版本（总是转码为 MP3）留下的缓存仍然有效。
+        """
+        settings = {'codec': self.output_format.encoder, 'bitrate': self.bitrate,
+                    'format': self.output_format.extension}
+        if self.codec_mode != 'auto':
+            settings['mode'] = self.codec_mode
+        return settings
+    
+    def choose_codec(self, m4s_file):
+        """
+        决定一个文件直接复制音频流还是转码
+        
+        Returns:
+            str: 'copy' 或转码使用的编码器
+        """
+        copy_codecs = self.output_format.copy_codecs
+        if self.codec_mode == 'copy' or (self.codec_mode == 'auto' and copy_codecs is None):
+            return 'copy'
+        if self.codec_mode == 'auto' and self.ffprobe_path:
+            # 探测结果按文件大小和修改时间缓存，重复转换同一批文件时不再启动 ffprobe
+            media_info = probe_media(m4s_file)
+            if media_info is not None and media_info.codec in copy_codecs:
+                return 'copy'
+        return self.output_format.encoder
+    
     def convert_single_file(self, m4s_file):
         """
         转换单个 m4s 文件为 mp3
         
         Args:
             m4s_file (Path): m4s 文件路径
-            
+        
         Returns:
             bool: 转换是否成功
         """
         try:
+            # 任务已取消时剩余的文件不再转换
+            if self.job is not None and self.job.cancelled:
+                return False
+            with self._lock:
+                self._started[str(m4s_file)] = time.monotonic()
+            
             # 生成输出文件名
-            mp3_filename = m4s_file.stem + ".mp3"
+            mp3_filename = m4s_file.stem + self.output_format.extension
             output_path = self.output_dir / mp3_filename
             
-            logging.info(f"开始转换: {m4s_file.name}")
+            # 源文件和编码参数都未变化且输出仍然存在时跳过
+            cache_args = (str(m4s_file.absolute()), str(m4s_file.absolute()),
+                          self.cache_settings(), str(output_path.absolute()))
+            if self.cache and not self.force and self.cache.is_fresh(*cache_args):
+                logging.info(f"跳过(未变化): {m4s_file.name}")
+                self._record_skipped(m4s_file, output_path)
+                return True
+            
+            codec = self.choose_codec(m4s_file)
+            logging.info(f"开始{'复制' if codec == 'copy' else '转换'}: {m4s_file.name}")
             
             # 构建 ffmpeg 命令
             # -i: 输入文件
-            # -codec:a libmp3lame: 使用 MP3 编码器
-            # -b:a 192k: 设置音频比特率为 192kbps
+            # -vn: 只保留音频流
+            # -codec:a copy: 直接复制音频流；否则用 self.output_format.encoder 编码，
+            #     -b:a 192k: 设置音频比特率为 192kbps
             # -y: 覆盖输出文件（如果存在）
             cmd = [
                 self.ffmpeg_path,
                 '-i', str(m4s_file),
-                '-codec:a', 'libmp3lame',
-                '-b:a', '192k',
-                '-y',  # 覆盖输出文件
-                str(output_path)
+                '-vn',
+                '-codec:a', codec,
             ]
+            if codec != 'copy':
+                cmd.extend(['-b:a', self.bitrate])
+            cmd.extend(['-y', str(output_path)])  # 覆盖输出文件
             
-            # 执行转换
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5分钟超时
-            )
+            # 执行转换（读取 ffmpeg 实时进度，stderr 只保留最后若干行）
+            # 直接复制只受磁盘读写限制，不占用 CPU 预算
+            on_time, on_duration = self._progress_hooks(m4s_file)
+            with (self._cpu_slot() if codec != 'copy' else nullcontext()):
+                ok, stderr = run_ffmpeg(cmd, on_time=on_time, on_duration=on_duration,
+                                        timeout=300, job=self.job)  # 5分钟超时
             
-            if result.returncode == 0:
-                logging.info(f"转换完成: {mp3_filename}")
-                self.converted_count += 1
-                
+            if ok:
                 # 检查输出文件是否存在且有内容
                 if output_path.exists() and output_path.stat().st_size > 0:
+                    logging.info(f"转换完成: {mp3_filename}")
+                    self._record_success(m4s_file, output_path, codec)
+                    if self.cache:
+                        self.cache.record(*cache_args)
                     return True
                 else:
                     logging.error(f"输出文件为空或不存在: {mp3_filename}")
-                    self.failed_count += 1
-                    self.failed_files.append(str(m4s_file.name))
+                    self._record_failure(m4s_file, '输出文件为空或不存在')
                     return False
             else:
-                logging.error(f"转换失败 {m4s_file.name}: {result.stderr}")
-                self.failed_count += 1
-                self.failed_files.append(str(m4s_file.name))
+                logging.error(f"转换失败 {m4s_file.name}: {stderr}")
+                self._record_failure(m4s_file, stderr)
                 return False
-                
+        
         except subprocess.TimeoutExpired:
             logging.error(f"转换超时 {m4s_file.name}")
-            self.failed_count += 1
-            self.failed_files.append(str(m4s_file.name))
+            self._record_failure(m4s_file, '转换超时')
             return False
         except Exception as e:
             logging.error(f"转换失败 {m4s_file.name}: {str(e)}")
-            self.failed_count += 1
-            self.failed_files.append(str(m4s_file.name))
+            self._record_failure(m4s_file, str(e))
             return False
+        finally:
+            self._finish_progress(m4s_file)
+    
+    def _progress_hooks(self, m4s_file):
+        """生成 run_ffmpeg 的进度回调（未设置整体进度回调时返回 (None, None)）"""
+        tracker = self._tracker
+        if tracker is None:
+            return None, None
+        duration = {}
+        
+        def on_duration(seconds):
+            duration['value'] = seconds
+        
+        def on_time(seconds):
+            if duration.get('value'):
+                tracker.update(str(m4s_file), seconds / duration['value'])
+        
+        return on_time, on_duration
+    
+    def _finish_progress(self, m4s_file):
+        """标记一个文件的进度已完成"""
+        if self._tracker is not None:
+            self._tracker.finish(str(m4s_file))
+    
+    def _emit_progress(self, index, total, m4s_file, success):
+        """发送一个进度事件"""
+        event = {
+            'index': index,
+            'total': total,
+            'file': m4s_file.name,
+            'success': success,
+        }
+        logging.info(f"进度: {index}/{total} {'✅' if success else '❌'} {m4s_file.name}")
+        if self.progress_callback:
+            self.progress_callback(event)
+    
+    def convert_files(self, m4s_files):
+        """
+        并行转换一组 m4s 文件
+        
+        最多 self.workers 个文件同时转换。进度事件按文件在列表中的顺序发送：
+        后面的文件先完成时会暂存，等前面的文件全部完成后再依次发出。
+        
+        Returns:
+            list: 与 m4s_files 顺序一致的转换结果（bool）
+        """
+        total = len(m4s_files)
+        results = [None] * total
+        next_index = 0
+        
+        # 每个文件权重相同，文件内部的进度按 ffmpeg 输出的时长计算
+        if self.overall_progress_callback:
+            self._tracker = ProgressTracker(self.overall_progress_callback)
+            for m4s_file in m4s_files:
+                self._tracker.add(str(m4s_file), 1)
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.convert_single_file, m4s_file): i
+                for i, m4s_file in enumerate(m4s_files)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                while next_index < total and results[next_index] is not None:
+                    self._emit_progress(next_index + 1, total, m4s_files[next_index], results[next_index])
+                    next_index += 1
+        
+        return results
+    
+    def _convert_with_cache(self, m4s_files):
+        """打开输出目录的转换缓存并转换一组文件"""
+        logging.info(f"开始批量转换 {len(m4s_files)} 个文件（{self.workers} 个并行任务）...")
+        
+        self.cache = ConversionCache(self.output_dir)
+        if self.prune_cache:
+            logging.info(f"已清理 {self.cache.prune()} 条失效的缓存记录")
+        try:
+            return self.convert_files(m4s_files)
+        finally:
+            self.cache.save()
+    
+    def convert(self, m4s_files):
+        """
+        库接口：转换指定的 m4s 文件，供 Web 界面在进程内直接调用
+        
+        Args:
+            m4s_files (list): m4s 文件路径（不限于 source_dir）
+        
+        Returns:
+            dict: {'converted': 成功数, 'skipped': 跳过数, 'failed': 失败数, 'output_dir': 输出目录,
+                   'files': [每个文件的输出清单记录（见 output_manifest），与输入顺序一致]}
+        
+        Raises:
+            RuntimeError: 未找到 ffmpeg 或无法创建输出目录
+        """
+        if not self.check_ffmpeg():
+            raise RuntimeError("未找到可用的 ffmpeg")
+        if not self.setup_output_directory():
+            raise RuntimeError(f"无法创建输出目录: {self.output_dir}")
+        
+        m4s_files = [Path(f) for f in m4s_files]
+        self._convert_with_cache(m4s_files)
+        files = [self.file_results[str(f)] for f in m4s_files if str(f) in self.file_results]
+        return {'converted': self.converted_count, 'skipped': self.skipped_count, 'failed': self.failed_count,
+                'output_dir': str(self.output_dir.absolute()), 'files': files}
     
     def convert_all_files(self):
         """批量转换所有 m4s 文件"""
@@ -177,12 +488,7 @@ class M4SToMP3ConverterFFmpeg:
             logging.warning("没有找到 m4s 文件")
             return False
         
-        logging.info(f"开始批量转换 {len(m4s_files)} 个文件...")
-        
-        # 逐个转换文件
-        for i, m4s_file in enumerate(m4s_files, 1):
-            logging.info(f"进度: {i}/{len(m4s_files)}")
-            self.convert_single_file(m4s_file)
+        self._convert_with_cache(m4s_files)
         
         # 输出转换结果统计
         self.print_conversion_summary()
@@ -190,13 +496,14 @@ class M4SToMP3ConverterFFmpeg:
     
     def print_conversion_summary(self):
         """打印转换结果摘要"""
-        total_files = self.converted_count + self.failed_count
+        total_files = self.converted_count + self.skipped_count + self.failed_count
         
         print("\n" + "="*50)
         print("转换完成摘要")
         print("="*50)
         print(f"总文件数: {total_files}")
         print(f"成功转换: {self.converted_count}")
+        print(f"跳过(未变化): {self.skipped_count}")
         print(f"转换失败: {self.failed_count}")
         
         if self.failed_files:
@@ -208,28 +515,56 @@ class M4SToMP3ConverterFFmpeg:
         print("="*50)
         
         # 记录到日志
-        logging.info(f"转换完成 - 成功: {self.converted_count}, 失败: {self.failed_count}")
+        logging.info(f"转换完成 - 成功: {self.converted_count}, 跳过: {self.skipped_count}, 失败: {self.failed_count}")
+
+def parse_arguments(argv=None):
+    """解析命令行参数"""
+    import argparse
+    parser = argparse.ArgumentParser(description='M4S to MP3 Converter (FFmpeg 版本)')
+    parser.add_argument('source_dir', nargs='?', default='m4s', help='源目录 (默认: m4s)')
+    parser.add_argument('output_dir', nargs='?', default='mp3_output', help='输出目录 (默认: mp3_output)')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='并行转换的工作线程数 (默认: CPU 核心数)')
+    parser.add_argument('--cpu-budget', type=int, default=None,
+                        help='同时运行的 ffmpeg 进程总数上限 (默认: 环境变量 MUSICTOOL_CPU_BUDGET，未设置时不限制)')
+    parser.add_argument('--force', action='store_true', help='忽略转换缓存，重新转换所有文件')
+    parser.add_argument('--prune-cache', action='store_true',
+                        help='清理转换缓存中源文件或输出文件已不存在的记录')
+    parser.add_argument('--progress', action='store_true',
+                        help='向标准输出写入机器可读的整体进度行（@@progress，每行一个 JSON）')
+    parser.add_argument('--manifest', default=None,
+                        help='把每个文件的输出记录写入这个 JSON Lines 清单文件')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='mp3',
+                        help='输出格式；m4a/aac/mka 可以直接复制 AAC 音频流，不重新编码 (默认: mp3)')
+    parser.add_argument('--codec-mode', choices=CODEC_MODES, default='auto',
+                        help='auto 探测源编码后决定直接复制还是转码, copy 总是直接复制, transcode 总是转码 (默认: auto)')
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None):
     """主函数"""
+    args = parse_arguments(argv)
+    configure_logging()
+    
     print("M4S to MP3 Converter (FFmpeg 版本)")
     print("="*40)
     
-    # 检查命令行参数
-    source_dir = "m4s"
-    output_dir = "mp3_output"
-    
-    if len(sys.argv) > 1:
-        source_dir = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_dir = sys.argv[2]
+    source_dir = args.source_dir
+    output_dir = args.output_dir
+    if args.cpu_budget:
+        set_global_cpu_budget(args.cpu_budget)
     
     print(f"源目录: {source_dir}")
     print(f"输出目录: {output_dir}")
+    print(f"输出格式: {args.format} ({args.codec_mode})")
     print("-"*40)
     
     # 创建转换器并执行转换
-    converter = M4SToMP3ConverterFFmpeg(source_dir, output_dir)
+    manifest = ManifestWriter(args.manifest) if args.manifest else None
+    converter = M4SToMP3ConverterFFmpeg(source_dir, output_dir, workers=args.workers,
+                                        force=args.force, prune_cache=args.prune_cache,
+                                        overall_progress_callback=print_progress if args.progress else None,
+                                        manifest=manifest, output_format=args.format,
+                                        codec_mode=args.codec_mode)
     
     try:
         success = converter.convert_all_files()
@@ -243,6 +578,10 @@ def main():
     except Exception as e:
         print(f"\n❌ 发生意外错误: {e}")
         logging.error(f"意外错误: {e}")
+    finally:
+        if manifest:
+            manifest.close()
+            print(f"📝 输出清单: {args.manifest} ({manifest.count} 条)")
 
 if __name__ == "__main__":
     main()
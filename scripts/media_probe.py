@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体探测 (Media Probe)
+读取音频文件的编码、采样率、声道数、位深和总采样数:
+
+- WAV / FLAC 直接解析文件头（WAV 的 fmt/data 块，FLAC 的 STREAMINFO），只读几十个字节
+- 其他格式（m4s、mp3 等）调用 ffprobe，解析其 JSON 输出
+
+结果按 (路径, 大小, 修改时间) 缓存，同一个文件在切割、校验、进度估算和文件列表之间
+只探测一次；指定缓存文件时（例如 Web 服务）重启后仍然有效，多个进程共用缓存文件时
+保存前合并其他进程写入的记录。
+
+使用方法:
+    python media_probe.py <文件>...
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+from conversion_cache import file_lock
+from flac_splitter import FlacFormatError, read_flac_header
+from wav_splitter import WAVE_FORMAT_IEEE_FLOAT, WavFormatError, read_wav_info
+
+# 缓存的最大条目数，超出时丢弃最久未使用的记录
+DEFAULT_MAX_ENTRIES = 20000
+CACHE_VERSION = 1
+FFPROBE_TIMEOUT = 30
+# 直接解析文件头的格式
+HEADER_FORMATS = ('.wav', '.flac')
+
+class MediaInfo(namedtuple('MediaInfo', ('codec', 'sample_rate', 'channels', 'bits_per_sample', 'total_samples'))):
+    """
+    音频流信息；无法确定的字段为 None
+    
+    total_samples 为每个声道的采样数（FLAC 文件头中总采样数为 0 表示未知）。
+    """
+    
+    __slots__ = ()
+    
+    @property
+    def duration(self):
+        """时长（秒），未知时为 None"""
+        if self.total_samples is None or not self.sample_rate:
+            return None
+        return self.total_samples / self.sample_rate
+    
+    def to_dict(self):
+        return dict(self._asdict(), duration=self.duration)
+
+def read_flac_info(path):
+    """
+    解析 FLAC 的 STREAMINFO 块
+    
+    Returns:
+        MediaInfo: 不是 FLAC 文件或 STREAMINFO 无效时返回 None
+    """
+    try:
+        info = read_flac_header(path)
+    except FlacFormatError:
+        return None
+    return MediaInfo('flac', info.sample_rate, info.channels, info.bits_per_sample, info.total_samples or None)
+
+def read_wav_media_info(path):
+    """
+    解析 WAV 文件头
+    
+    Returns:
+        MediaInfo: 不是 PCM / 浮点 WAV 时返回 None
+    """
+    try:
+        info = read_wav_info(path)
+    except WavFormatError:
+        return None
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        codec = f'pcm_f{info.bits_per_sample}le'
+    elif info.bits_per_sample == 8:
+        codec = 'pcm_u8'
+    else:
+        codec = f'pcm_s{info.bits_per_sample}le'
+    return MediaInfo(codec, info.sample_rate, info.channels, info.bits_per_sample, info.total_samples)
+
+def read_header_info(path):
+    """按扩展名解析 WAV / FLAC 文件头，其他格式或文件头无效时返回 None"""
+    suffix = Path(path).suffix.lower()
+    if suffix == '.wav':
+        return read_wav_media_info(path)
+    if suffix == '.flac':
+        return read_flac_info(path)
+    return None
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def ffprobe_info(path, ffprobe_path=None):
+    """
+    用 ffprobe 读取第一个音频流的信息
+    
+    总采样数优先取 duration_ts（时间基为 1/采样率时就是采样数），否则按时长换算。
+    
+    Returns:
+        MediaInfo: 没有 ffprobe、没有音频流或探测失败时返回 None
+    """
+    ffprobe_path = ffprobe_path or shutil.which('ffprobe')
+    if not ffprobe_path:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe_path, '-v', 'error', '-select_streams', 'a:0', '-print_format', 'json',
+             '-show_streams', '-show_format', str(path)],
+            capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=FFPROBE_TIMEOUT
+        )
+        data = json.loads(result.stdout) if result.returncode == 0 else {}
+    except (OSError, subprocess.TimeoutExpired, ValueError):
+        return None
+    streams = data.get('streams') or []
+    if not streams:
+        return None
+    stream = streams[0]
+    
+    sample_rate = _int_or_none(stream.get('sample_rate'))
+    total_samples = None
+    if sample_rate:
+        if stream.get('time_base') == f'1/{sample_rate}' and _int_or_none(stream.get('duration_ts')):
+            total_samples = int(stream['duration_ts'])
+        else:
+            duration = stream.get('duration') or (data.get('format') or {}).get('duration')
+            try:
+                total_samples = round(float(duration) * sample_rate)
+            except (TypeError, ValueError):
+                pass
+    bits = _int_or_none(stream.get('bits_per_raw_sample')) or _int_or_none(stream.get('bits_per_sample'))
+    return MediaInfo(stream.get('codec_name'), sample_rate, _int_or_none(stream.get('channels')),
+                     bits or None, total_samples)
+
+class MediaProbe:
+    """带缓存的媒体探测（线程安全）"""
+    
+    def __init__(self, cache_file=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            cache_file (str): 缓存文件路径，为 None 时只在内存中缓存
+            max_entries (int): 缓存的最大条目数
+        """
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (绝对路径, 大小, 修改时间) -> MediaInfo 或 None（无法探测）
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+    
+    def _read_file(self):
+        """读取缓存文件中的记录，文件不存在或版本不同时返回空列表（文件损坏时抛出 OSError / ValueError）"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return []
+        if data.get('version') != CACHE_VERSION:
+            return []
+        return data.get('entries', [])
+    
+    def load(self):
+        """从缓存文件加载，文件不存在或损坏时从空缓存开始"""
+        if self.cache_file is None:
+            return
+        try:
+            entries = self._read_file()
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 媒体探测缓存无法读取，将重新生成: {e}")
+            return
+        with self._lock:
+            for path, size, mtime_ns, fields in entries:
+                self._entries[(path, size, mtime_ns)] = MediaInfo(*fields) if fields else None
+    
+    def save(self):
+        """
+        保存到缓存文件，没有变化时不写入
+        
+        在文件锁内合并磁盘上其他进程写入的记录（本进程的记录优先，超出上限时丢弃最旧的），
+        再写入唯一的临时文件并替换。
+        """
+        if self.cache_file is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.cache_file.with_name(self.cache_file.name + '.lock')):
+            merged = OrderedDict()
+            try:
+                for path, size, mtime_ns, fields in self._read_file():
+                    merged[(path, size, mtime_ns)] = fields
+            except (OSError, ValueError):
+                pass
+            with self._lock:
+                for key, info in self._entries.items():
+                    merged.pop(key, None)
+                    merged[key] = list(info) if info else None
+            while len(merged) > self.max_entries:
+                merged.popitem(last=False)
+            entries = [[path, size, mtime_ns, fields] for (path, size, mtime_ns), fields in merged.items()]
+            fd, tmp_path = tempfile.mkstemp(prefix=self.cache_file.name + '.', suffix='.tmp',
+                                            dir=self.cache_file.parent)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': CACHE_VERSION, 'entries': entries}, f, ensure_ascii=False)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.cache_file)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp_path)
+                raise
+    
+    @staticmethod
+    def _key(path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+    
+    def cached(self, path):
+        """
+        只查缓存，不探测
+        
+        Returns:
+            tuple: (是否有缓存, MediaInfo 或 None)
+        """
+        try:
+            key = self._key(path)
+        except OSError:
+            return False, None
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+    
+    def probe(self, path, use_ffprobe=True):
+        """
+        探测文件，结果按 (路径, 大小, 修改时间) 缓存
+        
+        Args:
+            use_ffprobe (bool): 文件头无法解析时是否调用 ffprobe；为 False 时只解析 WAV / FLAC 文件头
+                （文件列表使用，避免为每个文件启动一个进程）
+        
+        Returns:
+            MediaInfo: 文件不存在或无法探测时返回 None
+        """
+        try:
+            key = self._key(path)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        
+        try:
+            info = read_header_info(path)
+        except OSError:
+            return None
+        header_format = Path(path).suffix.lower() in HEADER_FORMATS
+        if info is None and use_ffprobe and shutil.which('ffprobe'):
+            info = ffprobe_info(path)
+        elif info is None and not header_format:
+            # 没有尝试 ffprobe（不允许或没有安装），不缓存失败结果，以后能用 ffprobe 时再探测
+            return None
+        
+        with self._lock:
+            self._entries[key] = info
+            self._dirty = True
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+# 进程级别的默认探测器（只在内存中缓存），Web 服务启动时替换为带缓存文件的实例
+_media_probe = MediaProbe()
+
+def get_media_probe():
+    """获取默认探测器"""
+    return _media_probe
+
+def set_media_probe(probe):
+    """替换默认探测器"""
+    global _media_probe
+    _media_probe = probe
+    return probe
+
+def probe_media(path, use_ffprobe=True):
+    """用默认探测器探测文件，见 MediaProbe.probe"""
+    return _media_probe.probe(path, use_ffprobe)
+
+def main(argv=None):
+    """命令行: 输出每个文件的探测结果（JSON）"""
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("用法: python media_probe.py <文件>...")
+        return 1
+    failed = 0
+    for path in paths:
+        info = probe_media(path)
+        if info is None:
+            failed += 1
+            print(f"❌ 无法探测: {path}")
+        else:
+            print(json.dumps(dict(info.to_dict(), path=path), ensure_ascii=False))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
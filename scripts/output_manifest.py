@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出清单 (Output Manifest)
+每次切割或转换把产出的文件逐条写入一个 JSON Lines 文件（每行一个输出文件），
+之后列出、打包任务的输出时直接读取清单，不需要重新扫描输出目录。
+
+每条记录的字段:
+    output            输出文件的绝对路径
+    source            源文件的绝对路径
+    number            轨道号（M4S 转换为 None）
+    title / performer 标题和艺术家
+    sample_rate       源文件的采样率
+    start_samples     轨道在源文件中的起始采样
+    duration_samples  轨道的采样数（未知时为 None）
+    size              输出文件的字节数（失败时为 None）
+    codec             输出编码器（copy 表示直接复制采样数据）
+    seconds           处理耗时（秒）
+    status            done（已处理）、skipped（未变化，沿用已有输出）或 failed
+    error             失败原因
+"""
+
+import json
+import threading
+
+MANIFEST_FIELDS = ('output', 'source', 'number', 'title', 'performer', 'sample_rate', 'start_samples',
+                   'duration_samples', 'size', 'codec', 'seconds', 'status', 'error')
+
+def manifest_entry(**fields):
+    """生成一条清单记录，没有提供的字段为 None"""
+    unknown = set(fields) - set(MANIFEST_FIELDS)
+    if unknown:
+        raise ValueError(f"未知的清单字段: {', '.join(sorted(unknown))}")
+    return {name: fields.get(name) for name in MANIFEST_FIELDS}
+
+class ManifestWriter:
+    """
+    逐条追加写入清单（线程安全）
+    
+    每条记录写完立即 flush，进程中途退出时已完成的文件仍然记录在清单中。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.count = 0
+    
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.count += 1
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_manifest(path, entries):
+    """把一组记录写成清单文件，返回写入的条数"""
+    with ManifestWriter(path) as writer:
+        for entry in entries:
+            writer.write(entry)
+        return writer.count
+
+def read_manifest(path):
+    """
+    读取清单文件
+    
+    跳过无法解析的行（例如进程中途退出时写了一半的最后一行）。
+    
+    Raises:
+        OSError: 清单文件不存在或无法读取
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
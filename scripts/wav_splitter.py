@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WAV 原生切割 (WAV Splitter)
+WAV 镜像中的每个轨道只是 PCM 数据里的一段连续字节。本模块读取 RIFF 头，
+按 CUE 帧（1/75 秒）换算出精确的采样位置，把对应字节段直接复制到新的
+WAV 文件中：不解码、不重新编码，输出与源文件的采样格式完全一致。
+
+复制优先使用 os.copy_file_range（内核内复制），其次 os.sendfile，
+都不可用时退回到内存映射 (mmap) 分块写出。
+"""
+
+import mmap
+import os
+import struct
+
+from cue_parser import FRAMES_PER_SECOND
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+class WavFormatError(ValueError):
+    """WAV 文件无法按原生方式切割（格式不支持或文件头损坏）"""
+
+class WavInfo:
+    """WAV 文件的格式信息和 PCM 数据位置"""
+    
+    __slots__ = ('format_tag', 'channels', 'sample_rate', 'bits_per_sample', 'block_align',
+                 'fmt_chunk', 'data_offset', 'data_size')
+    
+    def __init__(self, format_tag, channels, sample_rate, bits_per_sample, block_align,
+                 fmt_chunk, data_offset, data_size):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.block_align = block_align
+        self.fmt_chunk = fmt_chunk          # 原始 fmt 块内容，写出时原样保留
+        self.data_offset = data_offset      # PCM 数据在文件中的起始位置
+        self.data_size = data_size          # PCM 数据字节数（按整块对齐）
+    
+    @property
+    def total_samples(self):
+        """每个声道的采样数"""
+        return self.data_size // self.block_align
+    
+    @property
+    def duration(self):
+        """时长（秒）"""
+        return self.total_samples / self.sample_rate
+
+def read_wav_info(file_path):
+    """
+    读取 WAV 文件头
+    
+    支持 PCM、IEEE 浮点以及 WAVE_FORMAT_EXTENSIBLE 封装的这两种格式。
+    
+    Raises:
+        WavFormatError: 不是 RIFF/WAVE 文件、缺少 fmt/data 块或采样格式不支持
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise WavFormatError(f"不是 RIFF/WAVE 文件: {file_path}")
+        
+        fmt_chunk = None
+        position = 12
+        while True:
+            f.seek(position)
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise WavFormatError(f"未找到 data 块: {file_path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'fmt ':
+                fmt_chunk = f.read(chunk_size)
+            elif chunk_id == b'data':
+                data_offset = position + 8
+                # 流式写出的文件 data 大小可能是 0 或 0xFFFFFFFF，按实际文件长度截断
+                data_size = chunk_size
+                if data_size == 0 or data_offset + data_size > file_size:
+                    data_size = file_size - data_offset
+                break
+            # 块按偶数字节对齐
+            position += 8 + chunk_size + (chunk_size & 1)
+    
+    if fmt_chunk is None or len(fmt_chunk) < 16:
+        raise WavFormatError(f"缺少有效的 fmt 块: {file_path}")
+    format_tag, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack('<HHIIHH', fmt_chunk[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt_chunk) >= 26:
+        # 子格式 GUID 的前两个字节就是实际的格式编号
+        format_tag = struct.unpack('<H', fmt_chunk[24:26])[0]
+    if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise WavFormatError(f"不支持的 WAV 采样格式: 0x{format_tag:04X}")
+    if not channels or not sample_rate or not block_align:
+        raise WavFormatError(f"WAV 文件头参数无效: {file_path}")
+    
+    data_size -= data_size % block_align
+    return WavInfo(format_tag, channels, sample_rate, bits_per_sample, block_align,
+                   fmt_chunk, data_offset, data_size)
+
+def frames_to_samples(frames, sample_rate):
+    """CUE 帧数换算为采样数（44.1 kHz 时每帧正好 588 个采样）"""
+    return frames * sample_rate // FRAMES_PER_SECOND
+
+def track_sample_range(track, info):
+    """
+    计算轨道的采样范围 (起始采样, 采样数)
+    
+    优先使用 CUE 帧（start_frames / duration_frames），没有时按秒数换算；
+    没有时长的最后一首歌一直到数据末尾。
+    """
+    if track.get('start_frames') is not None:
+        start = frames_to_samples(track['start_frames'], info.sample_rate)
+    else:
+        start = round(track['start_time'] * info.sample_rate)
+    
+    if track.get('duration_frames') is not None:
+        end = frames_to_samples(track['start_frames'] + track['duration_frames'], info.sample_rate)
+    elif track.get('duration'):
+        end = round((track['start_time'] + track['duration']) * info.sample_rate)
+    else:
+        end = info.total_samples
+    
+    start = min(start, info.total_samples)
+    end = min(max(end, start), info.total_samples)
+    return start, end - start
+
+def build_wav_header(info, data_size):
+    """生成输出文件的 RIFF 头（fmt 块沿用源文件）"""
+    fmt_chunk = info.fmt_chunk
+    if len(fmt_chunk) & 1:
+        fmt_chunk += b'\x00'
+    riff_size = 4 + 8 + len(fmt_chunk) + 8 + data_size + (data_size & 1)
+    if riff_size > 0xFFFFFFFF:
+        raise WavFormatError("轨道超过 4 GB，无法写入标准 WAV 文件")
+    return (struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE')
+            + struct.pack('<4sI', b'fmt ', len(info.fmt_chunk)) + fmt_chunk
+            + struct.pack('<4sI', b'data', data_size))
+
+def _copy_with_mmap(src_fd, dst_fd, offset, length):
+    """通过内存映射分块写出"""
+    with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            end = offset + length
+            while offset < end:
+                chunk_end = min(offset + COPY_CHUNK_SIZE, end)
+                written = os.write(dst_fd, view[offset:chunk_end])
+                if written == 0:
+                    # 映射比需要的范围短：源文件在切割过程中被截短
+                    raise OSError(f"源文件被截短，缺少偏移 {offset} 之后的 {end - offset} 字节")
+                offset += written
+        finally:
+            view.release()
+
+def copy_range(src_fd, dst_fd, offset, length):
+    """
+    把源文件 [offset, offset + length) 的字节追加写入目标文件当前位置
+    
+    依次尝试 copy_file_range、sendfile，不支持时使用 mmap。
+    """
+    remaining = length
+    for name in ('copy_file_range', 'sendfile'):
+        copy = getattr(os, name, None)
+        if copy is None:
+            continue
+        try:
+            while remaining > 0:
+                if name == 'copy_file_range':
+                    copied = copy(src_fd, dst_fd, min(remaining, COPY_CHUNK_SIZE), offset)
+                else:
+                    copied = copy(dst_fd, src_fd, offset, min(remaining, COPY_CHUNK_SIZE))
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+            if remaining == 0:
+                return
+        except OSError:
+            # 跨文件系统、内核不支持等情况，换下一种方式继续复制剩余部分
+            continue
+    if remaining > 0:
+        _copy_with_mmap(src_fd, dst_fd, offset, remaining)
+
+def write_track(audio_file, info, start_sample, sample_count, output_path):
+    """把一段采样写成独立的 WAV 文件，返回写入的 PCM 字节数"""
+    offset = info.data_offset + start_sample * info.block_align
+    length = sample_count * info.block_align
+    
+    tmp_path = output_path + '.part'
+    src_fd = os.open(audio_file, os.O_RDONLY)
+    try:
+        dst_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(dst_fd, build_wav_header(info, length))
+            copy_range(src_fd, dst_fd, offset, length)
+            if length & 1:
+                os.write(dst_fd, b'\x00')
+        finally:
+            os.close(dst_fd)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        os.close(src_fd)
+    os.replace(tmp_path, output_path)
+    return length
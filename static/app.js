@@ -3,6 +3,14 @@
 let currentTool = null;
 let selectedFiles = [];
 let currentTaskId = null;
+let currentTask = null;
+let recentTasks = [];
+let taskEvents = null;
+let systemInfoTimer = null;
+
+const HISTORY_SIZE = 5;
+const PARALLEL_UPLOADS = 3;  // 同时上传的文件数
+const UPLOAD_RETRIES = 5;    // 上传数据块失败后的重试次数
 
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', function () {
@@ -15,10 +23,63 @@ document.addEventListener('DOMContentLoaded', function () {
     // 设置文件选择
     setupFileInput();
 
-    // 定期更新任务状态
-    setInterval(updateTaskStatus, 2000);
+    // 订阅任务变更事件
+    connectTaskEvents();
 });
 
+// 订阅任务变更事件（浏览器不支持 EventSource 时退回定时轮询）
+function connectTaskEvents() {
+    if (!window.EventSource) {
+        setInterval(updateTaskStatus, 2000);
+        return;
+    }
+
+    // 断线后浏览器会自动重连，并通过 Last-Event-ID 补发断线期间的事件
+    taskEvents = new EventSource('/api/events');
+    taskEvents.addEventListener('task', function (e) {
+        applyTaskEvent(JSON.parse(e.data));
+    });
+    taskEvents.addEventListener('reset', function () {
+        // 断线太久，错过的事件已无法补发，重新获取完整状态
+        loadTaskHistory();
+        loadSystemInfo();
+        updateTaskStatus();
+    });
+}
+
+// 应用一条任务变更事件
+function applyTaskEvent(event) {
+    if (event.op === 'create') {
+        recentTasks = recentTasks.concat([event.task]).slice(-HISTORY_SIZE);
+        renderTaskHistory();
+        scheduleSystemInfoRefresh();
+        return;
+    }
+
+    const task = recentTasks.find(t => t.id === event.id);
+    if (task) {
+        Object.assign(task, event.fields);
+    }
+    if ('status' in event.fields) {
+        renderTaskHistory();
+        scheduleSystemInfoRefresh();
+    }
+
+    if (currentTask && currentTask.id === event.id) {
+        Object.assign(currentTask, event.fields);
+        handleTaskState(currentTask);
+    }
+}
+
+// 合并短时间内的多次状态变化，只刷新一次系统信息
+function scheduleSystemInfoRefresh() {
+    if (systemInfoTimer) return;
+    systemInfoTimer = setTimeout(function () {
+        systemInfoTimer = null;
+        loadSystemInfo();
+    }, 1000);
+}
+
 // 选择工具
 function selectTool(tool) {
     currentTool = tool;
@@ -37,6 +98,7 @@ function selectTool(tool) {
         document.querySelector('#file-drop-zone h5').textContent = '选择 M4S 文件';
         document.querySelector('#file-drop-zone p').textContent = '支持批量选择 M4S 文件进行转换';
     }
+    document.getElementById('m4s-format-group').style.display = tool === 'm4s' ? 'block' : 'none';
 
     // 刷新文件列表 - 现有文件功能已移除
     // refreshFiles();
@@ -124,13 +186,8 @@ function handleFileSelection(files) {
     uploadFiles(validFiles);
 }
 
-// 上传文件
+// 上传文件（分块上传，断线后从已上传的位置继续）
 function uploadFiles(files) {
-    const formData = new FormData();
-    files.forEach(file => {
-        formData.append('files', file);
-    });
-
     // 显示上传进度容器
     const progressContainer = document.getElementById('upload-progress-container');
     const progressBar = document.getElementById('upload-progress-bar');
@@ -142,53 +199,148 @@ function uploadFiles(files) {
 
     showLoadingMessage('上传文件中...');
 
-    // 创建XMLHttpRequest以支持进度显示
-    const xhr = new XMLHttpRequest();
+    // 按字节汇总所有文件的上传进度
+    const totalBytes = files.reduce((sum, file) => sum + file.size, 0);
+    const uploadedBytes = new Map();
+    const onProgress = function (file, bytes) {
+        uploadedBytes.set(file, bytes);
+        const loaded = Array.from(uploadedBytes.values()).reduce((sum, value) => sum + value, 0);
+        const percentComplete = totalBytes ? Math.round((loaded / totalBytes) * 100) : 100;
+        progressBar.style.width = percentComplete + '%';
+        progressBar.setAttribute('aria-valuenow', percentComplete);
+        progressText.textContent = percentComplete + '%';
+    };
 
-    // 监听上传进度
-    xhr.upload.addEventListener('progress', function (e) {
-        if (e.lengthComputable) {
-            const percentComplete = Math.round((e.loaded / e.total) * 100);
-            progressBar.style.width = percentComplete + '%';
-            progressBar.setAttribute('aria-valuenow', percentComplete);
-            progressText.textContent = percentComplete + '%';
-        }
-    });
+    runWithConcurrency(files, PARALLEL_UPLOADS, file => uploadFileInChunks(file, onProgress))
+        .then(uploadedFiles => {
+            progressContainer.style.display = 'none';
 
-    // 处理上传完成
-    xhr.addEventListener('load', function () {
-        progressContainer.style.display = 'none';
-
-        if (xhr.status === 200) {
-            try {
-                const data = JSON.parse(xhr.responseText);
-                if (data.error) {
-                    throw new Error(data.error);
-                }
-
-                // 添加到选中文件列表
-                selectedFiles = selectedFiles.concat(data.uploaded_files);
-                updateSelectedFiles();
-                updateStartButton();
-
-                showSuccessMessage(`成功上传 ${data.uploaded_files.length} 个文件`);
-            } catch (error) {
-                showErrorMessage('文件上传失败: ' + error.message);
-            }
-        } else {
-            showErrorMessage('上传失败，服务器响应错误');
+            // 添加到选中文件列表
+            selectedFiles = selectedFiles.concat(uploadedFiles);
+            updateSelectedFiles();
+            updateStartButton();
+
+            showSuccessMessage(`成功上传 ${uploadedFiles.length} 个文件`);
+        })
+        .catch(error => {
+            progressContainer.style.display = 'none';
+            showErrorMessage('文件上传失败: ' + error.message + '（重新选择同一文件可继续上传）');
+        });
+}
+
+// 最多同时运行 limit 个任务，结果按输入顺序返回
+function runWithConcurrency(items, limit, worker) {
+    const results = new Array(items.length);
+    let next = 0;
+    const runNext = function () {
+        if (next >= items.length) return Promise.resolve();
+        const index = next++;
+        return worker(items[index]).then(result => {
+            results[index] = result;
+            return runNext();
+        });
+    };
+    const runners = [];
+    for (let i = 0; i < Math.min(limit, items.length); i++) {
+        runners.push(runNext());
+    }
+    return Promise.all(runners).then(() => results);
+}
+
+// 解析上传接口的 JSON 响应，出错时抛出异常（带状态码）
+function parseUploadResponse(response) {
+    return response.json().then(data => {
+        if (!response.ok) {
+            const error = new Error(data.error || `HTTP ${response.status}`);
+            error.status = response.status;
+            throw error;
         }
+        return data;
     });
+}
 
-    // 处理上传错误
-    xhr.addEventListener('error', function () {
-        progressContainer.style.display = 'none';
-        showErrorMessage('文件上传失败: 网络错误');
-    });
+// 计算数据块的 SHA-256（仅在浏览器支持 crypto.subtle 的安全上下文中可用）
+function chunkChecksum(blob) {
+    if (!window.crypto || !window.crypto.subtle) return Promise.resolve(null);
+    return blob.arrayBuffer()
+        .then(buffer => window.crypto.subtle.digest('SHA-256', buffer))
+        .then(digest => 'sha256 ' + btoa(String.fromCharCode(...new Uint8Array(digest))));
+}
 
-    // 发送请求
-    xhr.open('POST', '/api/upload');
-    xhr.send(formData);
+// 找到上次未完成的上传会话，没有时创建新会话
+function openUploadSession(file) {
+    const key = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    const create = function () {
+        return fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        })
+            .then(parseUploadResponse)
+            .then(session => {
+                localStorage.setItem(key, session.upload_id);
+                return { key: key, id: session.upload_id, offset: session.offset, chunkSize: session.chunk_size };
+            });
+    };
+
+    const previousId = localStorage.getItem(key);
+    if (!previousId) return create();
+    return fetch(`/api/uploads/${previousId}`)
+        .then(parseUploadResponse)
+        .then(session => ({ key: key, id: session.upload_id, offset: session.offset, chunkSize: session.chunk_size }))
+        .catch(() => {
+            localStorage.removeItem(key);
+            return create();
+        });
+}
+
+// 分块上传单个文件，网络错误或偏移不一致时查询服务器上的偏移后继续
+function uploadFileInChunks(file, onProgress) {
+    return openUploadSession(file).then(session => {
+        let retries = 0;
+
+        const sendChunk = function () {
+            const chunk = file.slice(session.offset, session.offset + session.chunkSize);
+            return chunkChecksum(chunk)
+                .then(checksum => {
+                    const headers = {
+                        'Content-Type': 'application/offset+octet-stream',
+                        'Upload-Offset': String(session.offset)
+                    };
+                    if (checksum) headers['Upload-Checksum'] = checksum;
+                    return fetch(`/api/uploads/${session.id}`, { method: 'PATCH', headers: headers, body: chunk });
+                })
+                .then(parseUploadResponse)
+                .then(data => {
+                    retries = 0;
+                    session.offset = data.offset;
+                    onProgress(file, session.offset);
+                    if (data.completed) {
+                        localStorage.removeItem(session.key);
+                        return data.file;
+                    }
+                    return sendChunk();
+                })
+                .catch(error => {
+                    // 服务器拒绝的请求不重试；409（偏移不一致）按服务器的偏移续传，460（数据块校验和不匹配）
+                    // 视为传输中的临时错误，重发这一块
+                    if (retries >= UPLOAD_RETRIES || (error.status && error.status !== 409 && error.status !== 460)) {
+                        throw error;
+                    }
+                    retries++;
+                    return new Promise(resolve => setTimeout(resolve, 1000 * retries))
+                        .then(() => fetch(`/api/uploads/${session.id}`))
+                        .then(parseUploadResponse)
+                        .then(status => {
+                            session.offset = status.offset;
+                            return sendChunk();
+                        });
+                });
+        };
+
+        onProgress(file, session.offset);
+        return sendChunk();
+    });
 }
 
 // 刷新文件列表 - 功能已移除，仅保留文件上传
@@ -312,6 +464,9 @@ function startProcessing() {
         input_files: selectedFiles,
         output_dir: outputDir
     };
+    if (taskType === 'm4s_convert') {
+        requestData.output_format = document.getElementById('m4s-format').value;
+    }
 
     fetch('/api/start-task', {
         method: 'POST',
@@ -327,10 +482,12 @@ function startProcessing() {
             }
 
             currentTaskId = data.task_id;
+            updateTaskStatus();
+            document.getElementById('cancel-task').disabled = false;
             document.getElementById('progress-container').style.display = 'block';
             document.getElementById('start-processing').disabled = true;
 
-            showSuccessMessage('任务已启动');
+            showSuccessMessage(data.queue_position ? `任务已加入队列，前面还有 ${data.queue_position} 个任务` : '任务已启动');
 
             // 滚动到进度区域
             document.getElementById('progress-container').scrollIntoView({ behavior: 'smooth' });
@@ -347,18 +504,57 @@ function updateTaskStatus() {
     fetch(`/api/task/${currentTaskId}`)
         .then(response => response.json())
         .then(task => {
-            if (task.error) return;
+            if (task.error || task.id !== currentTaskId) return;
+
+            currentTask = task;
+            handleTaskState(task);
+        })
+        .catch(error => {
+            console.error('Failed to update task status:', error);
+        });
+}
+
+// 根据任务状态更新界面
+function handleTaskState(task) {
+    updateTaskDisplay(task);
+
+    if (task.status === 'completed') {
+        handleTaskCompleted(task);
+    } else if (task.status === 'failed') {
+        handleTaskFailed(task);
+    } else if (task.status === 'cancelled') {
+        handleTaskCancelled(task);
+    }
+}
+
+// 任务结束后重置当前任务；轮询模式下没有事件推送，需要手动刷新历史和统计
+function finishCurrentTask() {
+    currentTaskId = null;
+    currentTask = null;
+    document.getElementById('start-processing').disabled = false;
+    document.getElementById('cancel-task').disabled = true;
+
+    if (!taskEvents) {
+        loadTaskHistory();
+        loadSystemInfo();
+    }
+}
 
-            updateTaskDisplay(task);
+// 取消当前任务
+function cancelTask() {
+    if (!currentTaskId) return;
 
-            if (task.status === 'completed') {
-                handleTaskCompleted(task);
-            } else if (task.status === 'failed') {
-                handleTaskFailed(task);
+    document.getElementById('cancel-task').disabled = true;
+    fetch(`/api/task/${currentTaskId}/cancel`, { method: 'POST' })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                throw new Error(data.error);
             }
+            showSuccessMessage('任务已取消');
         })
         .catch(error => {
-            console.error('Failed to update task status:', error);
+            showErrorMessage('取消任务失败: ' + error.message);
         });
 }
 
@@ -390,35 +586,35 @@ function updateTaskDisplay(task) {
 
 // 任务完成处理
 function handleTaskCompleted(task) {
-    currentTaskId = null;
-    document.getElementById('start-processing').disabled = false;
+    finishCurrentTask();
 
     // 显示成功模态框
     document.getElementById('success-details').innerHTML = `
         <p><strong>处理时间:</strong> ${formatDuration(task.started_at, task.completed_at)}</p>
         <p><strong>处理文件数:</strong> ${selectedFiles.length}</p>
+        <p><a href="/api/download-bundle?task=${encodeURIComponent(task.id)}" class="btn btn-sm btn-outline-primary">
+            <i class="fas fa-file-archive me-1"></i>下载全部输出 (ZIP)
+        </a></p>
     `;
 
     const successModal = new bootstrap.Modal(document.getElementById('successModal'));
     successModal.show();
+}
 
-    // 刷新任务历史
-    loadTaskHistory();
+// 任务取消处理
+function handleTaskCancelled(task) {
+    finishCurrentTask();
 }
 
 // 任务失败处理
 function handleTaskFailed(task) {
-    currentTaskId = null;
-    document.getElementById('start-processing').disabled = false;
+    finishCurrentTask();
 
     // 显示错误模态框
     document.getElementById('error-details').textContent = task.error || '未知错误';
 
     const errorModal = new bootstrap.Modal(document.getElementById('errorModal'));
     errorModal.show();
-
-    // 刷新任务历史
-    loadTaskHistory();
 }
 
 // 加载系统信息
@@ -453,41 +649,46 @@ function loadSystemInfo() {
 
 // 加载任务历史
 function loadTaskHistory() {
-    fetch('/api/tasks')
+    fetch(`/api/tasks?limit=${HISTORY_SIZE}&fields=type,status,created_at`)
         .then(response => response.json())
         .then(data => {
-            const container = document.getElementById('task-history');
-            const tasks = data.tasks || [];
-
-            if (tasks.length === 0) {
-                container.innerHTML = '<div class="text-center text-muted">暂无任务记录</div>';
-                return;
-            }
-
-            let html = '';
-            tasks.slice(-5).reverse().forEach(task => { // 显示最近5个任务
-                const icon = getTaskIcon(task.status);
-                const time = new Date(task.created_at).toLocaleString();
-
-                html += `
-                <div class="d-flex align-items-center mb-2 p-2 border rounded">
-                    <i class="${icon} me-2"></i>
-                    <div class="flex-grow-1">
-                        <div class="small fw-medium">${getTaskTypeName(task.type)}</div>
-                        <div class="text-muted" style="font-size: 0.8rem;">${time}</div>
-                    </div>
-                    <span class="badge bg-${getStatusColor(task.status)}">${getStatusText(task.status)}</span>
-                </div>
-            `;
-            });
-
-            container.innerHTML = html;
+            recentTasks = (data.tasks || []).reverse(); // 接口返回最新的在前
+            renderTaskHistory();
         })
         .catch(error => {
             console.error('Failed to load task history:', error);
         });
 }
 
+// 显示任务历史
+function renderTaskHistory() {
+    const container = document.getElementById('task-history');
+
+    if (recentTasks.length === 0) {
+        container.innerHTML = '<div class="text-center text-muted">暂无任务记录</div>';
+        return;
+    }
+
+    let html = '';
+    recentTasks.slice().reverse().forEach(task => { // 显示最近5个任务
+        const icon = getTaskIcon(task.status);
+        const time = new Date(task.created_at).toLocaleString();
+
+        html += `
+        <div class="d-flex align-items-center mb-2 p-2 border rounded">
+            <i class="${icon} me-2"></i>
+            <div class="flex-grow-1">
+                <div class="small fw-medium">${getTaskTypeName(task.type)}</div>
+                <div class="text-muted" style="font-size: 0.8rem;">${time}</div>
+            </div>
+            <span class="badge bg-${getStatusColor(task.status)}">${getStatusText(task.status)}</span>
+        </div>
+    `;
+    });
+
+    container.innerHTML = html;
+}
+
 // 工具函数
 
 function getFileIcon(extension) {
@@ -533,7 +734,8 @@ function getTaskIcon(status) {
         'pending': 'fas fa-clock text-warning',
         'running': 'fas fa-spinner fa-spin text-info',
         'completed': 'fas fa-check-circle text-success',
-        'failed': 'fas fa-times-circle text-danger'
+        'failed': 'fas fa-times-circle text-danger',
+        'cancelled': 'fas fa-ban text-secondary'
     };
 
     return iconMap[status] || 'fas fa-question-circle text-muted';
@@ -542,7 +744,9 @@ function getTaskIcon(status) {
 function getTaskTypeName(type) {
     const nameMap = {
         'flac_split': 'FLAC 分割',
-        'm4s_convert': 'M4S 转换'
+        'm4s_convert': 'M4S 转换',
+        'batch_split': '批量分割',
+        'bili_merge': 'B站缓存合并'
     };
 
     return nameMap[type] || type;
@@ -553,7 +757,8 @@ function getStatusColor(status) {
         'pending': 'warning',
         'running': 'info',
         'completed': 'success',
-        'failed': 'danger'
+        'failed': 'danger',
+        'cancelled': 'secondary'
     };
 
     return colorMap[status] || 'secondary';
@@ -564,7 +769,8 @@ function getStatusText(status) {
         'pending': '等待中',
         'running': '处理中',
         'completed': '已完成',
-        'failed': '失败'
+        'failed': '失败',
+        'cancelled': '已取消'
     };
 
     return textMap[status] || status;
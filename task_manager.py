@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务管理与持久化
+任务状态保存为 "快照 + 追加日志" 两部分:
+
+- 快照 (task_state.json): 全部任务的完整状态，格式与旧版本相同
+- 日志 (task_state.journal): 每行一条 JSON 记录，创建任务或更新字段时只追加一行
+
+每次更新的写入量只和这次更新的字段有关，不再随历史任务数增长。
+日志记录数超过阈值时合并（compaction）: 写出新快照后清空日志。
+启动时读取快照并重放日志，最后一行不完整（写入中途退出）时忽略。
+
+并发: 任务状态由一把锁保护，锁内只做内存修改和一行日志追加；读取接口返回
+任务的副本，快照的序列化和写入都在锁外进行，不会阻塞其他更新。
+
+变更事件: 每次创建或更新任务都会发布一条带序号的事件（只含变化的字段），
+保存在固定长度的环形缓冲中，供 /api/events 推送给浏览器。
+
+统计: 各状态的任务数和按类型的耗时直方图、吞吐量在状态变化时增量维护，
+查询时不需要遍历历史任务。
+
+任务日志: 任务结果中的 stdout/stderr/log 不保存在任务状态里，而是写入
+task_logs/<任务ID>.log，结果中只记录日志大小，按需通过 /api/task/<id>/log 读取。
+"""
+
+import bisect
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 日志记录数达到 max(COMPACT_MIN_RECORDS, 任务数 × COMPACT_RATIO) 时合并为快照
+COMPACT_MIN_RECORDS = 20000
+COMPACT_RATIO = 4
+
+# 保留最近多少条变更事件，客户端断线重连时据此补发
+EVENT_BUFFER_SIZE = 2000
+
+# 任务结果中体积较大的字段，写入单独的日志文件
+LARGE_RESULT_FIELDS = ('stdout', 'stderr', 'log')
+
+# 任务结束时的状态
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+# 耗时直方图的桶上限（秒），最后一个桶收集更长的耗时
+LATENCY_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# 吞吐量统计的时间窗口（分钟）
+THROUGHPUT_WINDOWS = (5, 60)
+
+# 分页查询时每页默认和最多返回的任务数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+class TaskJournal:
+    """
+    任务状态的快照文件和追加日志（本身不加锁，由 TaskManager 串行调用）
+    
+    合并时先把当前日志改名为 .old 文件（轮转），新记录写入新的日志；
+    快照写完后再删除 .old 文件。加载时依次重放 .old 文件和当前日志。
+    """
+    
+    def __init__(self, snapshot_path, journal_path=None):
+        """
+        Args:
+            snapshot_path (str): 快照文件路径
+            journal_path (str): 日志文件路径，默认为快照文件同名的 .journal 文件
+        """
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path) if journal_path else self.snapshot_path.with_suffix('.journal')
+        self.rotated_path = self.journal_path.with_name(self.journal_path.name + '.old')
+        self.records = 0
+        self.truncated = False
+        self._file = None
+    
+    def load(self):
+        """
+        读取快照并重放日志
+        
+        Returns:
+            tuple: (任务字典, 任务计数器)
+        """
+        tasks = {}
+        counter = 0
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            tasks = state.get('tasks', {})
+            counter = state.get('task_counter', 0)
+        
+        self.records = 0
+        self.truncated = False
+        for path in (self.rotated_path, self.journal_path):
+            if not path.exists():
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 只可能是最后一行写到一半，之后不会再有记录
+                        logger.warning(f"⚠️ 忽略不完整的任务日志记录: {line[:80]!r}")
+                        self.truncated = True
+                        break
+                    counter = apply_record(tasks, counter, record)
+                    self.records += 1
+        return tasks, counter
+    
+    def append(self, record):
+        """追加一条记录（单次 write，不重写已有内容）"""
+        if self._file is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self.records += 1
+    
+    def needs_compaction(self, task_count):
+        """日志是否已经足够长，需要合并"""
+        return self.records >= max(COMPACT_MIN_RECORDS, task_count * COMPACT_RATIO)
+    
+    def rotate(self):
+        """把当前日志轮转为 .old 文件，之后的记录写入新日志"""
+        self.close()
+        self.records = 0
+        if not self.journal_path.exists():
+            return
+        if self.rotated_path.exists():
+            # 上一次合并没有完成，.old 文件里的记录还没进入快照，接在后面
+            with open(self.journal_path, 'rb') as src, open(self.rotated_path, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.rotated_path)
+    
+    def write_snapshot(self, tasks, counter):
+        """
+        写出快照并删除已合并的 .old 日志
+        
+        快照先写入临时文件并刷到磁盘再替换，任何时刻退出都不会留下不完整的
+        快照；替换后、删除 .old 文件前退出时，重放日志只会把同样的字段再设置
+        一遍，结果不变。
+        """
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'tasks': tasks, 'task_counter': counter}, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if self.rotated_path.exists():
+            os.remove(self.rotated_path)
+    
+    def close(self):
+        """关闭日志文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def apply_record(tasks, counter, record):
+    """
+    把一条日志记录应用到任务字典上
+    
+    Returns:
+        int: 更新后的任务计数器
+    """
+    op = record.get('op')
+    if op == 'create':
+        task = record['task']
+        tasks[task['id']] = task
+        return max(counter, record.get('counter', 0))
+    if op == 'update':
+        task = tasks.get(record['id'])
+        if task is not None:
+            task.update(record['fields'])
+    return counter
+
+def has_large_result(fields):
+    """任务字段的结果中是否包含需要写入日志文件的输出（stdout/stderr/log）"""
+    result = fields.get('result')
+    return isinstance(result, dict) and any(key in result for key in LARGE_RESULT_FIELDS)
+
+def task_number(task_id):
+    """任务 ID（task_123）中的序号，用作分页游标"""
+    return int(task_id.rpartition('_')[2])
+
+def project_task(task, fields):
+    """只保留任务的指定字段（id 总是保留），fields 为空时返回完整副本"""
+    if not fields:
+        return dict(task)
+    projected = {'id': task['id']}
+    for field in fields:
+        if field in task:
+            projected[field] = task[field]
+    return projected
+
+def _parse_time(value):
+    """解析任务中的 ISO 时间，无效时返回 None"""
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+class LatencyHistogram:
+    """固定桶的耗时直方图"""
+    
+    __slots__ = ('counts', 'total', 'sum')
+    
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+    
+    def observe(self, seconds):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += seconds
+    
+    def to_dict(self):
+        return {
+            'buckets': list(LATENCY_BUCKETS) + ['+Inf'],
+            'counts': list(self.counts),
+            'count': self.total,
+            'average': round(self.sum / self.total, 2) if self.total else None,
+        }
+
+class TaskStatistics:
+    """
+    任务统计（由 TaskManager 在持有锁时更新）
+    
+    - 各状态的任务数
+    - 按任务类型: 结束状态计数、处理耗时（开始→结束）和排队耗时（创建→开始）直方图、
+      最近几个时间窗口内结束的任务数（按分钟计数，只保留最大窗口内的数据）
+    """
+    
+    def __init__(self):
+        self.status_counts = {}
+        self._types = {}
+    
+    def _type_stats(self, task_type):
+        stats = self._types.get(task_type)
+        if stats is None:
+            stats = self._types[task_type] = {
+                'finished': {},
+                'duration': LatencyHistogram(),
+                'wait': LatencyHistogram(),
+                'minutes': deque(),     # [分钟, 结束任务数]，按时间递增
+            }
+        return stats
+    
+    def add(self, task):
+        """登记一个新任务（创建或加载时）"""
+        status = task.get('status', 'unknown')
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if status in FINISHED_STATUSES:
+            self._finish(task)
+    
+    def change_status(self, task, old_status):
+        """任务状态从 old_status 变为 task['status']（task 已经更新）"""
+        status = task.get('status', 'unknown')
+        if status == old_status:
+            return
+        self.status_counts[old_status] -= 1
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if status in FINISHED_STATUSES and old_status not in FINISHED_STATUSES:
+            self._finish(task)
+    
+    def _finish(self, task):
+        stats = self._type_stats(task.get('type'))
+        status = task.get('status')
+        stats['finished'][status] = stats['finished'].get(status, 0) + 1
+        
+        created = _parse_time(task.get('created_at'))
+        started = _parse_time(task.get('started_at'))
+        completed = _parse_time(task.get('completed_at'))
+        if started and completed:
+            stats['duration'].observe(max(0.0, (completed - started).total_seconds()))
+        if created and started:
+            stats['wait'].observe(max(0.0, (started - created).total_seconds()))
+        
+        finished_at = completed.timestamp() if completed else time.time()
+        minute = int(finished_at // 60)
+        minutes = stats['minutes']
+        if minute <= int(time.time() // 60) - max(THROUGHPUT_WINDOWS):
+            return
+        if minutes and minutes[-1][0] == minute:
+            minutes[-1][1] += 1
+        elif not minutes or minutes[-1][0] < minute:
+            minutes.append([minute, 1])
+        else:
+            # 加载历史任务时结束时间可能乱序，按位置插入
+            index = next(i for i, entry in enumerate(minutes) if entry[0] >= minute)
+            if minutes[index][0] == minute:
+                minutes[index][1] += 1
+            else:
+                minutes.insert(index, [minute, 1])
+    
+    def by_type(self):
+        """按任务类型的统计快照"""
+        now_minute = int(time.time() // 60)
+        snapshot = {}
+        for task_type, stats in self._types.items():
+            minutes = stats['minutes']
+            while minutes and minutes[0][0] <= now_minute - max(THROUGHPUT_WINDOWS):
+                minutes.popleft()
+            snapshot[task_type] = {
+                'finished': dict(stats['finished']),
+                'throughput': {
+                    f'last_{window}m': sum(count for minute, count in minutes if minute > now_minute - window)
+                    for window in THROUGHPUT_WINDOWS
+                },
+                'duration_seconds': stats['duration'].to_dict(),
+                'wait_seconds': stats['wait'].to_dict(),
+            }
+        return snapshot
+
+class TaskEventLog:
+    """最近的任务变更事件（环形缓冲，线程安全）"""
+    
+    def __init__(self, capacity=EVENT_BUFFER_SIZE):
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        # 每次启动不同，和序号一起组成状态版本号（ETag），重启后序号从头开始也不会混淆
+        self.epoch = uuid.uuid4().hex[:8]
+        self.closed = False
+        self._condition = threading.Condition()
+    
+    @property
+    def last_seq(self):
+        """最新事件的序号"""
+        with self._condition:
+            return self._seq
+    
+    def publish(self, event):
+        """发布一条事件，唤醒所有等待中的订阅者"""
+        with self._condition:
+            self._seq += 1
+            event['seq'] = self._seq
+            self._events.append(event)
+            self._condition.notify_all()
+    
+    def close(self):
+        """服务停止时关闭：唤醒所有等待中的订阅者，之后的 wait 不再等待"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+    
+    def wait(self, after, timeout):
+        """
+        获取序号大于 after 的事件，没有时最多等待 timeout 秒
+        
+        Returns:
+            list: 新事件（超时时为空列表）；after 之后的事件已被挤出缓冲区或序号无效时
+                  返回 None，调用方需要重新获取完整状态
+        """
+        with self._condition:
+            # 序号比最新事件还大说明服务已重启，序号从头开始
+            if not self._seq - len(self._events) <= after <= self._seq:
+                return None
+            if after == self._seq and not self.closed:
+                self._condition.wait(timeout)
+                if after < self._seq - len(self._events):
+                    return None
+            # 序号连续，最新的 missing 条就是需要的事件
+            missing = self._seq - after
+            size = len(self._events)
+            return [self._events[index] for index in range(size - missing, size)]
+
+class TaskManager:
+    """任务管理器 - 支持持久化存储和详细日志（线程安全）"""
+    
+    def __init__(self, state_file, log_dir=None):
+        """
+        Args:
+            state_file (str): 任务状态快照文件路径（日志文件保存在同一目录）
+            log_dir (str): 任务输出日志目录，默认为快照所在目录下的 task_logs
+        """
+        self.tasks = {}
+        # 按序号升序排列的任务序号和 ID，分页时二分定位游标
+        self._numbers = []
+        self._ids = []
+        self.task_counter = 0
+        self.task_state_file = Path(state_file)
+        self.log_dir = Path(log_dir) if log_dir else self.task_state_file.parent / 'task_logs'
+        self.journal = TaskJournal(self.task_state_file)
+        self.events = TaskEventLog()
+        self.stats = TaskStatistics()
+        # _lock 保护 tasks、task_counter 和日志追加；_compact_lock 保证同一时间只有一次合并
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self.load_state()
+    
+    def save_state(self):
+        """把当前状态合并为快照（正常运行时只追加日志，不需要调用）"""
+        with self._compact_lock:
+            self._compact()
+    
+    def _compact(self):
+        """轮转日志并写出快照（调用方持有 _compact_lock）"""
+        try:
+            with self._lock:
+                self.journal.rotate()
+                tasks, counter = self._copy_tasks(), self.task_counter
+            # 在锁外序列化和写入，期间的更新写入新日志
+            self.journal.write_snapshot(tasks, counter)
+            logger.info(f"任务状态已保存，当前任务数: {len(tasks)}")
+        except Exception as e:
+            logger.error(f"保存任务状态失败: {e}")
+    
+    def load_state(self):
+        """从快照和日志加载任务状态"""
+        with self._lock:
+            try:
+                self.tasks, self.task_counter = self.journal.load()
+                self._index_tasks()
+                self.stats = TaskStatistics()
+                for task in self.tasks.values():
+                    self.stats.add(task)
+                if self.tasks or self.journal.records:
+                    logger.info(f"已加载任务状态，任务数: {len(self.tasks)}, 计数器: {self.task_counter}, "
+                                f"重放日志: {self.journal.records} 条")
+                else:
+                    logger.info("任务状态文件不存在，使用默认状态")
+            except Exception as e:
+                logger.error(f"加载任务状态失败: {e}")
+                self.tasks = {}
+                self.task_counter = 0
+                self._index_tasks()
+                return
+            replayed = self.journal.records or self.journal.truncated or self.journal.rotated_path.exists()
+            
+            # 旧版本把 stdout/stderr 直接保存在任务结果中，迁移到日志文件
+            migrated = 0
+            for task_id, task in self.tasks.items():
+                if has_large_result(task):
+                    task.update(self._offload_result(task_id, task))
+                    migrated += 1
+            if migrated:
+                logger.info(f"已把 {migrated} 个任务的输出迁移到日志目录: {self.log_dir}")
+        
+        # 启动时把上次运行留下的日志合并掉，之后的日志从空文件开始
+        if replayed or migrated:
+            self.save_state()
+    
+    def _index_tasks(self):
+        """按序号重建分页索引（调用方持有 _lock）"""
+        ordered = sorted(self.tasks, key=task_number)
+        self._numbers = [task_number(task_id) for task_id in ordered]
+        self._ids = ordered
+    
+    def log_path(self, task_id):
+        """任务输出日志文件的路径（任务 ID 由调用方保证有效）"""
+        return self.log_dir / f'{task_id}.log'
+    
+    def manifest_path(self, task_id):
+        """任务输出清单（JSON Lines，每行一个输出文件）的路径"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        return self.log_dir / f'{task_id}.manifest.jsonl'
+    
+    def _offload_result(self, task_id, fields):
+        """
+        把结果中的 stdout/stderr/log 写入任务日志文件
+        
+        Returns:
+            dict: 替换后的字段，结果中只保留其他内容和日志大小 (log_size)
+        """
+        result = dict(fields['result'])
+        sections = []
+        for key in LARGE_RESULT_FIELDS:
+            text = result.pop(key, None)
+            if text:
+                sections.append(f'===== {key} =====\n{text.rstrip()}\n')
+        if sections:
+            path = self.log_path(task_id)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'w', encoding='utf-8', errors='replace') as f:
+                    f.write('\n'.join(sections))
+                result['log_size'] = path.stat().st_size
+            except OSError as e:
+                logger.error(f"写入任务日志失败: {task_id}: {e}")
+        fields = dict(fields)
+        fields['result'] = result
+        return fields
+    
+    def _copy_tasks(self):
+        """复制全部任务（调用方持有 _lock）；字段值只会被整体替换，浅复制即可"""
+        return {task_id: dict(task) for task_id, task in self.tasks.items()}
+    
+    def _append(self, record):
+        """追加一条日志记录（调用方持有 _lock），返回是否需要合并快照"""
+        try:
+            self.journal.append(record)
+            return self.journal.needs_compaction(len(self.tasks))
+        except Exception as e:
+            logger.error(f"保存任务状态失败: {e}")
+            return False
+    
+    def _maybe_compact(self):
+        """在锁外触发合并；已经有线程在合并时直接返回"""
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            self._compact()
+        finally:
+            self._compact_lock.release()
+    
+    def create_task(self, task_type, params):
+        """创建新任务"""
+        with self._lock:
+            self.task_counter += 1
+            task_id = f"task_{self.task_counter}"
+            
+            task_info = {
+                'id': task_id,
+                'type': task_type,
+                'params': params,
+                'status': 'pending',
+                'progress': 0,
+                'message': '任务创建中...',
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'completed_at': None,
+                'error': None,
+                'result': None
+            }
+            
+            self.tasks[task_id] = task_info
+            # 计数器单调递增，追加即可保持有序
+            self._numbers.append(self.task_counter)
+            self._ids.append(task_id)
+            self.stats.add(task_info)
+            compact = self._append({'op': 'create', 'task': task_info, 'counter': self.task_counter})
+            self.events.publish({'op': 'create', 'task': dict(task_info)})
+        if compact:
+            self._maybe_compact()
+        logger.info(f"✅ 创建任务: {task_id}, 类型: {task_type}, 参数: {params}")
+        return task_id
+    
+    def update_task(self, task_id, **kwargs):
+        """更新任务状态（结果中的 stdout/stderr/log 写入任务日志文件）"""
+        if has_large_result(kwargs):
+            kwargs = self._offload_result(task_id, kwargs)
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                compact = None
+            else:
+                old_status = task.get('status', 'unknown')
+                task.update(kwargs)
+                self.stats.change_status(task, old_status)
+                compact = self._append({'op': 'update', 'id': task_id, 'fields': kwargs})
+                self.events.publish({'op': 'update', 'id': task_id, 'fields': kwargs})
+                progress = task.get('progress', 0)
+                message = task.get('message', '')
+        
+        if compact is None:
+            logger.warning(f"⚠️ 尝试更新不存在的任务: {task_id}")
+            return
+        if compact:
+            self._maybe_compact()
+        new_status = kwargs.get('status', old_status)
+        # 只有状态变化才记 INFO，进度刷新很频繁，记为 DEBUG
+        level = logging.INFO if new_status != old_status else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(level, f"🔄 更新任务 {task_id}: {old_status} -> {new_status}, 进度: {progress}%, 消息: {message}")
+    
+    def get_task(self, task_id):
+        """获取任务信息（返回副本，调用方可以在锁外安全地序列化）"""
+        with self._lock:
+            task = self.tasks.get(task_id)
+            task = dict(task) if task else None
+        if task:
+            logger.debug(f"📋 获取任务 {task_id}: 状态={task.get('status')}, 进度={task.get('progress')}%")
+        else:
+            logger.warning(f"⚠️ 任务不存在: {task_id}")
+        return task
+    
+    def get_all_tasks(self):
+        """获取所有任务（返回副本）"""
+        with self._lock:
+            tasks = [dict(task) for task in self.tasks.values()]
+        logger.debug(f"📊 返回所有任务，总数: {len(tasks)}")
+        return tasks
+    
+    def query_tasks(self, status=None, task_type=None, cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None):
+        """
+        分页查询任务（按创建顺序倒序，最新的在前）
+        
+        Args:
+            status (set): 只返回这些状态的任务
+            task_type (set): 只返回这些类型的任务
+            cursor (int): 上一页返回的游标，只返回序号小于它的任务
+            limit (int): 每页最多返回的任务数
+            fields (list): 只返回这些字段（id 总是返回），为空时返回完整任务
+        
+        Returns:
+            tuple: (任务列表, 下一页游标（没有更多时为 None）, 状态版本号)
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        page = []
+        next_cursor = None
+        with self._lock:
+            version = f'{self.events.epoch}-{self.events.last_seq}'
+            # 二分定位到游标之前的位置，从序号大的一端向前遍历
+            end = len(self._ids) if cursor is None else bisect.bisect_left(self._numbers, cursor)
+            for index in range(end - 1, -1, -1):
+                task = self.tasks[self._ids[index]]
+                if status and task.get('status') not in status:
+                    continue
+                if task_type and task.get('type') not in task_type:
+                    continue
+                if len(page) == limit:
+                    next_cursor = task_number(page[-1]['id'])
+                    break
+                page.append(project_task(task, fields))
+        return page, next_cursor, version
+    
+    def version(self):
+        """当前状态版本号，任何任务变化后都会改变（用作 ETag）"""
+        with self._lock:
+            return f'{self.events.epoch}-{self.events.last_seq}'
+    
+    def count_by_status(self):
+        """按状态统计任务数（增量维护，不遍历任务）"""
+        with self._lock:
+            return {status: count for status, count in self.stats.status_counts.items() if count}
+    
+    def stats_by_type(self):
+        """按任务类型的结束计数、吞吐量和耗时直方图"""
+        with self._lock:
+            return self.stats.by_type()
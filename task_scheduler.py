@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务调度器
+Web 界面提交的任务先进入有界队列，再由固定数量的工作线程取出执行:
+
+- 队列长度有上限，已满时 submit 抛出 QueueFullError（Web 接口返回 429）
+- 每种任务类型可以单独限制同时运行的数量
+- 按优先级排序（数值越大越先执行），同一优先级按提交顺序 (FIFO)
+- 排队中的任务可以直接取消；运行中的任务取消时会终止它启动的子进程
+  （子进程在独立的进程组中运行，连同它再启动的 ffmpeg 一起终止）
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 终止子进程时，先发送 SIGTERM，等待这么多秒后仍未退出再发送 SIGKILL
+KILL_GRACE_SECONDS = 5
+
+class QueueFullError(RuntimeError):
+    """任务队列已满"""
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+class Job:
+    """一个排队或运行中的任务"""
+    
+    def __init__(self, task_id, task_type, func, args, priority):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.state = 'queued'           # queued / running / done / cancelled
+        self.cancel_event = threading.Event()
+        self._processes = set()
+        self._lock = threading.Lock()
+    
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+    
+    def check_cancelled(self):
+        """任务已被取消时抛出 JobCancelled，供任务函数在步骤之间调用"""
+        if self.cancelled:
+            raise JobCancelled(self.task_id)
+    
+    def attach_process(self, process):
+        """登记任务启动的子进程，任务被取消时终止它（需配合 detach_process 使用）"""
+        with self._lock:
+            self._processes.add(process)
+        if self.cancelled:
+            terminate_process(process)
+    
+    def detach_process(self, process):
+        """取消登记子进程"""
+        with self._lock:
+            self._processes.discard(process)
+    
+    def kill_processes(self):
+        """终止任务登记的全部子进程"""
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            terminate_process(process)
+
+def terminate_process(process, grace=KILL_GRACE_SECONDS):
+    """终止子进程及其进程组：先 SIGTERM，超时后 SIGKILL"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+    except (ProcessLookupError, PermissionError):
+        return
+    
+    def force_kill():
+        try:
+            process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            try:
+                if os.name == 'posix':
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except (ProcessLookupError, PermissionError):
+                pass
+    
+    threading.Thread(target=force_kill, daemon=True).start()
+
+def parse_type_limits(text):
+    """解析 "flac_split=1,m4s_convert=2" 形式的类型并发限制"""
+    limits = {}
+    for item in (text or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+class TaskScheduler:
+    """有界任务队列 + 工作线程池"""
+    
+    def __init__(self, workers=2, max_queue=100, type_limits=None):
+        """
+        Args:
+            workers (int): 工作线程数（同时运行的任务总数）
+            max_queue (int): 最多排队的任务数（不含运行中的任务）
+            type_limits (dict): 任务类型 -> 该类型同时运行的上限，未列出的类型只受 workers 限制
+        """
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.type_limits = dict(type_limits or {})
+        self._queues = {}               # 任务类型 -> [(-优先级, 序号, Job)]
+        self._jobs = {}                 # task_id -> 排队或运行中的 Job
+        self._running = {}              # 任务类型 -> 运行中的数量
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+    
+    def start(self):
+        """启动工作线程"""
+        with self._condition:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'task-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"🧵 任务调度器已启动: {self.workers} 个工作线程, 队列上限 {self.max_queue}, "
+                    f"类型限制 {self.type_limits or '无'}")
+    
+    def stop(self, wait=True, timeout=None):
+        """
+        停止调度器：不再接收新任务，排队中的任务移出队列（不再执行）
+        
+        wait 为 True 时等待运行中的任务完成；超过 timeout 秒仍未完成的任务会被取消
+        （终止其子进程），再等待它们退出。
+        
+        Returns:
+            list: 被移出队列、没有执行的任务 ID
+        """
+        with self._condition:
+            self._stopping = True
+            dropped = [task_id for task_id, job in self._jobs.items() if job.state == 'queued']
+            for task_id in dropped:
+                job = self._jobs.pop(task_id)
+                job.state = 'cancelled'
+                job.cancel_event.set()
+            self._queues.clear()
+            self._queued = 0
+            running = len(self._jobs)
+            self._condition.notify_all()
+        logger.info(f"⏹️ 任务调度器停止: 移出队列 {len(dropped)} 个任务, 等待 {running} 个运行中的任务")
+        
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads:
+                thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+            if any(thread.is_alive() for thread in self._threads):
+                with self._condition:
+                    remaining = list(self._jobs)
+                logger.warning(f"⚠️ 等待超时，取消运行中的任务: {remaining}")
+                for task_id in remaining:
+                    self.cancel(task_id)
+                for thread in self._threads:
+                    thread.join(KILL_GRACE_SECONDS + 1)
+        return dropped
+    
+    def is_full(self):
+        """队列是否已满"""
+        with self._condition:
+            return self._queued >= self.max_queue
+    
+    def submit(self, task_id, task_type, func, args=(), priority=0):
+        """
+        提交任务，func 以 func(*args, job=Job) 的形式在工作线程中执行
+        
+        Returns:
+            int: 提交时排在前面的任务数（排队位置，从 0 开始）
+        
+        Raises:
+            QueueFullError: 队列已满
+        """
+        job = Job(task_id, task_type, func, args, priority)
+        with self._condition:
+            if self._stopping:
+                raise QueueFullError("任务调度器已停止")
+            if self._queued >= self.max_queue:
+                raise QueueFullError(f"任务队列已满（{self.max_queue}）")
+            position = sum(1 for entries in self._queues.values()
+                           for entry in entries if entry[2].state == 'queued' and -entry[0] >= priority)
+            heapq.heappush(self._queues.setdefault(task_type, []), (-priority, next(self._sequence), job))
+            self._jobs[task_id] = job
+            self._queued += 1
+            self._condition.notify()
+        logger.info(f"📥 任务入队: {task_id}, 类型: {task_type}, 优先级: {priority}, 前面还有 {position} 个")
+        return position
+    
+    def cancel(self, task_id):
+        """
+        取消任务
+        
+        Returns:
+            str: 'queued'（排队中的任务已移出队列）、'running'（已通知运行中的任务并终止
+                 其子进程）或 None（任务不存在或已经结束）
+        """
+        with self._condition:
+            job = self._jobs.get(task_id)
+            if job is None:
+                return None
+            previous = job.state
+            job.cancel_event.set()
+            if previous == 'queued':
+                # 堆中的条目在出队时跳过
+                job.state = 'cancelled'
+                self._queued -= 1
+                del self._jobs[task_id]
+        if previous == 'running':
+            job.kill_processes()
+        logger.info(f"🛑 取消任务: {task_id} ({previous})")
+        return previous
+    
+    def stats(self):
+        """当前排队和运行中的任务数（按类型）"""
+        with self._condition:
+            queued = {}
+            for task_type, entries in self._queues.items():
+                count = sum(1 for entry in entries if entry[2].state == 'queued')
+                if count:
+                    queued[task_type] = count
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'type_limits': dict(self.type_limits),
+                'queued': queued,
+                'running': {k: v for k, v in self._running.items() if v},
+            }
+    
+    def _has_capacity(self, task_type):
+        limit = self.type_limits.get(task_type)
+        return limit is None or self._running.get(task_type, 0) < limit
+    
+    def _next_job(self):
+        """取出可以运行的最高优先级任务（调用方持有 _condition），没有时返回 None"""
+        best = None
+        for task_type, entries in self._queues.items():
+            # 丢弃已取消的条目
+            while entries and entries[0][2].state != 'queued':
+                heapq.heappop(entries)
+            if entries and self._has_capacity(task_type) and (best is None or entries[0] < best[0]):
+                best = (entries[0], task_type)
+        if best is None:
+            return None
+        job = heapq.heappop(self._queues[best[1]])[2]
+        job.state = 'running'
+        self._queued -= 1
+        self._running[job.task_type] = self._running.get(job.task_type, 0) + 1
+        return job
+    
+    def _worker(self):
+        """工作线程：循环取出任务执行"""
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._stopping:
+                        return
+                    self._condition.wait()
+                    job = self._next_job()
+            
+            try:
+                job.func(*job.args, job=job)
+            except Exception as e:
+                logger.exception(f"💥 任务执行异常: {job.task_id}: {e}")
+            finally:
+                with self._condition:
+                    job.state = 'done'
+                    self._running[job.task_type] -= 1
+                    self._jobs.pop(job.task_id, None)
+                    # 同类型的任务可能在等待这个名额
+                    self._condition.notify_all()
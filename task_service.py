@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务服务（多工作进程部署）
+
+gunicorn 以多个工作进程运行时，任务状态 (TaskManager)、任务队列和调度线程 (TaskScheduler)
+仍然只能有一份: 主进程在创建工作进程之前启动一个任务服务进程，由它按单进程的方式导入
+web_app，工作进程通过 Unix 套接字 (multiprocessing.managers) 调用其中的对象:
+
+- 任务状态只有一个写入者，快照 + 日志、事件序号和统计与单进程时完全相同
+- 任务函数在任务服务进程的工作线程中执行，取消任务时由它终止子进程
+- 工作进程的事件流分段等待新事件，工作进程退出时只结束自己的连接
+- 任务写完输出后失效的文件索引目录记录在任务服务中，工作进程列文件前同步
+- 停止服务时主进程先等工作进程退出，再让任务服务等待运行中的任务（见 stop_service）
+
+单个工作进程（以及 Flask 开发服务器）不使用任务服务，任务状态和调度器直接在进程内。
+"""
+
+import logging
+import os
+import signal
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+logger = logging.getLogger(__name__)
+
+# 工作进程从这个环境变量得到任务服务的地址（由 gunicorn 主进程在创建工作进程之前设置）
+SERVICE_ADDRESS_ENV = 'MUSICTOOL_TASK_SERVICE'
+
+# 工作进程的事件流每次最多等待这么多秒，工作进程退出时连接随之及时结束
+EVENT_WAIT_SLICE = 1.0
+
+# 工作进程可以调用的 TaskManager / TaskScheduler 方法
+TASK_MANAGER_METHODS = ('create_task', 'update_task', 'get_task', 'get_all_tasks', 'query_tasks', 'version',
+                        'count_by_status', 'stats_by_type', 'log_path', 'manifest_path')
+SCHEDULER_METHODS = ('submit', 'cancel', 'is_full', 'stats')
+
+# 任务服务进程中的共享对象（由 _init_service 创建）
+_objects = {}
+
+class TaskService:
+    """任务服务进程中除 TaskManager / TaskScheduler 之外的接口"""
+    
+    def __init__(self, web_app):
+        self._web_app = web_app
+    
+    def events_last_seq(self):
+        """最新事件的序号"""
+        return self._web_app.task_manager.events.last_seq
+    
+    def events_wait(self, after, timeout):
+        """
+        等待序号大于 after 的事件（参见 TaskEventLog.wait）
+        
+        Returns:
+            tuple: (事件列表或 None, 事件流是否已关闭)
+        """
+        events = self._web_app.task_manager.events
+        return events.wait(after, timeout), events.closed
+    
+    def invalidated_since(self, seq):
+        """序号 seq 之后失效的文件索引目录（参见 InvalidationLog.since）"""
+        return self._web_app.file_invalidations.since(seq)
+    
+    def shutdown(self, timeout):
+        """结束事件流，排队中的任务不再执行，等待运行中的任务完成（超过 timeout 秒后取消）"""
+        self._web_app.shutdown(timeout)
+
+def _init_service():
+    """任务服务进程的初始化：以单进程方式导入 web_app（加载任务状态并启动调度器）"""
+    # 由主进程调用 shutdown 停止；直接收到 SIGTERM 时不退出，避免跳过等待运行中的任务
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    os.environ.pop(SERVICE_ADDRESS_ENV, None)
+    import web_app
+    _objects.update(task_manager=web_app.task_manager, scheduler=web_app.scheduler, service=TaskService(web_app))
+
+def _get_task_manager():
+    return _objects['task_manager']
+
+def _get_scheduler():
+    return _objects['scheduler']
+
+def _get_service():
+    return _objects['service']
+
+class TaskServiceManager(BaseManager):
+    """任务服务的进程管理器"""
+
+TaskServiceManager.register('task_manager', callable=_get_task_manager, exposed=TASK_MANAGER_METHODS)
+TaskServiceManager.register('scheduler', callable=_get_scheduler, exposed=SCHEDULER_METHODS)
+TaskServiceManager.register('service', callable=_get_service)
+
+def start_service():
+    """
+    启动任务服务进程（在 gunicorn 主进程中、创建工作进程之前调用）
+    
+    任务服务导入 web_app 之后才返回，地址写入环境变量，之后创建的工作进程据此连接。
+    
+    Returns:
+        TaskServiceManager: 传给 stop_service
+    """
+    manager = TaskServiceManager()
+    manager.start(_init_service)
+    os.environ[SERVICE_ADDRESS_ENV] = manager.address
+    logger.info(f"🧵 任务服务已启动: {manager.address}")
+    return manager
+
+def stop_service(manager, timeout):
+    """等待运行中的任务完成（最多 timeout 秒，超时后取消），再停止任务服务进程"""
+    try:
+        manager.service().shutdown(timeout)
+    finally:
+        manager.shutdown()
+        logger.info("⏹️ 任务服务已停止")
+
+class RemoteEventLog:
+    """工作进程中的事件流，接口与 TaskEventLog 相同；close 只结束本进程的事件流"""
+    
+    def __init__(self, service):
+        self._service = service
+        self.closed = False
+    
+    @property
+    def last_seq(self):
+        """最新事件的序号"""
+        return self._service.events_last_seq()
+    
+    def close(self):
+        """工作进程退出时调用：本进程中等待事件的连接最多 EVENT_WAIT_SLICE 秒后结束"""
+        self.closed = True
+    
+    def wait(self, after, timeout):
+        """获取序号大于 after 的事件，没有时最多等待 timeout 秒（分段等待）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            batch, closed = self._service.events_wait(after, max(0.0, min(EVENT_WAIT_SLICE, remaining)))
+            if closed:
+                self.closed = True
+            if batch != [] or self.closed or remaining <= EVENT_WAIT_SLICE:
+                return batch
+
+class RemoteTaskManager:
+    """工作进程中的 TaskManager：方法调用转发给任务服务，events 为本进程的事件流"""
+    
+    def __init__(self, proxy, service):
+        self._proxy = proxy
+        self.events = RemoteEventLog(service)
+    
+    def __getattr__(self, name):
+        return getattr(self._proxy, name)
+
+class TaskServiceClient:
+    """工作进程到任务服务的连接（线程安全，每个线程使用自己的套接字连接）"""
+    
+    def __init__(self, address):
+        manager = TaskServiceManager(address=address)
+        manager.connect()
+        self._service = manager.service()
+        self.task_manager = RemoteTaskManager(manager.task_manager(), self._service)
+        self.scheduler = manager.scheduler()
+        # 新工作进程的文件索引还是空的，只需要之后的失效记录
+        self._invalidation_seq, _ = self._service.invalidated_since(0)
+        self._lock = threading.Lock()
+    
+    def invalidated_paths(self):
+        """
+        上次调用之后任务服务中失效的文件索引目录
+        
+        Returns:
+            list: 目录列表；落后太多时为 None，调用方应完整重扫
+        """
+        with self._lock:
+            self._invalidation_seq, paths = self._service.invalidated_since(self._invalidation_seq)
+        return paths
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块断点续传上传 (参照 tus 协议)
+
+1. 创建上传会话: 提供文件名和总大小（可选整个文件的 SHA-256）
+2. 按顺序发送数据块: 每块指明起始偏移 (Upload-Offset)，数据以固定大小的缓冲区
+   直接写入目标目录中的 .part 文件，不经过临时文件；可选附带该块的校验和
+3. 最后一块写完后校验整个文件的 SHA-256，再把 .part 文件改名为最终文件名
+
+连接中断后客户端查询会话的当前偏移，从该位置继续发送。会话信息保存在
+上传目录下的 .sessions 中，服务重启后仍可继续（已写入部分的 SHA-256 重新计算）。
+每个会话同一时间只允许一个请求写入，不同会话可以并行上传。
+
+多个 Web 工作进程共用上传目录: 会话的当前偏移以 .part 文件的实际大小为准，
+写入时对 .part 文件加 flock，同一会话的数据块可以由不同的进程接收。
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: 没有 flock，只靠进程内的会话锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 每次从请求中读取和写入文件的缓冲区大小
+BUFFER_SIZE = 1024 * 1024
+# 建议客户端使用的数据块大小
+CHUNK_SIZE = 8 * 1024 * 1024
+# 超过这么多秒没有写入的会话视为过期，连同已上传的部分一起清理
+SESSION_EXPIRE_SECONDS = 24 * 3600
+
+class UploadError(Exception):
+    """上传请求无效，status 为对应的 HTTP 状态码"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class UploadSession:
+    """一个上传会话"""
+    
+    def __init__(self, upload_id, filename, size, sha256=None, offset=0, updated_at=None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.offset = offset
+        self.updated_at = updated_at or time.time()
+        self.hasher = None              # 已写入部分的增量 SHA-256，重启后按需重建
+        self.lock = threading.Lock()
+    
+    def to_dict(self):
+        return {'upload_id': self.upload_id, 'filename': self.filename, 'size': self.size,
+                'sha256': self.sha256, 'offset': self.offset, 'updated_at': self.updated_at}
+
+def try_lock_file(f):
+    """对打开的文件加非阻塞的排他锁（flock，关闭文件时释放），其他进程持有时返回 False"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+def parse_checksum_header(value):
+    """
+    解析 "sha256 <base64>" 形式的 Upload-Checksum 头（tus checksum 扩展）
+    
+    Returns:
+        bytes: 期望的摘要，没有提供时返回 None
+    """
+    if not value:
+        return None
+    algorithm, _, digest = value.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadError(f"不支持的校验算法: {algorithm}")
+    try:
+        return base64.b64decode(digest.strip(), validate=True)
+    except ValueError:
+        raise UploadError("Upload-Checksum 不是有效的 base64") from None
+
+class UploadManager:
+    """管理上传会话（线程安全，多个进程可以共用同一个上传目录）"""
+    
+    def __init__(self, upload_dir, max_sessions=32):
+        """
+        Args:
+            upload_dir (str): 上传目录，完成的文件和 .part 文件都保存在这里
+            max_sessions (int): 同时存在的未完成会话数上限
+        """
+        self.upload_dir = Path(upload_dir)
+        self.session_dir = self.upload_dir / '.sessions'
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self._load_sessions()
+    
+    def part_path(self, session):
+        """
+        会话对应的 .part 文件（与最终文件在同一目录，完成时只需改名）
+        
+        只用会话 ID 命名：最终文件名已经记录在会话元数据中，接近 255 字节的文件名
+        再加前后缀会超过文件名长度上限。
+        """
+        return self.upload_dir / f'.{session.upload_id}.part'
+    
+    def _meta_path(self, upload_id):
+        return self.session_dir / f'{upload_id}.json'
+    
+    def _save_meta(self, session):
+        temp_path = self._meta_path(session.upload_id).with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(session.to_dict(), f, ensure_ascii=False)
+        os.replace(temp_path, self._meta_path(session.upload_id))
+    
+    def _read_session(self, meta_path):
+        """读取会话元数据，偏移以 .part 文件的实际大小为准；元数据无效时删除并返回 None"""
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                session = UploadSession(**json.load(f))
+            part_path = self.part_path(session)
+            session.offset = part_path.stat().st_size if part_path.exists() else 0
+        except FileNotFoundError:
+            # 其他进程刚刚完成或取消了这个会话
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"忽略无效的上传会话: {meta_path}: {e}")
+            meta_path.unlink(missing_ok=True)
+            return None
+        return session
+    
+    def _load_sessions(self):
+        """加载上次运行（或其他工作进程）留下的会话"""
+        for meta_path in self.session_dir.glob('*.json'):
+            session = self._read_session(meta_path)
+            if session is not None:
+                self._sessions[session.upload_id] = session
+        if self._sessions:
+            logger.info(f"📤 恢复 {len(self._sessions)} 个未完成的上传会话")
+        self.cleanup_expired()
+    
+    def _remove(self, session):
+        """删除会话和已上传的部分（调用方持有 _lock）"""
+        self._sessions.pop(session.upload_id, None)
+        self._meta_path(session.upload_id).unlink(missing_ok=True)
+        self.part_path(session).unlink(missing_ok=True)
+    
+    def _try_remove(self, session):
+        """会话没有在写入时删除它（本进程和其他进程都没有写入），返回是否已删除"""
+        if not session.lock.acquire(blocking=False):
+            return False
+        try:
+            try:
+                f = open(self.part_path(session), 'rb')
+            except FileNotFoundError:
+                f = None
+            try:
+                if f is not None and not try_lock_file(f):
+                    return False
+                with self._lock:
+                    self._remove(session)
+                return True
+            finally:
+                if f is not None:
+                    f.close()
+        finally:
+            session.lock.release()
+    
+    def cleanup_expired(self):
+        """清理过期的会话（以元数据文件的修改时间为准，其他进程写入数据块时也会更新它）"""
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        expired = 0
+        for session in sessions:
+            try:
+                updated_at = self._meta_path(session.upload_id).stat().st_mtime
+            except FileNotFoundError:
+                with self._lock:
+                    self._sessions.pop(session.upload_id, None)
+                continue
+            if now - updated_at > SESSION_EXPIRE_SECONDS and self._try_remove(session):
+                expired += 1
+        if expired:
+            logger.info(f"🧹 清理 {expired} 个过期的上传会话")
+    
+    def create(self, filename, size, sha256=None):
+        """创建上传会话（filename 须已经过安全处理）"""
+        if not isinstance(size, int) or size < 0:
+            raise UploadError("size 必须是非负整数")
+        if sha256 is not None and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower())):
+            raise UploadError("sha256 必须是 64 位十六进制字符串")
+        self.cleanup_expired()
+        session = UploadSession(uuid.uuid4().hex, filename, size, sha256.lower() if sha256 else None)
+        with self._lock:
+            # 按磁盘上的会话计数，包括其他进程创建的会话
+            if sum(1 for _ in self.session_dir.glob('*.json')) >= self.max_sessions:
+                raise UploadError("未完成的上传会话过多，请稍后重试", status=429)
+            try:
+                self._save_meta(session)
+                self.part_path(session).touch()
+            except OSError as e:
+                self._meta_path(session.upload_id).unlink(missing_ok=True)
+                logger.error(f"创建上传会话失败: {filename}: {e}")
+                raise UploadError(f"无法创建上传会话: {e.strerror or e}", status=500) from None
+            self._sessions[session.upload_id] = session
+        logger.info(f"📤 创建上传会话: {session.upload_id}, 文件: {filename}, 大小: {size}")
+        return session
+    
+    def get(self, upload_id):
+        """
+        获取会话，不存在时抛出 UploadError (404)
+        
+        本进程没有的会话（由其他工作进程创建）从元数据文件加载；元数据文件已被删除的
+        会话（其他进程已经完成或取消）从内存中移除。
+        """
+        if len(upload_id) != 32 or any(c not in '0123456789abcdef' for c in upload_id):
+            raise UploadError("上传会话不存在或已完成", status=404)
+        meta_path = self._meta_path(upload_id)
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                session = self._read_session(meta_path)
+                if session is not None:
+                    self._sessions[upload_id] = session
+            elif not meta_path.exists():
+                self._sessions.pop(upload_id, None)
+                session = None
+        if session is None:
+            raise UploadError("上传会话不存在或已完成", status=404)
+        return session
+    
+    def abort(self, upload_id):
+        """取消上传，删除已上传的部分"""
+        session = self.get(upload_id)
+        if not self._try_remove(session):
+            raise UploadError("该会话正在写入", status=409)
+        logger.info(f"🗑️ 取消上传会话: {upload_id}")
+    
+    def _restore_hasher(self, session, part_path):
+        """重新计算已写入部分的 SHA-256（服务重启或其他进程写入过数据块之后）"""
+        hasher = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            remaining = session.offset
+            while remaining > 0:
+                buffer = f.read(min(BUFFER_SIZE, remaining))
+                if not buffer:
+                    break
+                hasher.update(buffer)
+                remaining -= len(buffer)
+        return hasher
+    
+    def write_chunk(self, upload_id, offset, stream, length=None, checksum=None):
+        """
+        从 stream 读取一个数据块写入会话
+        
+        增量 SHA-256 只在本进程连续接收数据块时维护；其他进程写入过数据块后不再增量计算，
+        最后一块写完时重新读取整个文件计算一次，避免每换一个进程就重算一遍已写入的部分。
+        
+        Args:
+            offset (int): 数据块的起始偏移，必须等于会话的当前偏移
+            stream: 请求体（有 read 方法的对象）
+            length (int): 数据块长度（Content-Length），为空时读到流结束
+            checksum (bytes): 数据块的期望 SHA-256，不匹配时丢弃这一块
+        
+        Returns:
+            tuple: (会话, 完成时的最终文件路径，未完成时为 None)
+        """
+        session = self.get(upload_id)
+        if not session.lock.acquire(blocking=False):
+            raise UploadError("该会话正在被另一个请求写入", status=409)
+        try:
+            part_path = self.part_path(session)
+            try:
+                f = open(part_path, 'r+b')
+            except FileNotFoundError:
+                with self._lock:
+                    self._sessions.pop(upload_id, None)
+                raise UploadError("上传会话不存在或已完成", status=404) from None
+            with f:
+                if not try_lock_file(f):
+                    raise UploadError("该会话正在被另一个请求写入", status=409)
+                if not self._meta_path(upload_id).exists():
+                    # 等待期间其他进程已经完成了这个会话（.part 已改名为最终文件）
+                    with self._lock:
+                        self._sessions.pop(upload_id, None)
+                    raise UploadError("上传会话不存在或已完成", status=404)
+                size = os.fstat(f.fileno()).st_size
+                if size != session.offset:
+                    # 其他进程写入过数据块
+                    session.offset = size
+                    session.hasher = None
+                if offset != session.offset:
+                    raise UploadError(f"偏移不匹配，当前偏移为 {session.offset}", status=409)
+                if length is not None and offset + length > session.size:
+                    raise UploadError("数据超出文件大小", status=413)
+                
+                if session.hasher is None and offset == 0:
+                    session.hasher = hashlib.sha256()
+                hasher = session.hasher.copy() if session.hasher is not None else None
+                chunk_hasher = hashlib.sha256() if checksum is not None else None
+                
+                written = 0
+                limit = session.size - offset if length is None else length
+                f.seek(offset)
+                try:
+                    while written < limit:
+                        buffer = stream.read(min(BUFFER_SIZE, limit - written))
+                        if not buffer:
+                            break
+                        f.write(buffer)
+                        if hasher is not None:
+                            hasher.update(buffer)
+                        if chunk_hasher is not None:
+                            chunk_hasher.update(buffer)
+                        written += len(buffer)
+                    if length is None and stream.read(1):
+                        raise UploadError("数据超出文件大小", status=413)
+                    if chunk_hasher is not None and chunk_hasher.digest() != checksum:
+                        raise UploadError("数据块校验和不匹配", status=460)
+                    f.flush()
+                except BaseException:
+                    # 校验失败或连接中断时这一块作废，截回到块开始的位置，客户端从原偏移重发
+                    f.truncate(offset)
+                    raise
+                
+                session.hasher = hasher
+                session.offset = offset + written
+                session.updated_at = time.time()
+                if session.offset < session.size:
+                    self._save_meta(session)
+                    return session, None
+                # 在持有文件锁时完成，其他进程看到的要么是完整的会话，要么会话已不存在
+                return session, self._finish(session, part_path)
+        finally:
+            session.lock.release()
+    
+    def _finish(self, session, part_path):
+        """校验整个文件并改名为最终文件名（调用方持有会话锁和 .part 文件锁）"""
+        if session.hasher is None:
+            session.hasher = self._restore_hasher(session, part_path)
+        digest = session.hasher.hexdigest()
+        if session.sha256 and digest != session.sha256:
+            with self._lock:
+                self._remove(session)
+            raise UploadError(f"文件校验失败: 期望 {session.sha256}，实际 {digest}", status=422)
+        session.sha256 = digest
+        final_path = self.upload_dir / session.filename
+        os.replace(part_path, final_path)
+        with self._lock:
+            self._sessions.pop(session.upload_id, None)
+            self._meta_path(session.upload_id).unlink(missing_ok=True)
+        logger.info(f"✅ 上传完成: {final_path}, 大小: {session.size}, SHA-256: {digest}")
+        return final_path
@@ -5,21 +5,39 @@
 提供友好的网页界面来操作音乐处理工具
 """
 
+import functools
 import os
 import sys
 import json
-import subprocess
-import threading
 import time
 import re
 import urllib.parse
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+from flask import (Flask, Response, render_template, request, jsonify, send_file, send_from_directory, redirect,
+                   stream_with_context, url_for)
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import logging
 
+from file_index import SORT_KEYS, FileIndex, InvalidationLog
+from task_manager import DEFAULT_PAGE_SIZE, TaskManager
+from zip_stream import stream_zip
+from upload_sessions import CHUNK_SIZE, UploadError, UploadManager, parse_checksum_header
+from task_scheduler import JobCancelled, QueueFullError, TaskScheduler, parse_type_limits
+from task_service import SERVICE_ADDRESS_ENV, TaskServiceClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from ffmpeg_progress import format_eta  # noqa: E402
+from audio_splitter import split_cue_image  # noqa: E402
+from batch_splitter import find_albums, split_albums  # noqa: E402
+from bilibili_cache import DEFAULT_MERGE_FORMAT, MERGE_FORMATS, merge_items, scan_cache  # noqa: E402
+from m4s_to_mp3_ffmpeg import CODEC_MODES, OUTPUT_FORMATS, M4SToMP3ConverterFFmpeg  # noqa: E402
+from media_probe import MediaProbe, set_media_probe  # noqa: E402
+from output_manifest import ManifestWriter, read_manifest, write_manifest  # noqa: E402
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -61,6 +79,8 @@ CORS(app)
 app.config['SECRET_KEY'] = 'music-tool-secret-key'
 app.config['JSON_AS_ASCII'] = False  # 支持中文JSON响应
 app.config['UPLOAD_FOLDER'] = 'uploads'
+# 由前端代理（nginx X-Accel / Apache mod_xsendfile）直接发送下载文件
+app.config['USE_X_SENDFILE'] = os.environ.get('MUSICTOOL_X_SENDFILE', '') == '1'
 
 # 配置目录
 BASE_DIR = Path("/app")
@@ -70,6 +90,35 @@ TEMP_DIR = BASE_DIR / "temp"
 M4S_DIR = BASE_DIR / "m4s"
 UPLOAD_DIR = BASE_DIR / "uploads"
 
+# 单个任务内同时运行的 ffmpeg 进程数，默认为 CPU 核心数
+# （MUSICTOOL_CPU_BUDGET 可进一步限制所有 M4S 转换任务同时运行的 ffmpeg 总数）
+DEFAULT_JOBS = int(os.environ.get('MUSICTOOL_JOBS', 0)) or os.cpu_count() or 1
+# 单个任务可以请求的最大并发数
+MAX_JOBS = max(64, DEFAULT_JOBS)
+
+# 任务调度：同时运行的任务数、最多排队的任务数、按任务类型的并发限制
+# （例如 MUSICTOOL_TYPE_LIMITS="flac_split=1,m4s_convert=1"）
+SCHEDULER_WORKERS = int(os.environ.get('MUSICTOOL_WORKERS', 0)) or 2
+SCHEDULER_QUEUE_SIZE = int(os.environ.get('MUSICTOOL_QUEUE_SIZE', 0)) or 100
+SCHEDULER_TYPE_LIMITS = parse_type_limits(os.environ.get('MUSICTOOL_TYPE_LIMITS', ''))
+
+# 文件列表索引：检查目录变化的最小间隔和完整重扫的间隔（秒）
+FILE_INDEX_REFRESH = float(os.environ.get('MUSICTOOL_INDEX_REFRESH', 5))
+FILE_INDEX_FULL_RESCAN = float(os.environ.get('MUSICTOOL_INDEX_FULL_RESCAN', 300))
+FILE_LIST_MAX_LIMIT = 1000
+
+# 同时存在的未完成上传会话数上限
+MAX_UPLOAD_SESSIONS = int(os.environ.get('MUSICTOOL_MAX_UPLOADS', 0)) or 32
+
+# 停止服务时等待运行中的任务完成的最长时间（秒），超时后取消
+DRAIN_TIMEOUT = float(os.environ.get('MUSICTOOL_DRAIN_TIMEOUT', 300))
+
+# 事件流没有新事件时，每隔这么多秒发送一次心跳注释，防止代理断开空闲连接
+SSE_HEARTBEAT_SECONDS = 15
+
+# gunicorn 以多个工作进程运行时任务服务的地址（由主进程设置，见 task_service.py）
+TASK_SERVICE_ADDRESS = os.environ.get(SERVICE_ADDRESS_ENV)
+
 # 确保目录存在
 for directory in [INPUT_DIR, OUTPUT_DIR, TEMP_DIR, M4S_DIR, UPLOAD_DIR]:
     directory.mkdir(exist_ok=True)
@@ -77,99 +126,138 @@ for directory in [INPUT_DIR, OUTPUT_DIR, TEMP_DIR, M4S_DIR, UPLOAD_DIR]:
 # 任务状态存储
 task_status = {}
 
-class TaskManager:
-    """任务管理器 - 支持持久化存储和详细日志"""
+if TASK_SERVICE_ADDRESS:
+    # 多工作进程：任务状态、调度器和恢复中断的任务都在任务服务进程中
+    task_service = TaskServiceClient(TASK_SERVICE_ADDRESS)
+    task_manager = task_service.task_manager
+else:
+    task_service = None
+    task_manager = TaskManager(BASE_DIR / "task_state.json", log_dir=BASE_DIR / "task_logs")
     
-    def __init__(self):
-        self.tasks = {}
-        self.task_counter = 0
-        self.task_state_file = BASE_DIR / "task_state.json"
-        self.load_state()
+    # 队列只保存在内存中，上次运行时未完成的任务已经无法继续
+    for _task in task_manager.get_all_tasks():
+        if _task['status'] in ('pending', 'running'):
+            task_manager.update_task(_task['id'], status='failed', message='服务重启，任务已中断',
+                                     completed_at=datetime.now().isoformat(), error='服务重启，任务已中断')
+
+upload_manager = UploadManager(UPLOAD_DIR, MAX_UPLOAD_SESSIONS)
+
+file_indexes = {name: FileIndex(path, FILE_INDEX_REFRESH, FILE_INDEX_FULL_RESCAN)
+                for name, path in (('input', INPUT_DIR), ('m4s', M4S_DIR), ('output', OUTPUT_DIR))}
+# 任务失效过的目录，多工作进程时工作进程据此同步自己的索引
+file_invalidations = InvalidationLog()
+
+# 媒体探测结果（采样率、声道、位深、总采样数、编码）按 (路径, 大小, 修改时间) 缓存，
+# 切割、M4S 转换和文件列表共用，重启后仍然有效
+media_probe = set_media_probe(MediaProbe(BASE_DIR / "media_probe_cache.json"))
+
+def _invalidate_indexes(path):
+    path = os.path.abspath(path)
+    for index in file_indexes.values():
+        root = os.path.abspath(index.root)
+        if path == root or path.startswith(root + os.sep):
+            index.invalidate(path)
+
+def invalidate_file_index(path):
+    """任务写完输出后让对应的文件索引重扫该目录（文件大小在写入期间会变化）"""
+    file_invalidations.add(path)
+    _invalidate_indexes(path)
+
+def sync_file_indexes():
+    """多工作进程时，按任务服务中的失效记录标记本进程的文件索引"""
+    if task_service is None:
+        return
+    paths = task_service.invalidated_paths()
+    if paths is None:
+        for index in file_indexes.values():
+            index.invalidate()
+        return
+    for path in paths:
+        _invalidate_indexes(path)
+
+if task_service is not None:
+    scheduler = task_service.scheduler
+else:
+    scheduler = TaskScheduler(SCHEDULER_WORKERS, SCHEDULER_QUEUE_SIZE, SCHEDULER_TYPE_LIMITS)
+    scheduler.start()
+
+def shutdown(timeout=DRAIN_TIMEOUT):
+    """
+    停止服务前调用：结束事件流，排队中的任务不再执行，等待运行中的任务完成
+    （超过 timeout 秒后取消）
     
-    def save_state(self):
-        """保存任务状态到文件"""
-        try:
-            state = {
-                'tasks': self.tasks,
-                'task_counter': self.task_counter
-            }
-            with open(self.task_state_file, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False, indent=2)
-            logger.info(f"任务状态已保存，当前任务数: {len(self.tasks)}")
-        except Exception as e:
-            logger.error(f"保存任务状态失败: {e}")
-    
-    def load_state(self):
-        """从文件加载任务状态"""
-        try:
-            if self.task_state_file.exists():
-                with open(self.task_state_file, 'r', encoding='utf-8') as f:
-                    state = json.load(f)
-                self.tasks = state.get('tasks', {})
-                self.task_counter = state.get('task_counter', 0)
-                logger.info(f"已加载任务状态，任务数: {len(self.tasks)}, 计数器: {self.task_counter}")
-            else:
-                logger.info("任务状态文件不存在，使用默认状态")
-        except Exception as e:
-            logger.error(f"加载任务状态失败: {e}")
-            self.tasks = {}
-            self.task_counter = 0
-    
-    def create_task(self, task_type, params):
-        """创建新任务"""
-        self.task_counter += 1
-        task_id = f"task_{self.task_counter}"
-        
-        task_info = {
-            'id': task_id,
-            'type': task_type,
-            'params': params,
-            'status': 'pending',
-            'progress': 0,
-            'message': '任务创建中...',
-            'created_at': datetime.now().isoformat(),
-            'started_at': None,
-            'completed_at': None,
-            'error': None,
-            'result': None
-        }
-        
-        self.tasks[task_id] = task_info
-        self.save_state()
-        logger.info(f"✅ 创建任务: {task_id}, 类型: {task_type}, 参数: {params}")
-        return task_id
-    
-    def update_task(self, task_id, **kwargs):
-        """更新任务状态"""
-        if task_id in self.tasks:
-            old_status = self.tasks[task_id].get('status', 'unknown')
-            self.tasks[task_id].update(kwargs)
-            self.save_state()
-            new_status = kwargs.get('status', old_status)
-            progress = kwargs.get('progress', self.tasks[task_id].get('progress', 0))
-            message = kwargs.get('message', self.tasks[task_id].get('message', ''))
-            logger.info(f"🔄 更新任务 {task_id}: {old_status} -> {new_status}, 进度: {progress}%, 消息: {message}")
-        else:
-            logger.warning(f"⚠️ 尝试更新不存在的任务: {task_id}")
+    多工作进程时工作进程只结束自己的事件流，任务由主进程停止任务服务时处理。
+    """
+    task_manager.events.close()
+    if task_service is None:
+        for task_id in scheduler.stop(wait=True, timeout=timeout):
+            task_manager.update_task(task_id, status='failed', message='服务停止，任务未执行',
+                                     completed_at=datetime.now().isoformat(), error='服务停止，任务未执行')
+        task_manager.save_state()
+    media_probe.save()
+
+# 处理过程的进度映射到任务进度的这个区间（之前是准备阶段，之后是收尾）
+PROCESS_PROGRESS_RANGE = (30, 95)
+
+def progress_reporter(task_id, label):
+    """
+    生成处理函数的整体进度回调 callback(完成比例, 预计剩余秒数, 已用秒数)
     
-    def get_task(self, task_id):
-        """获取任务信息"""
-        task = self.tasks.get(task_id)
-        if task:
-            logger.debug(f"📋 获取任务 {task_id}: 状态={task.get('status')}, 进度={task.get('progress')}%")
-        else:
-            logger.warning(f"⚠️ 任务不存在: {task_id}")
-        return task
+    处理函数最多每 0.5 秒回调一次，任务进度和预计剩余时间随之更新。
+    """
+    low, high = PROCESS_PROGRESS_RANGE
     
-    def get_all_tasks(self):
-        """获取所有任务"""
-        tasks = list(self.tasks.values())
-        logger.debug(f"📊 返回所有任务，总数: {len(tasks)}")
-        return tasks
+    def on_progress(fraction, eta, elapsed):
+        task_manager.update_task(
+            task_id,
+            progress=low + int(fraction * (high - low)),
+            message=f'{label} {fraction:.0%}，预计剩余 {format_eta(eta)}',
+            eta_seconds=eta
+        )
+    
+    return on_progress
+
+RESULT_ICONS = {'done': '✅', 'skipped': '⏭️', 'failed': '❌'}
+
+def format_result_lines(results):
+    """把每个文件的处理结果整理为任务日志中的文本行"""
+    lines = []
+    for result in results:
+        lines.append(f"{RESULT_ICONS.get(result['status'], '•')} {result['output'] or result.get('source')}")
+        if result.get('error'):
+            lines.extend(f"    {line}" for line in result['error'].rstrip().splitlines())
+    return lines
 
-task_manager = TaskManager()
+def count_results(results):
+    """按状态统计处理结果"""
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return counts
 
-def run_audio_splitter(task_id, input_files, output_dir):
+def complete_task(task_id, message, result, failed=False, **extra_fields):
+    """保存处理结果并结束任务（failed 为 True 时标记为失败），extra_fields 为要一并更新的其他字段"""
+    fields = {
+        **extra_fields,
+        'status': 'failed' if failed else 'completed',
+        'progress': 100,
+        'message': message,
+        'eta_seconds': 0,
+        'completed_at': datetime.now().isoformat(),
+        'result': result,
+    }
+    if failed:
+        fields['error'] = message
+    task_manager.update_task(task_id, **fields)
+    # 任务中探测过的文件写入缓存文件（没有新结果时不写）
+    media_probe.save()
+
+def mark_task_cancelled(task_id):
+    """把任务标记为已取消"""
+    task_manager.update_task(task_id, status='cancelled', message='任务已取消',
+                             completed_at=datetime.now().isoformat())
+
+def run_audio_splitter(task_id, input_files, output_dir, jobs=None, force=False, job=None):
     """运行音频分割任务"""
     try:
         task_manager.update_task(task_id, status='running', started_at=datetime.now().isoformat(), progress=10, message='开始音频分割...')
@@ -194,38 +282,46 @@ def run_audio_splitter(task_id, input_files, output_dir):
         format_summary = ', '.join([f"{count}个{fmt}" for fmt, count in format_counts.items()])
         task_manager.update_task(task_id, progress=30, message=f'找到 {format_summary} 和 {len(cue_files)} 个 CUE 文件')
         
-        # 执行分割，传递音频文件、CUE文件和输出目录
-        # 参数格式: audio_splitter.py <audio_file> <cue_file> <output_dir>
-        # 上传的文件在uploads目录中，需要构建完整路径
-        uploads_dir = BASE_DIR / "uploads"
+        audio_paths = [resolve_upload_path(f) for f in audio_files]
+        cue_paths = [resolve_upload_path(f) for f in cue_files]
+        if len(audio_paths) > 1 or len(cue_paths) > 1:
+            # 选择了多个镜像时按 CUE 的 FILE 条目或文件名逐一配对，作为批量任务处理
+            split_album_batch(task_id, audio_paths + cue_paths, output_dir, jobs, force, job)
+            return
         
-        # 找到第一个音频文件和CUE文件的完整路径
-        audio_file_path = str(uploads_dir / audio_files[0])
-        cue_file_path = str(uploads_dir / cue_files[0])
+        audio_file_path = str(audio_paths[0])
+        cue_file_path = str(cue_paths[0])
         
         logger.info(f"📂 音频文件路径: {audio_file_path}")
         logger.info(f"📂 CUE文件路径: {cue_file_path}")
         logger.info(f"📤 输出目录: {output_dir}")
         
-        cmd = [sys.executable, str(BASE_DIR / "scripts" / "audio_splitter.py"), audio_file_path, cue_file_path, output_dir]
-        logger.info(f"🚀 执行命令: {' '.join(cmd)}")
+        # 在任务的工作线程中直接调用切割函数，ffmpeg 进程登记到任务上
+        split = split_cue_image(audio_file_path, cue_file_path, output_dir, jobs=jobs, force=force,
+                                progress_callback=progress_reporter(task_id, '音频分割中'), job=job)
+        invalidate_file_index(output_dir)
+        if job is not None:
+            job.check_cancelled()
         
-        result = subprocess.run(cmd, cwd=str(BASE_DIR), capture_output=True, text=True, encoding='utf-8')
-        
-        task_manager.update_task(task_id, progress=80, message='音频分割处理中...')
-        
-        if result.returncode == 0:
-            task_manager.update_task(
-                task_id, 
-                status='completed', 
-                progress=100, 
-                message='音频分割完成', 
-                completed_at=datetime.now().isoformat(),
-                result={'stdout': result.stdout, 'stderr': result.stderr}
-            )
-        else:
-            raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
-            
+        manifest_count = write_manifest(task_manager.manifest_path(task_id), split['tracks'])
+        counts = count_results(split['tracks'])
+        message = f"音频分割完成: {counts['done']} 个轨道"
+        if counts['skipped']:
+            message += f"，{counts['skipped']} 个未变化"
+        if counts['failed']:
+            message += f"，{counts['failed']} 个失败"
+        complete_task(task_id, message, {
+            'log': '\n'.join(format_result_lines(split['tracks'])),
+            'album': split['album'],
+            'performer': split['performer'],
+            'output_dir': split['output_dir'],
+            'tracks': counts,
+            'manifest_entries': manifest_count,
+        }, failed=counts['done'] + counts['skipped'] == 0)
+    
+    except JobCancelled:
+        logger.info(f"🛑 音频分割任务已取消: {task_id}")
+        mark_task_cancelled(task_id)
     except Exception as e:
         logger.error(f"FLAC 分割任务失败: {e}")
         task_manager.update_task(
@@ -237,8 +333,180 @@ def run_audio_splitter(task_id, input_files, output_dir):
             error=str(e)
         )
 
-def run_m4s_converter(task_id, input_files, output_dir):
-    """运行 M4S 转换任务"""
+def resolve_upload_path(file_path):
+    """上传的文件以相对路径提交，位于 uploads 目录中；绝对路径原样使用"""
+    file_path = Path(file_path)
+    return file_path if file_path.is_absolute() else UPLOAD_DIR / file_path
+
+def split_album_batch(task_id, paths, output_dir, jobs=None, force=False, job=None):
+    """
+    切割 paths（目录或文件）中的所有 CUE/音频镜像对并结束任务
+    
+    每张专辑开始和结束时更新任务的 albums 字段（总数、完成数、失败数、正在处理的专辑），
+    任务结果中记录每张专辑的状态和输出目录。
+    """
+    albums, unmatched = find_albums(paths, output_dir)
+    for cue_file, reason in unmatched:
+        logger.warning(f"⚠️ 跳过 {cue_file}: {reason}")
+    if not albums:
+        raise ValueError("没有找到可以切割的 CUE/音频镜像对")
+    
+    state = {'total': len(albums), 'done': 0, 'failed': 0, 'running': []}
+    task_manager.update_task(task_id, progress=PROCESS_PROGRESS_RANGE[0],
+                             message=f'找到 {len(albums)} 张专辑', albums=dict(state))
+    album_results = []
+    track_results = {}
+    
+    def on_album(event):
+        if event['status'] == 'running':
+            state['running'].append(event['name'])
+        else:
+            if event['name'] in state['running']:
+                state['running'].remove(event['name'])
+            state[event['status']] += 1
+            album_results.append({key: event.get(key) for key in ('name', 'status', 'tracks', 'output_dir')})
+        task_manager.update_task(task_id, albums=dict(state, running=list(state['running'])))
+    
+    def on_track(album, result):
+        track_results.setdefault(album.name, []).append(result)
+        manifest.write(result)
+    
+    with ManifestWriter(task_manager.manifest_path(task_id)) as manifest:
+        split_albums(albums, jobs=jobs, force=force, progress_callback=progress_reporter(task_id, '批量分割中'),
+                     album_callback=on_album, track_callback=on_track, job=job)
+    invalidate_file_index(output_dir)
+    if job is not None:
+        job.check_cancelled()
+    
+    log_lines = [f"⚠️ 跳过 {cue_file}: {reason}" for cue_file, reason in unmatched]
+    for album in albums:
+        log_lines.append(f"===== {album.name} =====")
+        log_lines.extend(format_result_lines(sorted(track_results.get(album.name, []),
+                                                    key=lambda result: result['number'])))
+    
+    message = f"批量分割完成: {state['done']} 张专辑"
+    if state['failed']:
+        message += f"，失败 {state['failed']} 张"
+    if unmatched:
+        message += f"，跳过 {len(unmatched)} 个 CUE"
+    complete_task(task_id, message, {
+        'log': '\n'.join(log_lines),
+        'output_dir': str(output_dir),
+        'albums': album_results,
+        'unmatched': [{'cue_file': str(cue_file), 'reason': reason} for cue_file, reason in unmatched],
+        'manifest_entries': manifest.count,
+    }, failed=state['done'] == 0, albums=dict(state, running=[]))
+
+def resolve_input_roots(input_files):
+    """
+    把 INPUT_DIR 中的子目录或文件（相对路径）解析为绝对路径，为空时返回 INPUT_DIR 本身
+    
+    Raises:
+        ValueError: 路径不存在或超出 INPUT_DIR
+    """
+    roots = []
+    for input_file in input_files or ['']:
+        root = safe_join(str(INPUT_DIR), str(input_file))
+        if root is None or not os.path.exists(root):
+            raise ValueError(f"输入路径不存在: {input_file}")
+        roots.append(root)
+    return roots
+
+def run_batch_splitter(task_id, input_files, output_dir, jobs=None, force=False, job=None):
+    """
+    运行批量分割任务：input_files 为 INPUT_DIR 中的子目录或文件（相对路径），
+    为空时处理整个 INPUT_DIR
+    """
+    try:
+        task_manager.update_task(task_id, status='running', started_at=datetime.now().isoformat(), progress=10,
+                                 message='查找 CUE/音频镜像...')
+        roots = resolve_input_roots(input_files)
+        logger.info(f"📂 批量分割输入: {roots}")
+        logger.info(f"📤 输出目录: {output_dir}")
+        split_album_batch(task_id, roots, output_dir, jobs, force, job)
+    
+    except JobCancelled:
+        logger.info(f"🛑 批量分割任务已取消: {task_id}")
+        mark_task_cancelled(task_id)
+    except Exception as e:
+        logger.error(f"批量分割任务失败: {e}")
+        task_manager.update_task(
+            task_id,
+            status='failed',
+            progress=0,
+            message=f'任务失败: {str(e)}',
+            completed_at=datetime.now().isoformat(),
+            error=str(e)
+        )
+
+def run_bilibili_merge(task_id, input_files, output_dir, jobs=None, force=False, job=None,
+                       output_format=DEFAULT_MERGE_FORMAT):
+    """
+    运行 B 站缓存合并任务：input_files 为 INPUT_DIR 中的缓存目录（相对路径），为空时扫描整个 INPUT_DIR
+    
+    扫描和合并同时进行，扫描结束前视频总数未知，进度按目前已找到的视频数计算。
+    """
+    try:
+        task_manager.update_task(task_id, status='running', started_at=datetime.now().isoformat(), progress=10,
+                                 message='扫描 B 站缓存...')
+        roots = resolve_input_roots(input_files)
+        logger.info(f"📂 B 站缓存目录: {roots}")
+        logger.info(f"📤 输出目录: {output_dir}")
+        
+        state = {'found': 0, 'finished': 0}
+        low, high = PROCESS_PROGRESS_RANGE
+        
+        def items():
+            for item in scan_cache(roots, output_dir, output_format):
+                state['found'] += 1
+                yield item
+        
+        def on_item(item, entry):
+            manifest.write(entry)
+            state['finished'] += 1
+            task_manager.update_task(task_id, progress=low + int(state['finished'] / state['found'] * (high - low)),
+                                     message=f"合并中: 已完成 {state['finished']} 个，已找到 {state['found']} 个")
+        
+        with ManifestWriter(task_manager.manifest_path(task_id)) as manifest:
+            summary = merge_items(items(), output_dir, output_format=output_format, jobs=jobs, force=force,
+                                  item_callback=on_item, job=job)
+        invalidate_file_index(output_dir)
+        if job is not None:
+            job.check_cancelled()
+        if not summary['files']:
+            raise ValueError("没有找到 B 站缓存的 m4s 文件")
+        
+        logger.info(f"📊 B 站缓存合并完成 - 成功: {summary['merged']}, 跳过: {summary['skipped']}, "
+                    f"失败: {summary['failed']}")
+        message = f"B 站缓存合并完成: {summary['merged']} 个视频"
+        if summary['skipped']:
+            message += f"，{summary['skipped']} 个未变化"
+        if summary['failed']:
+            message += f"，{summary['failed']} 个失败"
+        complete_task(task_id, message, {
+            'log': '\n'.join(format_result_lines(summary['files'])),
+            'output_dir': str(output_dir),
+            'files': count_results(summary['files']),
+            'manifest_entries': manifest.count,
+        }, failed=summary['merged'] + summary['skipped'] == 0)
+    
+    except JobCancelled:
+        logger.info(f"🛑 B 站缓存合并任务已取消: {task_id}")
+        mark_task_cancelled(task_id)
+    except Exception as e:
+        logger.error(f"B 站缓存合并任务失败: {e}")
+        task_manager.update_task(
+            task_id,
+            status='failed',
+            progress=0,
+            message=f'任务失败: {str(e)}',
+            completed_at=datetime.now().isoformat(),
+            error=str(e)
+        )
+
+def run_m4s_converter(task_id, input_files, output_dir, jobs=None, force=False, job=None,
+                      output_format='mp3', codec_mode='auto'):
+    """运行 M4S 转换任务（output_format / codec_mode 见 m4s_to_mp3_ffmpeg.OUTPUT_FORMATS / CODEC_MODES）"""
     try:
         logger.info(f"🎵 开始M4S转换任务: {task_id}")
         logger.info(f"📁 输入文件数量: {len(input_files)}")
@@ -246,121 +514,56 @@ def run_m4s_converter(task_id, input_files, output_dir):
         
         task_manager.update_task(task_id, status='running', started_at=datetime.now().isoformat(), progress=10, message='开始 M4S 转换...')
         
-        # 检查输入文件
-        logger.info(f"🔍 检查输入文件类型...")
-        input_files_str = []
-        for f in input_files:
-            file_str = str(f)
-            input_files_str.append(file_str)
-            logger.info(f"  文件: {file_str}, 是M4S: {file_str.endswith('.m4s')}")
-        
-        m4s_files = [f for f in input_files_str if f.endswith('.m4s')]
+        m4s_files = [str(f) for f in input_files if str(f).endswith('.m4s')]
         logger.info(f"✅ 找到 {len(m4s_files)} 个M4S文件: {m4s_files[:3]}{'...' if len(m4s_files) > 3 else ''}")
         
         if not m4s_files:
             raise ValueError("未找到 M4S 文件")
         
-        # 对于上传的文件，它们位于uploads目录中
-        uploads_dir = BASE_DIR / "uploads"
-        logger.info(f"📂 上传文件目录: {uploads_dir}")
-        
-        # 确保所有M4S文件都存在于uploads目录中
+        # 上传的文件位于 uploads 目录中（相对路径），只转换选中的文件
         full_path_m4s_files = []
         for m4s_file in m4s_files:
-            # 如果是相对路径，则添加uploads目录
-            if not os.path.isabs(m4s_file):
-                full_path = uploads_dir / m4s_file
-            else:
-                full_path = Path(m4s_file)
-            
+            full_path = resolve_upload_path(m4s_file)
             if full_path.exists():
-                full_path_m4s_files.append(str(full_path))
-                logger.info(f"  ✅ 文件存在: {full_path}")
+                full_path_m4s_files.append(full_path)
             else:
                 logger.warning(f"  ⚠️ 文件不存在: {full_path}")
         
         if not full_path_m4s_files:
             raise ValueError("所有 M4S 文件都不存在")
         
-        # 使用uploads目录作为源目录
-        source_dir = str(uploads_dir)
-        logger.info(f"📂 源目录: {source_dir}")
-        
-        task_manager.update_task(task_id, progress=30, message=f'找到 {len(m4s_files)} 个 M4S 文件')
-        
-        # 准备转换环境
-        logger.info(f"🔧 准备执行M4S转换脚本...")
-        m4s_script = BASE_DIR / "scripts" / "m4s_to_mp3_ffmpeg.py"
-        logger.info(f"📜 脚本路径: {m4s_script}")
-        logger.info(f"📂 脚本是否存在: {m4s_script.exists()}")
+        task_manager.update_task(task_id, progress=30, message=f'找到 {len(full_path_m4s_files)} 个 M4S 文件')
         
-        if not m4s_script.exists():
-            raise FileNotFoundError(f"M4S转换脚本不存在: {m4s_script}")
+        # 在任务的工作线程中直接调用转换器；同一进程内的所有 M4S 任务共用
+        # MUSICTOOL_CPU_BUDGET 设置的 ffmpeg 进程数上限
+        with ManifestWriter(task_manager.manifest_path(task_id)) as manifest:
+            converter = M4SToMP3ConverterFFmpeg(UPLOAD_DIR, output_dir, workers=jobs, force=force,
+                                                overall_progress_callback=progress_reporter(task_id, 'M4S 转换中'),
+                                                job=job, manifest=manifest, output_format=output_format,
+                                                codec_mode=codec_mode)
+            summary = converter.convert(full_path_m4s_files)
+        invalidate_file_index(output_dir)
+        if job is not None:
+            job.check_cancelled()
         
-        # 设置工作目录和环境变量
-        work_dir = BASE_DIR
-        env = os.environ.copy()
-        env['PYTHONPATH'] = str(BASE_DIR)
-        
-        task_manager.update_task(task_id, progress=50, message='执行转换脚本...')
-        
-        # 执行转换，传递源目录和输出目录参数
-        cmd = [sys.executable, str(m4s_script), source_dir, output_dir]
-        logger.info(f"🚀 执行命令: {' '.join(cmd)}")
-        logger.info(f"📁 工作目录: {work_dir}")
-        logger.info(f"📂 源目录: {source_dir}")
-        logger.info(f"📤 输出目录: {output_dir}")
-        
-        result = subprocess.run(
-            cmd, 
-            cwd=work_dir,
-            capture_output=True, 
-            text=True, 
-            encoding='utf-8',
-            env=env,
-            timeout=300  # 5分钟超时
-        )
-        
-        logger.info(f"📊 命令执行完成，返回码: {result.returncode}")
-        logger.info(f"📤 标准输出: {result.stdout[:500]}{'...' if len(result.stdout) > 500 else ''}")
-        if result.stderr:
-            logger.warning(f"⚠️ 标准错误: {result.stderr[:500]}{'...' if len(result.stderr) > 500 else ''}")
-        
-        task_manager.update_task(task_id, progress=80, message='M4S 转换处理中...')
-        
-        if result.returncode == 0:
-            logger.info(f"✅ M4S转换成功完成")
-            task_manager.update_task(
-                task_id, 
-                status='completed', 
-                progress=100, 
-                message='M4S 转换完成', 
-                completed_at=datetime.now().isoformat(),
-                result={
-                    'stdout': result.stdout, 
-                    'stderr': result.stderr,
-                    'processed_files': len(m4s_files),
-                    'output_dir': str(output_dir)
-                }
-            )
-        else:
-            error_msg = f"转换脚本执行失败 (返回码: {result.returncode})"
-            logger.error(f"❌ {error_msg}")
-            logger.error(f"📤 stdout: {result.stdout}")
-            logger.error(f"📤 stderr: {result.stderr}")
-            raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
-            
-    except subprocess.TimeoutExpired as e:
-        error_msg = "M4S转换超时（超过5分钟）"
-        logger.error(f"⏰ {error_msg}")
-        task_manager.update_task(
-            task_id, 
-            status='failed', 
-            progress=0, 
-            message=error_msg,
-            completed_at=datetime.now().isoformat(),
-            error=error_msg
-        )
+        logger.info(f"📊 M4S转换完成 - 成功: {summary['converted']}, 跳过: {summary['skipped']}, "
+                    f"失败: {summary['failed']}")
+        message = f"M4S 转换完成: {summary['converted']} 个文件"
+        if summary['skipped']:
+            message += f"，{summary['skipped']} 个未变化"
+        if summary['failed']:
+            message += f"，{summary['failed']} 个失败"
+        complete_task(task_id, message, {
+            'log': '\n'.join(format_result_lines(summary['files'])),
+            'processed_files': len(full_path_m4s_files),
+            'output_dir': summary['output_dir'],
+            'files': count_results(summary['files']),
+            'manifest_entries': manifest.count,
+        }, failed=summary['converted'] + summary['skipped'] == 0)
+    
+    except JobCancelled:
+        logger.info(f"🛑 M4S转换任务已取消: {task_id}")
+        mark_task_cancelled(task_id)
     except Exception as e:
         error_msg = f"M4S 转换任务失败: {str(e)}"
         logger.error(f"💥 {error_msg}")
@@ -379,38 +582,49 @@ def index():
     """主页"""
     return render_template('index.html')
 
+# 文件列表中附带媒体信息的文件类型
+MEDIA_FILE_TYPES = ('.flac', '.wav', '.m4s', '.mp3', '.m4a', '.aac', '.mka')
+
 @app.route('/api/files')
 def list_files():
-    """列出文件"""
+    """
+    分页列出文件（基于内存索引，不再每次遍历目录）
+    
+    查询参数:
+        dir: input / m4s / output（默认 input）
+        sort: path / name / size / modified（默认 path），order=desc 倒序
+        ext: 只列出这些扩展名，逗号分隔，例如 ext=flac,cue
+        offset / limit: 分页（limit 默认 200，最多 1000）
+        media: 为 1 时音频文件附带 media 字段（编码、采样率、声道、位深、总采样数、时长）；
+            WAV/FLAC 读取文件头，其他格式只返回已经探测过的结果，不启动 ffprobe
+    """
     directory = request.args.get('dir', 'input')
+    if directory not in file_indexes:
+        directory = 'input'
     
-    if directory == 'input':
-        target_dir = INPUT_DIR
-    elif directory == 'm4s':
-        target_dir = M4S_DIR
-    elif directory == 'output':
-        target_dir = OUTPUT_DIR
-    else:
-        target_dir = INPUT_DIR
+    sort = request.args.get('sort', 'path')
+    if sort not in SORT_KEYS:
+        return jsonify({'error': f'sort 必须是 {", ".join(SORT_KEYS)} 之一'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = max(1, min(int(request.args.get('limit', 200)), FILE_LIST_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'offset 和 limit 必须是整数'}), 400
+    extensions = {'.' + ext.lower().lstrip('.') for ext in split_query_list('ext') or ()}
     
-    files = []
-    if target_dir.exists():
-        for file_path in target_dir.rglob("*"):
-            if file_path.is_file():
-                rel_path = file_path.relative_to(target_dir)
-                files.append({
-                    'name': file_path.name,
-                    'path': str(rel_path),
-                    'size': file_path.stat().st_size,
-                    'type': file_path.suffix.lower(),
-                    'modified': datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
-                })
-    
-    return jsonify({'files': files, 'directory': directory})
+    sync_file_indexes()
+    index = file_indexes[directory]
+    files, total = index.list(offset, limit, sort, request.args.get('order') == 'desc', extensions)
+    if request.args.get('media') == '1':
+        for item in files:
+            if item['type'] in MEDIA_FILE_TYPES:
+                info = media_probe.probe(index.root / item['path'], use_ffprobe=False)
+                item['media'] = info.to_dict() if info else None
+    return jsonify({'files': files, 'directory': directory, 'total': total, 'offset': offset, 'limit': limit})
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """上传文件"""
+    """上传文件（整个 multipart 请求一次上传，大文件请使用 /api/uploads 分块上传）"""
     if 'files' not in request.files:
         return jsonify({'error': '没有文件'}), 400
     
@@ -433,23 +647,146 @@ def upload_file():
     
     return jsonify({'uploaded_files': uploaded_files})
 
+def upload_status_response(session, status_code=200):
+    """返回上传会话的状态，Upload-Offset / Upload-Length 头与 tus 协议一致"""
+    response = jsonify({
+        'upload_id': session.upload_id,
+        'filename': session.filename,
+        'offset': session.offset,
+        'size': session.size,
+        'chunk_size': CHUNK_SIZE
+    })
+    response.status_code = status_code
+    response.headers['Upload-Offset'] = str(session.offset)
+    response.headers['Upload-Length'] = str(session.size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.errorhandler(UploadError)
+def handle_upload_error(error):
+    """上传错误统一返回 JSON"""
+    return jsonify({'error': str(error)}), error.status
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    创建分块上传会话
+    
+    请求体: {"filename": "album.flac", "size": 123456789, "sha256": "可选，整个文件的十六进制摘要"}
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get('filename'):
+        raise UploadError('未指定文件名')
+    session = upload_manager.create(safe_unicode_filename(data['filename']), data.get('size'), data.get('sha256'))
+    response = upload_status_response(session, 201)
+    response.headers['Location'] = url_for('upload_status', upload_id=session.upload_id)
+    return response
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'HEAD'])
+def upload_status(upload_id):
+    """查询上传会话的当前偏移（断线后从这里继续）"""
+    return upload_status_response(upload_manager.get(upload_id))
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """
+    写入一个数据块
+    
+    请求头 Upload-Offset 指明数据块的起始偏移（必须等于当前偏移），
+    可选 Upload-Checksum: sha256 <base64> 校验这一块。请求体直接流式写入文件。
+    最后一块写完后校验整个文件，返回的 file 字段与 /api/upload 的结果格式相同。
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        raise UploadError('缺少有效的 Upload-Offset 请求头') from None
+    checksum = parse_checksum_header(request.headers.get('Upload-Checksum'))
+    session, final_path = upload_manager.write_chunk(upload_id, offset, request.stream,
+                                                     request.content_length, checksum)
+    if final_path is None:
+        return upload_status_response(session)
+    
+    return jsonify({
+        'upload_id': session.upload_id,
+        'offset': session.offset,
+        'size': session.size,
+        'completed': True,
+        'sha256': session.sha256,
+        'file': {'name': final_path.name, 'path': str(final_path), 'size': session.size}
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """取消上传并删除已上传的部分"""
+    upload_manager.abort(upload_id)
+    return jsonify({'upload_id': upload_id, 'message': '上传已取消'})
+
+# 任务类型 -> 执行函数
+TASK_RUNNERS = {
+    'flac_split': run_audio_splitter,
+    'm4s_convert': run_m4s_converter,
+    'batch_split': run_batch_splitter,
+    'bili_merge': run_bilibili_merge,
+}
+
+# 不需要选择输入文件的任务类型（批量分割和 B 站缓存合并默认处理整个输入目录）
+OPTIONAL_INPUT_TASKS = ('batch_split', 'bili_merge')
+
+# 任务类型 -> 额外的请求参数: {参数名: 允许的取值}，作为关键字参数传给执行函数
+TASK_OPTIONS = {
+    'm4s_convert': {'output_format': tuple(OUTPUT_FORMATS), 'codec_mode': CODEC_MODES},
+    'bili_merge': {'output_format': MERGE_FORMATS},
+}
+
+def queue_full_response():
+    """队列已满时返回 429，提示客户端稍后重试"""
+    response = jsonify({'error': '任务队列已满，请稍后重试'})
+    response.status_code = 429
+    response.headers['Retry-After'] = '30'
+    return response
+
 @app.route('/api/start-task', methods=['POST'])
 def start_task():
-    """开始处理任务"""
+    """开始处理任务（进入任务队列，由调度器按顺序执行）"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': '请求体必须是 JSON 对象'}), 400
         task_type = data.get('type')
         input_files = data.get('input_files', [])
         output_dir = data.get('output_dir', str(OUTPUT_DIR))
+        force = bool(data.get('force', False))
+        jobs, error = parse_int_field(data, 'jobs', DEFAULT_JOBS, 1, MAX_JOBS)
+        if error is None:
+            priority, error = parse_int_field(data, 'priority', 0)
+        if error is not None:
+            return jsonify({'error': error}), 400
         
         logger.info(f"🚀 收到任务请求: 类型={task_type}, 文件数={len(input_files)}, 输出目录={output_dir}")
         
         if not task_type:
             return jsonify({'error': '未指定任务类型'}), 400
         
-        if not input_files:
+        if task_type not in TASK_RUNNERS:
+            logger.error(f"❌ 不支持的任务类型: {task_type}")
+            return jsonify({'error': '不支持的任务类型'}), 400
+        
+        if not input_files and task_type not in OPTIONAL_INPUT_TASKS:
             return jsonify({'error': '未选择输入文件'}), 400
         
+        options = {}
+        for name, choices in TASK_OPTIONS.get(task_type, {}).items():
+            value = data.get(name)
+            if value is None:
+                continue
+            if value not in choices:
+                return jsonify({'error': f'{name} 必须是 {", ".join(choices)} 之一'}), 400
+            options[name] = value
+        
+        if scheduler.is_full():
+            logger.warning(f"⚠️ 任务队列已满，拒绝任务请求")
+            return queue_full_response()
+        
         # 记录输入文件信息
         logger.info(f"📁 输入文件列表:")
         for i, file_info in enumerate(input_files):
@@ -458,7 +795,11 @@ def start_task():
         # 创建任务
         task_id = task_manager.create_task(task_type, {
             'input_files': input_files,
-            'output_dir': output_dir
+            'output_dir': output_dir,
+            'jobs': jobs,
+            'force': force,
+            'priority': priority,
+            **options
         })
         
         logger.info(f"✅ 任务创建成功: {task_id}")
@@ -477,55 +818,312 @@ def start_task():
         
         logger.info(f"📋 最终文件路径列表: {[str(p) for p in file_paths]}")
         
-        # 在后台执行任务
-        if task_type == 'flac_split':
-            logger.info(f"🎵 启动FLAC分割任务线程")
-            thread = threading.Thread(target=run_audio_splitter, args=(task_id, file_paths, output_dir))
-        elif task_type == 'm4s_convert':
-            logger.info(f"🔄 启动M4S转换任务线程")
-            thread = threading.Thread(target=run_m4s_converter, args=(task_id, file_paths, output_dir))
-        else:
-            logger.error(f"❌ 不支持的任务类型: {task_type}")
-            return jsonify({'error': '不支持的任务类型'}), 400
-        
-        thread.daemon = True
-        thread.start()
-        logger.info(f"🧵 任务线程已启动: {task_id}")
-        
-        return jsonify({'task_id': task_id, 'message': '任务已启动'})
+        # 提交到任务队列
+        task_manager.update_task(task_id, message='排队中...')
+        try:
+            runner = functools.partial(TASK_RUNNERS[task_type], **options) if options else TASK_RUNNERS[task_type]
+            position = scheduler.submit(task_id, task_type, runner,
+                                        (task_id, file_paths, output_dir, jobs, force), priority=priority)
+        except QueueFullError as e:
+            task_manager.update_task(task_id, status='failed', message=str(e),
+                                     completed_at=datetime.now().isoformat(), error=str(e))
+            return queue_full_response()
         
+        return jsonify({'task_id': task_id, 'message': '任务已加入队列', 'queue_position': position})
+    
     except Exception as e:
         logger.error(f"💥 启动任务失败: {e}")
         logger.exception("详细错误信息:")
         return jsonify({'error': f'启动任务失败: {str(e)}'}), 500
 
+def parse_int_field(data, name, default, minimum=None, maximum=None):
+    """
+    读取请求中的整数字段（也接受数字字符串），缺省或为 null 时使用默认值
+    
+    Returns:
+        tuple: (值, 错误信息)，字段有效时错误信息为 None
+    """
+    value = data.get(name)
+    if value is None:
+        return default, None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None, f'{name} 必须是整数'
+    try:
+        value = int(value)
+    except ValueError:
+        return None, f'{name} 必须是整数'
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        return None, f'{name} 必须在 {minimum} 到 {maximum} 之间'
+    return value, None
+
+@app.route('/api/task/<task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+    """取消排队中或运行中的任务"""
+    task = task_manager.get_task(task_id)
+    if not task:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    state = scheduler.cancel(task_id)
+    if state == 'queued':
+        mark_task_cancelled(task_id)
+    elif state == 'running':
+        # 子进程已被终止，任务线程随后会把状态更新为 cancelled
+        task_manager.update_task(task_id, message='正在取消...')
+    else:
+        return jsonify({'error': '任务已结束，无法取消', 'status': task['status']}), 409
+    
+    return jsonify({'task_id': task_id, 'message': '任务已取消', 'previous_state': state})
+
+def conditional_json(data, version):
+    """返回带 ETag 的 JSON 响应，客户端的 If-None-Match 匹配时返回 304"""
+    response = jsonify(data)
+    response.set_etag(version, weak=True)
+    return response.make_conditional(request)
+
+def split_query_list(name):
+    """解析逗号分隔的查询参数（例如 status=running,pending），没有时返回 None"""
+    values = [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+    return values or None
+
 @app.route('/api/task/<task_id>')
 def get_task_status(task_id):
     """获取任务状态"""
+    version = task_manager.version()
     task = task_manager.get_task(task_id)
     if not task:
         return jsonify({'error': '任务不存在'}), 404
     
-    return jsonify(task)
+    return conditional_json(task, version)
+
+@app.route('/api/task/<task_id>/log')
+def get_task_log(task_id):
+    """
+    获取任务输出日志（纯文本）
+    
+    支持 HTTP Range 请求按字节范围读取；?tail=N 只返回最后 N 字节。
+    """
+    if not task_manager.get_task(task_id):
+        return jsonify({'error': '任务不存在'}), 404
+    log_path = task_manager.log_path(task_id)
+    if not log_path.exists():
+        return jsonify({'error': '任务没有输出日志'}), 404
+    
+    tail = request.args.get('tail', type=int)
+    if tail is not None and tail >= 0:
+        size = log_path.stat().st_size
+        with open(log_path, 'rb') as f:
+            f.seek(max(0, size - tail))
+            data = f.read()
+        response = Response(data, mimetype='text/plain')
+        response.charset = 'utf-8'
+        response.headers['X-Log-Size'] = str(size)
+        return response
+    
+    return send_file(str(log_path), mimetype='text/plain; charset=utf-8', conditional=True)
 
 @app.route('/api/tasks')
 def get_all_tasks():
-    """获取所有任务"""
-    tasks = task_manager.get_all_tasks()
-    return jsonify({'tasks': tasks})
+    """
+    分页查询任务（最新的在前）
+    
+    查询参数:
+        status / type: 按状态、类型过滤，多个值用逗号分隔
+        fields: 只返回这些字段（逗号分隔，id 总是返回）
+        limit: 每页任务数（默认 50，最多 500）
+        cursor: 上一页返回的 next_cursor
+    """
+    try:
+        cursor = int(request.args['cursor']) if 'cursor' in request.args else None
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'cursor 和 limit 必须是整数'}), 400
+    
+    statuses = split_query_list('status')
+    types = split_query_list('type')
+    tasks, next_cursor, version = task_manager.query_tasks(
+        status=set(statuses) if statuses else None,
+        task_type=set(types) if types else None,
+        cursor=cursor,
+        limit=limit,
+        fields=split_query_list('fields')
+    )
+    return conditional_json({'tasks': tasks, 'next_cursor': next_cursor}, version)
+
+def format_sse(event, data, event_id=None):
+    """生成一条 Server-Sent Events 消息"""
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+@app.route('/api/events')
+def task_events():
+    """
+    任务变更事件流 (Server-Sent Events)
+    
+    连接后先发送 ready 事件（当前事件序号），之后每次任务创建或更新都推送一条
+    task 事件（只含变化的字段）。浏览器重连时通过 Last-Event-ID 补发断线期间的
+    事件；断线太久、事件已被挤出缓冲区时发送 reset 事件，客户端应重新获取任务列表。
+    """
+    events = task_manager.events
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since', '')
+    after = int(last_event_id) if last_event_id.isdigit() else events.last_seq
+    
+    def stream():
+        nonlocal after
+        yield 'retry: 3000\n' + format_sse('ready', {'seq': after})
+        # 服务停止时事件流关闭，连接随之结束，不阻塞优雅退出
+        while not events.closed:
+            batch = events.wait(after, SSE_HEARTBEAT_SECONDS)
+            if batch is None:
+                after = events.last_seq
+                yield format_sse('reset', {'seq': after})
+            elif not batch:
+                yield ': keep-alive\n\n'
+            for event in batch or ():
+                after = event['seq']
+                yield format_sse('task', event, event_id=after)
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream(), mimetype='text/event-stream', headers=headers)
 
 @app.route('/api/download/<path:filename>')
 def download_file(filename):
-    """下载文件"""
-    file_path = OUTPUT_DIR / filename
-    if not file_path.exists():
+    """
+    下载文件
+    
+    支持 ETag / If-None-Match、Last-Modified 和 Range 请求（断点续传、拖动播放）；
+    WSGI 服务器提供 wsgi.file_wrapper 时（例如 gunicorn）文件内容通过 sendfile 发送。
+    """
+    try:
+        return send_from_directory(OUTPUT_DIR, filename, as_attachment=True, conditional=True, etag=True)
+    except NotFound:
         return jsonify({'error': '文件不存在'}), 404
+
+def collect_files(directory, modified_between=None):
+    """
+    列出目录中的文件（跳过隐藏文件和目录，例如缓存清单和上传中的 .part 文件）
+    
+    Args:
+        modified_between (tuple): (开始, 结束) 时间戳，只返回这段时间内修改过的文件
     
-    return send_file(str(file_path), as_attachment=True)
+    Returns:
+        list: [(文件路径, 压缩包中的名称)]，按名称排序
+    """
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        for name in names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            if modified_between:
+                try:
+                    modified = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                # 允许 1 秒误差（部分文件系统的 mtime 精度为秒）
+                if not modified_between[0] - 1 <= modified <= modified_between[1] + 1:
+                    continue
+            files.append((path, os.path.relpath(path, directory)))
+    return sorted(files, key=lambda item: item[1])
+
+def load_task_manifest(task_id):
+    """读取任务的输出清单，没有清单（早期版本创建的任务）时返回 None"""
+    try:
+        return read_manifest(task_manager.manifest_path(task_id))
+    except OSError:
+        return None
+
+def manifest_files(entries, base_dir):
+    """
+    输出清单中仍然存在的文件（包括未变化而沿用的输出，不包括失败的记录）
+    
+    Returns:
+        list: [(文件路径, 压缩包中的名称)]，名称为相对于 base_dir 的路径，按名称排序
+    """
+    base_dir = os.path.abspath(base_dir)
+    files = {}
+    for entry in entries:
+        path = entry.get('output')
+        if entry.get('status') == 'failed' or not path or path in files or not os.path.isfile(path):
+            continue
+        if path.startswith(base_dir + os.sep):
+            files[path] = os.path.relpath(path, base_dir)
+        else:
+            files[path] = os.path.basename(path)
+    return sorted(files.items(), key=lambda item: item[1])
+
+@app.route('/api/task/<task_id>/outputs')
+def get_task_outputs(task_id):
+    """
+    获取任务的输出清单（每个输出文件一条记录，字段见 scripts/output_manifest.py）
+    
+    查询参数 status 按状态过滤（逗号分隔，例如 status=done,skipped）。
+    位于输出目录中的文件附带 download_path，可直接用于 /api/download/<download_path>。
+    """
+    if not task_manager.get_task(task_id):
+        return jsonify({'error': '任务不存在'}), 404
+    entries = load_task_manifest(task_id)
+    if entries is None:
+        return jsonify({'error': '任务没有输出清单'}), 404
+    
+    statuses = split_query_list('status')
+    if statuses:
+        entries = [entry for entry in entries if entry.get('status') in statuses]
+    output_root = str(OUTPUT_DIR.resolve())
+    for entry in entries:
+        output = entry.get('output')
+        entry['download_path'] = (os.path.relpath(output, output_root)
+                                  if output and output.startswith(output_root + os.sep) else None)
+    return jsonify({'task_id': task_id, 'total': len(entries), 'outputs': entries})
+
+@app.route('/api/download-bundle')
+def download_bundle():
+    """
+    把输出文件打包为 ZIP 边生成边下载（不压缩，不在磁盘上生成临时文件）
+    
+    查询参数:
+        task: 打包该任务的输出文件
+        path: 打包输出目录下的这个子目录（相对路径）
+    """
+    task_id = request.args.get('task')
+    if task_id:
+        task = task_manager.get_task(task_id)
+        if not task:
+            return jsonify({'error': '任务不存在'}), 404
+        if task['status'] != 'completed' or not task.get('started_at') or not task.get('completed_at'):
+            return jsonify({'error': '任务尚未完成', 'status': task['status']}), 409
+        output_dir = task['params'].get('output_dir') or OUTPUT_DIR
+        entries = load_task_manifest(task_id)
+        if entries is not None:
+            files = manifest_files(entries, output_dir)
+        else:
+            # 没有输出清单的旧任务：输出目录可能与其他任务共用，只打包任务运行期间写出的文件
+            files = collect_files(output_dir,
+                                  (datetime.fromisoformat(task['started_at']).timestamp(),
+                                   datetime.fromisoformat(task['completed_at']).timestamp()))
+        archive_name = f'{task_id}.zip'
+    else:
+        directory = safe_join(str(OUTPUT_DIR), request.args.get('path', ''))
+        if directory is None or not os.path.isdir(directory):
+            return jsonify({'error': '目录不存在'}), 404
+        files = collect_files(directory)
+        archive_name = f'{Path(directory).name or "output"}.zip'
+    
+    if not files:
+        return jsonify({'error': '没有可下载的文件'}), 404
+    
+    logger.info(f"📦 打包下载: {archive_name}, {len(files)} 个文件")
+    response = Response(stream_with_context(stream_zip(files)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{urllib.parse.quote(archive_name)}"
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/system-info')
 def system_info():
-    """获取系统信息"""
+    """获取系统信息（任务统计增量维护，耗时与历史任务数无关）"""
+    status_counts = task_manager.count_by_status()
     info = {
         'directories': {
             'input': str(INPUT_DIR),
@@ -535,12 +1133,15 @@ def system_info():
             'upload': str(UPLOAD_DIR)
         },
         'stats': {
-            'total_tasks': len(task_manager.tasks),
-            'pending_tasks': len([t for t in task_manager.tasks.values() if t['status'] == 'pending']),
-            'running_tasks': len([t for t in task_manager.tasks.values() if t['status'] == 'running']),
-            'completed_tasks': len([t for t in task_manager.tasks.values() if t['status'] == 'completed']),
-            'failed_tasks': len([t for t in task_manager.tasks.values() if t['status'] == 'failed'])
-        }
+            'total_tasks': sum(status_counts.values()),
+            'pending_tasks': status_counts.get('pending', 0),
+            'running_tasks': status_counts.get('running', 0),
+            'completed_tasks': status_counts.get('completed', 0),
+            'failed_tasks': status_counts.get('failed', 0),
+            'cancelled_tasks': status_counts.get('cancelled', 0)
+        },
+        'task_types': task_manager.stats_by_type(),
+        'scheduler': scheduler.stats()
     }
     return jsonify(info)
 
@@ -560,5 +1161,7 @@ if __name__ == '__main__':
     print("  - M4S 文件转 MP3")
     print("  - 文件上传和管理")
     print("  - 任务进度监控")
+    print("⚠️ 开发服务器，生产环境请使用: python main.py web --production")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # 调试模式的自动重载会在第二个进程中再创建一份任务状态和调度器，默认关闭
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('MUSICTOOL_DEBUG', '') == '1', threaded=True)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生产环境 Web 服务 (gunicorn)
+
+Flask 自带的开发服务器只适合调试，生产环境用 gunicorn 运行 web_app:
+
+- gthread 工作模式: 每个工作进程用线程池处理请求，支持 HTTP keep-alive
+- SSE 事件流的限制: 每个打开的页面的事件流一直占用一个线程，同时打开的页面数达到
+  工作进程数 × 线程数（默认 1 × 32）后，所有新请求都要排队等待空闲线程，服务看起来
+  没有响应；--workers / --threads 应按同时打开的页面数加上并发请求数设置
+- 单个工作进程（默认）: 任务状态、任务队列和事件流都在工作进程内
+- 多个工作进程 (--workers > 1): 主进程先启动一个任务服务进程，任务状态、任务队列和
+  调度线程只在其中存在，工作进程通过 Unix 套接字调用（见 task_service.py）；
+  工作进程只处理 HTTP 请求（上传、下载、打包、文件列表、JSON 序列化）
+- 优雅退出: 收到 SIGTERM 后不再接受新连接，事件流立即结束，排队中的任务不再
+  执行，运行中的任务最多等待 drain_timeout 秒（超时后取消），再退出进程；
+  多个工作进程时先等工作进程处理完进行中的请求（最多 REQUEST_GRACE_SECONDS 秒），
+  再由主进程停止任务服务
+
+使用方法:
+    python main.py web --production [--workers 1] [--threads 32] [--keep-alive 5] [--drain-timeout 300]
+"""
+
+import signal
+
+DEFAULT_WORKERS = 1
+DEFAULT_THREADS = 32
+DEFAULT_KEEP_ALIVE = 5
+DEFAULT_DRAIN_TIMEOUT = 300
+# 多个工作进程时，工作进程退出前等待进行中的请求的时间（秒）；任务不在工作进程中运行
+REQUEST_GRACE_SECONDS = 30
+
+def _post_worker_init(worker):
+    """收到 SIGTERM 时先关闭事件流，让 SSE 连接立即结束，不占满优雅退出的等待时间"""
+    import web_app
+    
+    handle_exit = worker.handle_exit
+    
+    def on_exit(sig, frame):
+        web_app.task_manager.events.close()
+        handle_exit(sig, frame)
+    
+    signal.signal(signal.SIGTERM, on_exit)
+
+def _make_worker_exit(drain_timeout):
+    def worker_exit(server, worker):
+        """工作进程退出前等待运行中的任务完成（多个工作进程时只结束本进程的事件流）"""
+        import web_app
+        web_app.shutdown(drain_timeout)
+    return worker_exit
+
+def _make_service_hooks(drain_timeout):
+    """多个工作进程时，在主进程中启动（创建工作进程之前）和停止（工作进程全部退出之后）任务服务"""
+    state = {}
+    
+    def on_starting(server):
+        import task_service
+        state['manager'] = task_service.start_service()
+    
+    def on_exit(server):
+        manager = state.pop('manager', None)
+        if manager is not None:
+            import task_service
+            task_service.stop_service(manager, drain_timeout)
+    
+    return on_starting, on_exit
+
+def run(host='0.0.0.0', port=5000, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS, keep_alive=DEFAULT_KEEP_ALIVE,
+        drain_timeout=DEFAULT_DRAIN_TIMEOUT, access_log=True):
+    """
+    用 gunicorn 运行 Web 服务（阻塞直到服务停止）
+    
+    Args:
+        workers (int): 工作进程数，大于 1 时任务在单独的任务服务进程中运行
+        threads (int): 每个工作进程处理请求的线程数
+        keep_alive (int): HTTP keep-alive 连接的空闲超时（秒）
+        drain_timeout (float): 停止时等待运行中任务的最长时间（秒）
+        access_log (bool): 是否输出访问日志
+    
+    Raises:
+        ImportError: 没有安装 gunicorn
+    """
+    from gunicorn.app.base import BaseApplication
+    
+    workers = max(1, workers)
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': threads,
+        'keepalive': keep_alive,
+        # 工作进程心跳超时；gthread 的心跳由主循环发送，长时间的请求不会触发
+        'timeout': 60,
+        # 主进程在这么多秒后强制结束工作进程；单个工作进程时需要覆盖等待运行中任务的时间
+        'graceful_timeout': drain_timeout + 15 if workers == 1 else REQUEST_GRACE_SECONDS,
+        'accesslog': '-' if access_log else None,
+        'post_worker_init': _post_worker_init,
+        'worker_exit': _make_worker_exit(drain_timeout),
+    }
+    if workers > 1:
+        options['on_starting'], options['on_exit'] = _make_service_hooks(drain_timeout)
+    
+    class MusicToolApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            # 在工作进程中导入，任务状态和调度线程（或到任务服务的连接）在 fork 之后创建
+            from web_app import app
+            return app
+    
+    MusicToolApplication().run()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式 ZIP 打包
+边读取文件边生成 ZIP 数据，不在磁盘上生成临时压缩包，内存中只保留一个缓冲区。
+音频文件已经是压缩格式，使用 ZIP_STORED（不再压缩），超过 4 GB 时自动使用 ZIP64。
+"""
+
+import zipfile
+
+# 每次从源文件读取的字节数
+BUFFER_SIZE = 1024 * 1024
+
+class _ZipSink:
+    """zipfile 的输出目标：写入的数据暂存在内存中，由生成器逐块取走（不可 seek）"""
+    
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self._position
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        """取走目前为止写入的数据"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(files, buffer_size=BUFFER_SIZE):
+    """
+    生成 ZIP 数据
+    
+    Args:
+        files (list): [(文件路径, 压缩包中的名称)]
+        buffer_size (int): 每次读取的字节数
+    
+    Yields:
+        bytes: ZIP 数据块
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path, arcname in files:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            force_zip64 = zinfo.file_size >= zipfile.ZIP64_LIMIT
+            with open(path, 'rb') as source, archive.open(zinfo, 'w', force_zip64=force_zip64) as target:
+                while True:
+                    data = source.read(buffer_size)
+                    if not data:
+                        break
+                    target.write(data)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()